@@ -0,0 +1,75 @@
+"""
+Cost of parsing /devices/action payloads for a fleet of simulated devices.
+
+Compares the unchecked parse, that Device.action did before values were
+validated, with Device.parse_changes() running precompiled validators.
+
+Run with:
+    $ PYTHONPATH=. python benchmarks/bench_action.py
+"""
+
+import time
+import argparse
+
+from dialogs.protocol.base import Device
+from dialogs.protocol.capability import OnOff, Range
+
+from bench_state import make_fleet
+
+
+def make_payload(device: Device) -> list[dict]:
+    payload = []
+    for cap in device.capabilities():
+        if isinstance(cap, OnOff):
+            payload.append({'type': cap.type_id, 'state': {'instance': 'on', 'value': False}})
+        elif isinstance(cap, Range):
+            payload.append({'type': cap.type_id, 'state': {'instance': cap.instance, 'value': 10, 'relative': True}})
+    return payload
+
+
+def unchecked(device: Device, payload: list[dict]) -> dict:
+    return {
+        (cap['type'], cap['state']['instance']): device.split_value(dict(cap['state']))
+        for cap in payload
+    }
+
+
+def validated(device: Device, payload: list[dict]) -> dict:
+    changes, errors = device.parse_changes(payload)
+    assert not errors
+    return changes
+
+
+def measure(requests: list[tuple[Device, list[dict]]], rounds: int, fn) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for device, payload in requests:
+            fn(device, payload)
+    return (time.perf_counter() - started) / rounds
+
+
+def main(size: int, rounds: int, repeat: int) -> None:
+    requests = [(device, make_payload(device)) for device in make_fleet(size)]
+    requests = [(device, payload) for device, payload in requests if payload]
+    print(f'{len(requests)} devices in action request, best of {repeat} runs by {rounds} rounds')
+    for device, payload in requests:
+        assert unchecked(device, payload) == validated(device, payload)
+
+    # runs are interleaved and the best one is taken, so background load
+    # of the machine affects both ways alike
+    timings: dict[str, list[float]] = {'unchecked parse': [], 'precompiled validators': []}
+    for _ in range(repeat):
+        timings['unchecked parse'].append(measure(requests, rounds, unchecked))
+        timings['precompiled validators'].append(measure(requests, rounds, validated))
+
+    for name, elapsed in timings.items():
+        print(f'{name:<24} {min(elapsed) * 1000:8.3f} ms/request')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=400)
+    parser.add_argument('--rounds', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.devices, args.rounds, args.repeat)
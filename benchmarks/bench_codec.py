@@ -0,0 +1,73 @@
+"""
+Share of JSON encoding/decoding in /devices/query and /devices/action
+handling for a fleet of simulated devices, per available codec.
+
+Request time is measured as decoding the request body, rendering device
+states and encoding the response, the codec share is the time spent
+in codec.loads()/codec.dumps().
+
+Run with:
+    $ PYTHONPATH=. python benchmarks/bench_codec.py
+"""
+
+import time
+import asyncio
+import argparse
+
+from dialogs import codec
+from dialogs.protocol.base import Device
+
+from bench_state import make_fleet
+
+
+def make_query(devices: list[Device]) -> bytes:
+    return codec.dumps({'devices': [{'id': device.device_id, 'custom_data': None} for device in devices]})
+
+
+def make_response(devices_states: list[dict]) -> dict:
+    return {'request_id': 'req', 'payload': {'devices': devices_states}}
+
+
+async def handle(devices: dict[str, Device], body: bytes) -> tuple[float, float]:
+    started = time.perf_counter()
+    query = codec.loads(body)
+    decoded = time.perf_counter()
+    states = [await devices[item['id']].state() for item in query['devices']]
+    rendered = time.perf_counter()
+    codec.dumps(make_response(states))
+    finished = time.perf_counter()
+    return (decoded - started) + (finished - rendered), finished - started
+
+
+async def measure(name: str, devices: dict[str, Device], rounds: int) -> None:
+    codec.setup(name)
+    body = make_query(list(devices.values()))
+
+    codec_time = total_time = 0.
+    for _ in range(rounds):
+        spent, total = await handle(devices, body)
+        codec_time += spent
+        total_time += total
+
+    print(
+        f'{name:<8} {total_time / rounds * 1000:8.3f} ms/request, '
+        f'codec {codec_time / rounds * 1000:8.3f} ms ({codec_time / total_time:.0%})'
+    )
+
+
+async def main(size: int, rounds: int) -> None:
+    devices = {device.device_id: device for device in make_fleet(size)}
+    print(f'{size} devices, {rounds} rounds')
+    for name in ('stdlib', 'orjson'):
+        try:
+            await measure(name, devices, rounds)
+        except ImportError:
+            print(f'{name:<8} not installed')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.devices, args.rounds))
@@ -0,0 +1,97 @@
+"""
+Memory footprint of protocol objects for a fleet of simulated devices.
+
+Slotted classes are compared with equivalent subclasses, that get
+per-instance __dict__ back, which is how protocol objects were laid out
+before they were slotted.
+
+Run with:
+    $ PYTHONPATH=. python benchmarks/bench_memory.py
+"""
+
+import gc
+import argparse
+import tracemalloc
+
+from dialogs.protocol.device import Light, Sensor
+from dialogs.protocol.capability import OnOff, Range, ColorSetting
+from dialogs.protocol.float_property import Temperature, Humidity
+
+
+def with_dict(klass: type) -> type:
+    # subclass without __slots__ gets __dict__ and __weakref__ back
+    return type(klass.__name__, (klass,), {})
+
+
+def make_fleet(size: int, classes: dict[str, type]) -> list:
+    devices = []
+    for idx in range(size):
+        if idx % 2:
+            devices.append(classes['Light'](
+                device_id=f'light-{idx}',
+                capabilities=[
+                    classes['OnOff'](initial_value=True, retrievable=True, reportable=True),
+                    classes['Range'](
+                        instance=Range.Instance.Brightness,
+                        unit=Range.Unit.Percent,
+                        min_value=0.,
+                        max_value=100.,
+                        initial_value=float(idx % 100),
+                        retrievable=True,
+                        reportable=True,
+                    ),
+                    classes['ColorSetting'](
+                        temperature=classes['Temperature'](min=2700, max=6500, value=4500),
+                        retrievable=True,
+                        reportable=True,
+                    ),
+                ],
+            ))
+        else:
+            devices.append(classes['Sensor'](
+                device_id=f'sensor-{idx}',
+                capabilities=[],
+                properties=[
+                    classes['TemperatureProperty'](unit=Temperature.Unit.Celsius, initial_value=20., reportable=True),
+                    classes['Humidity'](initial_value=50., reportable=True),
+                ],
+            ))
+    return devices
+
+
+def measure(size: int, classes: dict[str, type]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fleet = make_fleet(size, classes)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del fleet
+    return total / size
+
+
+def main(size: int) -> None:
+    slotted = {
+        'Light': Light,
+        'Sensor': Sensor,
+        'OnOff': OnOff,
+        'Range': Range,
+        'ColorSetting': ColorSetting,
+        'Temperature': ColorSetting.Temperature,
+        'TemperatureProperty': Temperature,
+        'Humidity': Humidity,
+    }
+    unslotted = {name: with_dict(klass) for name, klass in slotted.items()}
+
+    print(f'{size} devices')
+    for name, classes in (('with __dict__', unslotted), ('slotted', slotted)):
+        print(f'{name:<16} {measure(size, classes):10.1f} bytes/device')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=10000)
+    args = parser.parse_args()
+    main(args.devices)
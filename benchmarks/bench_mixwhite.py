@@ -0,0 +1,99 @@
+"""
+Cost of a fast fade on WbMixwhiteLight: every step computes channel values
+and then handles status messages of both channels, as Wirenboard echoes them.
+
+Compares calculation with INFO logging on every call, that the light did
+before, with precomputed channel tables (nearest step and interpolated).
+
+Run with:
+    $ PYTHONPATH=. python benchmarks/bench_mixwhite.py
+"""
+
+import time
+import asyncio
+import logging
+import argparse
+
+from dialogs.devices.wirenboard.mixwhite_light import WbMixwhiteLight
+
+
+class FakeMqtt:
+    def subscribe(self, topic, callback):
+        pass
+
+    def send(self, topic, message):
+        pass
+
+
+class FormulaLight(WbMixwhiteLight):
+    """
+    Channel calculation as it was done before channel tables.
+    """
+    def get_cold_and_warm_channels(self, temperature, brightness):
+        log = logging.getLogger('wb.mixwhiteight')
+        log.info(
+            "Calculating cold and warm channels for brightness %r and %d <= T %d <= %d",
+            brightness, self.warm_temperature, temperature, self.cold_temperature,
+        )
+        scale = self.range_high - self.range_low
+        if self.cold_temperature - temperature < temperature - self.warm_temperature:
+            log.info("%d is closer to cold temperature", temperature)
+            cold_ratio = brightness
+            warm_ratio = brightness * (self.cold_temperature - temperature) / (temperature - self.warm_temperature)
+        else:
+            log.info("%d is closer to warm temperature", temperature)
+            warm_ratio = brightness
+            cold_ratio = brightness * (temperature - self.warm_temperature) / (self.cold_temperature - temperature)
+        return int(cold_ratio * scale + self.range_low), int(warm_ratio * scale + self.range_low)
+
+
+def make_light(klass: type, **kwargs) -> WbMixwhiteLight:
+    return klass(
+        FakeMqtt(),
+        device_id='light',
+        name='Light',
+        warm_status_path='/warm',
+        warm_control_path='/warm/on',
+        cold_status_path='/cold',
+        cold_control_path='/cold/on',
+        warm_temperature=2700,
+        cold_temperature=6500,
+        range_low=0,
+        range_high=1000,
+        **kwargs,
+    )
+
+
+async def fade(light: WbMixwhiteLight, steps: int) -> None:
+    # brightness goes down while temperature goes warmer, like a sunset
+    for step in range(steps):
+        temperature = 6500 - 3800 * step // steps
+        cold, warm = light.get_cold_and_warm_channels(temperature, 1. - step / steps)
+        await light.on_data_changed('/cold', str(cold))
+        await light.on_data_changed('/warm', str(warm))
+
+
+async def measure(name: str, light: WbMixwhiteLight, steps: int, rounds: int) -> None:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await fade(light, steps)
+    elapsed = (time.perf_counter() - started) / rounds / steps
+    print(f'{name:<32} {elapsed * 1e6:8.3f} us/step')
+
+
+async def main(steps: int, rounds: int) -> None:
+    # production logging setup: INFO messages are written
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+    print(f'fade of {steps} steps, {rounds} rounds')
+    await measure('formula with INFO logging', make_light(FormulaLight), steps, rounds)
+    await measure('table, 10K step', make_light(WbMixwhiteLight), steps, rounds)
+    interpolated = make_light(WbMixwhiteLight, temperature_step=100, interpolate=True)
+    await measure('table, 100K step, interpolated', interpolated, steps, rounds)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.steps, args.rounds))
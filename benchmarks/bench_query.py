@@ -0,0 +1,76 @@
+"""
+Benchmark of /devices/query response assembly, when a small share
+of devices changes between queries.
+
+Compares building the whole response dict and encoding it at once
+with gluing pre-serialized per-device fragments.
+
+Run with:
+    $ PYTHONPATH=. python benchmarks/bench_query.py
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from dialogs.protocol.base import Device
+from dialogs.protocol.capability import Range
+
+from bench_state import make_fleet
+
+
+def mutate(devices: list[Device], share: float, rng: random.Random) -> None:
+    for device in rng.sample(devices, max(1, int(len(devices) * share))):
+        for item in device.capability_views.retrievable + device.property_views.retrievable:
+            if isinstance(item, Range) or type(item.value) is float:
+                item.value = float(rng.randrange(100))
+                break
+
+
+async def full_encode(devices: list[Device]) -> bytes:
+    return json.dumps({
+        'request_id': 'req',
+        'payload': {
+            'devices': [await device.state() for device in devices],
+        },
+    }).encode()
+
+
+async def fragments(devices: list[Device]) -> bytes:
+    return b''.join((
+        b'{"request_id": "req", "payload": {"devices": [',
+        b', '.join([await device.serialized_state() for device in devices]),
+        b']}}',
+    ))
+
+
+async def measure(name: str, devices: list[Device], share: float, rounds: int, fn) -> None:
+    rng = random.Random(42)
+    elapsed = 0.
+    for _ in range(rounds):
+        mutate(devices, share, rng)
+        started = time.perf_counter()
+        await fn(devices)
+        elapsed += time.perf_counter() - started
+
+    print(f'{name:<24} {rounds / elapsed:10.1f} queries/s')
+
+
+async def main(size: int, share: float, rounds: int) -> None:
+    devices = make_fleet(size)
+    print(f'{size} devices, {share:.0%} changed between queries, {rounds} rounds')
+    assert json.loads(await full_encode(devices)) == json.loads(await fragments(devices))
+
+    await measure('state + json.dumps', devices, share, rounds, full_encode)
+    await measure('serialized fragments', devices, share, rounds, fragments)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--changed', type=float, default=0.01)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.devices, args.changed, args.rounds))
@@ -0,0 +1,99 @@
+"""
+Benchmark of device state rendering for a fleet of simulated devices.
+
+Compares Device.state()/report() with the old way of collecting states
+through per-capability async generators.
+
+Run with:
+    $ PYTHONPATH=. python benchmarks/bench_state.py
+"""
+
+import time
+import asyncio
+import argparse
+
+from dialogs.protocol.base import Device
+from dialogs.protocol.device import Light, Sensor
+from dialogs.protocol.capability import OnOff, Range, ColorSetting
+from dialogs.protocol.float_property import Temperature, Humidity
+
+
+def make_fleet(size: int) -> list[Device]:
+    devices: list[Device] = []
+    for idx in range(size):
+        if idx % 2:
+            devices.append(Light(
+                device_id=f'light-{idx}',
+                capabilities=[
+                    OnOff(initial_value=True, retrievable=True, reportable=True),
+                    Range(
+                        instance=Range.Instance.Brightness,
+                        unit=Range.Unit.Percent,
+                        min_value=0.,
+                        max_value=100.,
+                        initial_value=float(idx % 100),
+                        retrievable=True,
+                        reportable=True,
+                    ),
+                    ColorSetting(
+                        temperature=ColorSetting.Temperature(min=2700, max=6500, value=4500),
+                        retrievable=True,
+                        reportable=True,
+                    ),
+                ],
+            ))
+        else:
+            devices.append(Sensor(
+                device_id=f'sensor-{idx}',
+                capabilities=[],
+                properties=[
+                    Temperature(unit=Temperature.Unit.Celsius, initial_value=20. + idx % 10, reportable=True),
+                    Humidity(initial_value=float(idx % 100), reportable=True),
+                ],
+            ))
+    return devices
+
+
+async def async_generators_state(device: Device) -> dict:
+    # the way Device.state() collected states before render_state()
+    caps = [cap.state() for cap in device.capabilities() if cap.retrievable]
+    props = [prop.state() for prop in device.properties() if prop.retrievable]
+    return {
+        'id': device.device_id,
+        'capabilities': [state for cap in caps async for state in cap],
+        'properties': [state for prop in props async for state in prop],
+    }
+
+
+async def measure(name: str, rounds: int, fn) -> None:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await fn()
+    elapsed = (time.perf_counter() - started) / rounds
+    print(f'{name:<32} {elapsed * 1000:8.3f} ms/round')
+
+
+async def main(size: int, rounds: int) -> None:
+    devices = make_fleet(size)
+    print(f'{size} devices, {rounds} rounds')
+
+    async def generators():
+        return [await async_generators_state(device) for device in devices]
+
+    async def state():
+        return [await device.state() for device in devices]
+
+    async def report():
+        return [await device.report({}) for device in devices]
+
+    await measure('async generators state', rounds, generators)
+    await measure('Device.state()', rounds, state)
+    await measure('Device.report()', rounds, report)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.devices, args.rounds))
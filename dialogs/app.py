@@ -1,30 +1,48 @@
 import os
 import typing
+import inspect
 import asyncio
 import logging
 import argparse
+import functools
 
 import toml
 
 import aiohttp_session
 import aiohttp_jinja2
 import aiohttp_remotes
-from aiohttp import web, ClientSession, ClientTimeout
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
 from aiohttp_session.cookie_storage import EncryptedCookieStorage
 
-from dialogs import db, oauth, auth
+from dialogs import codec, db, oauth, auth
 from dialogs.routes.auth import route as auth_route
 from dialogs.routes.debug import route as debug_route
 from dialogs.routes.smarthome import route as smarthome_route, devices_key
 
 from dialogs.mqtt_client import MqttClient
 from dialogs.devices import device_classes
+from dialogs.devices.influx_source import InfluxSources, influx_sources_key
 from dialogs.protocol import notifications
+from dialogs.protocol.history import History, history_key
+from dialogs.protocol.history_store import HistoryStore, history_store_key
+from dialogs.protocol.influx import InfluxExporter, influx_exporter_key
+from dialogs.protocol.supervisor import TaskSupervisor, supervisor_key
 
 
-tasks_key = web.AppKey('smarthome_tasks', list)
 mqtt_key = web.AppKey('mqtt_runnable', typing.Awaitable)
 
+# options of [influx_export] passed to InfluxExporter
+INFLUX_EXPORT_OPTIONS = (
+    'url',
+    'database',
+    'measurement',
+    'batch_size',
+    'flush_interval',
+    'max_buffer',
+    'backoff_initial',
+    'backoff_max',
+)
+
 
 async def start_tasks(app) -> None:
     initial_state = {
@@ -32,16 +50,29 @@ async def start_tasks(app) -> None:
         for device_id, device in app[devices_key].items()
     }
 
-    app[tasks_key] = [
-        asyncio.create_task(device.updater_loop())
-        for device in app[devices_key].values()
-    ]
-    if 'notifications' in app:
-        app[tasks_key].append(
-            asyncio.create_task(
-                app[notifications.notifications_key].notifications_loop(app[devices_key], initial_state)
-            )
+    supervisor = app[supervisor_key]
+    for device_id, device in app[devices_key].items():
+        supervisor.start(f'updater:{device_id}', device.updater_loop, device_id=device_id)
+    if notifications.notifications_key in app:
+        notifier = app[notifications.notifications_key]
+        supervisor.start(
+            'notifier',
+            # previous state is updated in place, so it's kept between restarts
+            functools.partial(notifier.notifications_loop, app[devices_key], initial_state),
         )
+    if history_store_key in app:
+        supervisor.start('history_store', app[history_store_key].flusher_loop)
+    if influx_exporter_key in app:
+        supervisor.start('influx_export', app[influx_exporter_key].export_loop)
+
+
+async def stop_tasks(app) -> None:
+    await app[supervisor_key].close()
+
+
+async def close_history_store(app) -> None:
+    await app[history_store_key].flush()
+    app[history_store_key].close()
 
 
 async def make_app(
@@ -53,6 +84,9 @@ async def make_app(
 ):
     app = web.Application()
 
+    selected_codec = codec.setup(cfg.get('json', {}).get('codec', 'auto'))
+    logging.getLogger('wb.app').info("Using %s JSON codec", selected_codec.name)
+
     app.add_routes(auth_route)
     app.add_routes(smarthome_route)
     if debug:
@@ -64,23 +98,20 @@ async def make_app(
             aiohttp_remotes.XForwardedRelaxed(),
         )
     db.setup(app, f'sqlite:///{db_path}')
-    oauth.setup(app)
+    oauth_cfg = cfg.get('oauth', {})
+    oauth.setup(
+        app,
+        signed_access_tokens=oauth_cfg.get('signed_access_tokens', False),
+        code_store=oauth_cfg.get('authorization_code_store', 'memory'),
+    )
     aiohttp_jinja2.setup(app, loader=aiohttp_jinja2.jinja2.FileSystemLoader('static'))
     aiohttp_jinja2.get_env(app).globals.update(
         url_for=lambda path: app.router[path].url_for(),
         DEBUG=debug,
     )
 
-    db_session = db.session_maker()
-    cookie_key = db_session.query(db.ServerSettings).filter_by(option='cookie_key').first()
-    if not cookie_key:
-        cookie_key = db.ServerSettings()
-        cookie_key.option = 'cookie_key'
-        cookie_key.value = open('/dev/urandom', 'rb').read(32)
-        db_session.add(cookie_key)
-        db_session.commit()
-
-    aiohttp_session.setup(app, EncryptedCookieStorage(cookie_key.value))
+    cookie_key = db.get_or_create_secret(db.session_maker(), 'cookie_key')
+    aiohttp_session.setup(app, EncryptedCookieStorage(cookie_key))
     auth.setup(app)
 
     has_mqtt = 'mqtt' in cfg
@@ -89,6 +120,7 @@ async def make_app(
         app[mqtt_key] = asyncio.create_task(mqtt_client.run())
 
     app[devices_key] = {}
+    app[supervisor_key] = TaskSupervisor()
 
     if 'notifications' in cfg:
         app[notifications.notifications_key] = notifications.Notifications(
@@ -101,6 +133,16 @@ async def make_app(
         )
         app.on_startup.append(lambda app: app[notifications.notifications_key].send_device_specifications_updated())
 
+        # skill was unlinked before restart, keep silence until it's linked again
+        linked = db.session_maker().query(db.Token).join(db.Token.user).filter(
+            db.User.username == cfg['notifications']['user_id'],
+            db.Token.revoked.is_(False),
+        ).first()
+        if linked is None:
+            app[notifications.notifications_key].pause()
+
+    # device class name -> seconds
+    stale_after = cfg.get('stale_after', {})
     for device_id, device_spec in cfg['devices'].items():
         device_class = device_spec.pop('_class')
         device_spec['device_id'] = device_id
@@ -112,9 +154,52 @@ async def make_app(
             device_spec['mqtt_client'] = mqtt_client
 
         klass = device_classes[device_class]
-        app[devices_key][device_id] = klass(**device_spec)
+        # devices reading InfluxDB share sources of the application
+        if 'influx_sources' in inspect.signature(klass).parameters:
+            if influx_sources_key not in app:
+                app[influx_sources_key] = InfluxSources()
+                app.on_cleanup.append(lambda app: app[influx_sources_key].close())
+            device_spec['influx_sources'] = app[influx_sources_key]
+
+        device = app[devices_key][device_id] = klass(**device_spec)
+        if device_class in stale_after:
+            device.stale_after = stale_after[device_class]
+
+    if 'history' in cfg:
+        history = app[history_key] = History(memory_budget=cfg['history'].get('memory_budget', 16384))
+        for device in app[devices_key].values():
+            history.track(device)
+
+    if 'history_store' in cfg:
+        store_cfg = cfg['history_store']
+        store = app[history_store_key] = HistoryStore(
+            path=store_cfg['path'],
+            rotate_interval=store_cfg.get('rotate_hours', 24) * 3600.,
+            retention=store_cfg.get('retention_days', 7) * 86400.,
+        )
+        for device in app[devices_key].values():
+            store.track(device)
+        app.on_cleanup.append(close_history_store)
+
+    if 'influx_export' in cfg:
+        export_cfg = cfg['influx_export']
+        unknown = export_cfg.keys() - {*INFLUX_EXPORT_OPTIONS, 'connections'}
+        if unknown:
+            raise RuntimeError(f"Unknown influx_export options: {', '.join(sorted(unknown))}")
+
+        exporter = app[influx_exporter_key] = InfluxExporter(
+            session=ClientSession(
+                connector=TCPConnector(limit=export_cfg.get('connections', 2)),
+                timeout=ClientTimeout(total=30., connect=2.),
+            ),
+            **{key: export_cfg[key] for key in INFLUX_EXPORT_OPTIONS if key in export_cfg},
+        )
+        for device in app[devices_key].values():
+            exporter.track(device)
+        app.on_cleanup.append(lambda app: app[influx_exporter_key].close())
 
     app.on_startup.append(start_tasks)
+    app.on_cleanup.insert(0, stop_tasks)
 
     if prefix.rstrip('/'):
         main_app = web.Application()
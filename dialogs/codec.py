@@ -0,0 +1,95 @@
+"""
+JSON codec used for API requests, responses and notifications.
+
+Codec is selected once at startup: stdlib json is always available,
+orjson is used if it's installed and allowed by config.
+"""
+
+import json
+import typing
+
+from aiohttp import web
+
+
+__all__ = ['setup', 'dumps', 'loads', 'json_response']
+
+
+class Codec(typing.Protocol):
+    name: str
+
+    def dumps(self, data: typing.Any) -> bytes: ...
+
+    def loads(self, data: bytes | str) -> typing.Any: ...
+
+
+class StdlibCodec:
+    name = 'stdlib'
+
+    def dumps(self, data: typing.Any) -> bytes:
+        return json.dumps(data).encode()
+
+    def loads(self, data: bytes | str) -> typing.Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, data: typing.Any) -> bytes:
+        return self._orjson.dumps(data)
+
+    def loads(self, data: bytes | str) -> typing.Any:
+        return self._orjson.loads(data)
+
+
+_codecs: dict[str, typing.Callable[[], Codec]] = {
+    'orjson': OrjsonCodec,
+    'stdlib': StdlibCodec,
+}
+codec: Codec = StdlibCodec()
+
+
+def setup(name: str = 'auto') -> Codec:
+    """
+    Select codec by name, 'auto' picks the fastest available one.
+    """
+    global codec
+
+    if name == 'auto':
+        for candidate in _codecs.values():
+            try:
+                codec = candidate()
+                break
+            except ImportError:
+                continue
+    elif name in _codecs:
+        codec = _codecs[name]()
+    else:
+        raise ValueError(f"Unknown JSON codec: {name!r}")
+
+    return codec
+
+
+def dumps(data: typing.Any) -> bytes:
+    return codec.dumps(data)
+
+
+def loads(data: bytes | str) -> typing.Any:
+    return codec.loads(data)
+
+
+def json_response(
+    data: typing.Any,
+    status: int = 200,
+    headers: typing.Optional[typing.Mapping[str, str]] = None,
+) -> web.Response:
+    return web.Response(
+        body=codec.dumps(data),
+        status=status,
+        headers=headers,
+        content_type='application/json',
+    )
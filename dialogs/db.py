@@ -121,6 +121,21 @@ def Session() -> OrmSession:
     return db_session.get()
 
 
+def get_or_create_secret(session: OrmSession, option: str, size: int = 32) -> bytes:
+    """
+    Get random secret stored in server settings, generating it on the first use.
+    """
+    setting = session.query(ServerSettings).filter_by(option=option).first()
+    if not setting:
+        setting = ServerSettings()
+        setting.option = option
+        setting.value = open('/dev/urandom', 'rb').read(size)
+        session.add(setting)
+        session.commit()
+
+    return setting.value
+
+
 def setup(app, connstring):
     engine = create_engine(
         connstring,
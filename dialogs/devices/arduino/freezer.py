@@ -8,22 +8,24 @@ for sensors. For more recent implmenetation see freezer2 module.
 """
 
 import typing
-import logging
-import asyncio
-
-import aiohttp
 
+from dialogs.devices.influx_source import InfluxSources
 from dialogs.protocol.device import Other
 from dialogs.protocol.capability import Range, Toggle
 
 
 class Freezer(Other):
+    pull_based = True
+
     def __init__(
         self,
+        influx_sources: InfluxSources,
         device_id: str,
         name: str,
         description: typing.Optional[str] = None,
         room: typing.Optional[str] = None,
+        influx_url: str = 'http://localhost:8086',
+        max_age: float = 30.,
     ):
         self.temperature = Range(
             instance=Range.Instance.Temperature,
@@ -57,32 +59,20 @@ class Freezer(Other):
             hw_version='2.0',
             sw_version='6.0',
         )
+        self.max_age = max_age
+        self.source = influx_sources.get(influx_url)
+        self.source.subscribe('freezer', 'freezer', self.on_data)
 
-    async def _fetch(self, client: aiohttp.ClientSession) -> dict:
-        async with client.get("http://localhost:8086/query", params={
-            "db": "freezer",
-            "q": "select * from freezer order by time desc limit 1",
-        }) as resp:
-            data = await resp.json()
-            data = data['results'][0]['series'][0]
-            columns = data['columns']
-            values = data['values'][0]
-            result = dict(zip(columns, values))
-            logging.getLogger('freezer').info("fetched %s", result)
-            return result
+    async def refresh(self, interactive: bool) -> None:
+        await self.source.fetch(self.max_age, interactive)
 
-    async def updater_loop(self) -> None:
-        async with aiohttp.ClientSession() as client:
-            while True:
-                try:
-                    response = await self._fetch(client)
-                    if response['temperature_bme'] is not None:
-                        self.temperature.value = response['temperature_bme']
-                    if response['humidity_bme'] is not None:
-                        self.humidity.value = response['humidity_bme']
-                    if response['cooler'] is not None:
-                        self.cooler.value = bool(response['cooler'])
-                except Exception:
-                    logging.getLogger('freezer').exception("fetch failed")
+    def on_data(self, row: dict) -> None:
+        if row['temperature_bme'] is not None:
+            self.temperature.value = row['temperature_bme']
+        if row['humidity_bme'] is not None:
+            self.humidity.value = row['humidity_bme']
+        if row['cooler'] is not None:
+            self.cooler.value = bool(row['cooler'])
 
-                await asyncio.sleep(10)
+    async def updater_loop(self) -> None:
+        await self.source.run()
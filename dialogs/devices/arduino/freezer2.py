@@ -8,22 +8,24 @@ available. For older implmenetation see freezer module.
 """
 
 import typing
-import logging
-import asyncio
-
-import aiohttp
 
+from dialogs.devices.influx_source import InfluxSources
 from dialogs.protocol.device import Other
 from dialogs.protocol.float_property import Humidity, Temperature, Power
 
 
 class FreezerWatcher(Other):
+    pull_based = True
+
     def __init__(
         self,
+        influx_sources: InfluxSources,
         device_id: str,
         name: str,
         description: typing.Optional[str] = None,
         room: typing.Optional[str] = None,
+        influx_url: str = 'http://localhost:8086',
+        max_age: float = 30.,
     ):
         self.temperature = Temperature(unit=Temperature.Unit.Celsius)
         self.humidity = Humidity()
@@ -40,32 +42,20 @@ class FreezerWatcher(Other):
             hw_version='2.0',
             sw_version='7.0',
         )
+        self.max_age = max_age
+        self.source = influx_sources.get(influx_url)
+        self.source.subscribe('freezer', 'freezer', self.on_data)
 
-    async def _fetch(self, client: aiohttp.ClientSession) -> dict:
-        async with client.get("http://localhost:8086/query", params={
-            "db": "freezer",
-            "q": "select * from freezer order by time desc limit 1",
-        }) as resp:
-            data = await resp.json()
-            data = data['results'][0]['series'][0]
-            columns = data['columns']
-            values = data['values'][0]
-            result = dict(zip(columns, values))
-            logging.getLogger('freezer').info("fetched %s", result)
-            return result
+    async def refresh(self, interactive: bool) -> None:
+        await self.source.fetch(self.max_age, interactive)
 
-    async def updater_loop(self) -> None:
-        async with aiohttp.ClientSession() as client:
-            while True:
-                try:
-                    response = await self._fetch(client)
-                    if response['temperature_bme'] is not None:
-                        self.temperature.assign(response['temperature_bme'])
-                    if response['humidity_bme'] is not None:
-                        self.humidity.assign(response['humidity_bme'])
-                    if response['cooler'] is not None:
-                        self.cooler.assign(response['cooler'])
-                except Exception:
-                    logging.getLogger('freezer').exception("fetch failed")
+    def on_data(self, row: dict) -> None:
+        if row['temperature_bme'] is not None:
+            self.temperature.assign(row['temperature_bme'])
+        if row['humidity_bme'] is not None:
+            self.humidity.assign(row['humidity_bme'])
+        if row['cooler'] is not None:
+            self.cooler.assign(row['cooler'])
 
-                await asyncio.sleep(10)
+    async def updater_loop(self) -> None:
+        await self.source.run()
@@ -0,0 +1,218 @@
+"""
+Shared data source for devices, that read their metrics from InfluxDB.
+
+All the subscribed measurements of a database are fetched with a single
+request per poll, and the latest rows are fanned out to subscribers.
+
+Data is pulled on demand by devices, when it's older than they accept,
+and refreshed in background: often while the state is being queried,
+and with growing interval while nobody is interested.
+"""
+
+import time
+import typing
+import asyncio
+import logging
+
+import yarl
+import aiohttp
+from aiohttp.web import AppKey
+
+
+Row = dict[str, typing.Any]
+RowCallback = typing.Callable[[Row], None]
+
+
+class InfluxSource:
+    def __init__(
+        self,
+        url: str = 'http://localhost:8086',
+        poll_interval: float = 10.,
+        max_interval: float = 300.,
+        idle_after: float = 120.,
+        timeout: float = 30.,
+        query_timeout: float = 2.,
+    ):
+        """
+        :param poll_interval: background refresh interval while the data is queried.
+        :param max_interval: background refresh interval backs off up to it when idle.
+        :param idle_after: seconds since the last query to consider the source idle.
+        :param timeout: total timeout of a poll.
+        :param query_timeout: user query waits for a poll at most that long,
+                              then previous values are used.
+        """
+        self.query_url = yarl.URL(url).join(yarl.URL('query'))
+        self.poll_interval = poll_interval
+        self.max_interval = max_interval
+        self.idle_after = idle_after
+        self.timeout = timeout
+        self.query_timeout = query_timeout
+        # database -> measurement -> callbacks
+        self.subscriptions: dict[str, dict[str, list[RowCallback]]] = {}
+        self.log = logging.getLogger('wb.influx_source')
+
+        self.fetched_at = -float('inf')
+        self.polled_at = -float('inf')
+        self.queried_at = -float('inf')
+        self.polls = 0
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._inflight: typing.Optional[asyncio.Future] = None
+        self._wakeup: typing.Optional[asyncio.Event] = None
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def subscribe(self, database: str, measurement: str, callback: RowCallback) -> None:
+        """
+        Call callback with the latest row of the measurement on every poll.
+        """
+        self.subscriptions.setdefault(database, {}).setdefault(measurement, []).append(callback)
+
+    @staticmethod
+    def build_query(measurements: typing.Iterable[str]) -> str:
+        return '; '.join(
+            f'select * from "{measurement}" order by time desc limit 1'
+            for measurement in measurements
+        )
+
+    @property
+    def idle(self) -> bool:
+        return time.monotonic() - self.queried_at > self.idle_after
+
+    async def poll(self, session: aiohttp.ClientSession) -> None:
+        for database, measurements in list(self.subscriptions.items()):
+            names = list(measurements)
+            async with session.get(self.query_url, params={
+                'db': database,
+                'q': self.build_query(names),
+            }) as resp:
+                data = await resp.json()
+
+            # results are in the order of statements
+            for name, result in zip(names, data['results']):
+                series = result.get('series')
+                if not series:
+                    self.log.warning("No data for %s.%s: %r", database, name, result.get('error'))
+                    continue
+
+                row = dict(zip(series[0]['columns'], series[0]['values'][0]))
+                self.log.info("fetched %s.%s: %s", database, name, row)
+                for callback in measurements[name]:
+                    try:
+                        callback(row)
+                    except Exception:
+                        self.log.exception("Subscriber of %s.%s failed", database, name)
+
+    async def _poll_once(self) -> None:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        self.polls += 1
+        try:
+            await self.poll(self._session)
+        except Exception:
+            # devices keep their previous values, the next query will retry
+            self.log.exception("fetch failed")
+        else:
+            self.fetched_at = time.monotonic()
+        finally:
+            # failed polls are also accounted, so the background refresh does not spin
+            self.polled_at = time.monotonic()
+
+    async def refresh(self) -> None:
+        """
+        Poll now, joining the poll in flight if there is one.
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._poll_once())
+            self._inflight.add_done_callback(self._poll_done)
+        await asyncio.shield(self._inflight)
+
+    def _poll_done(self, future: asyncio.Future) -> None:
+        self._inflight = None
+
+    async def fetch(self, max_age: float, interactive: bool = True) -> None:
+        """
+        Make sure the data is not older than max_age seconds.
+
+        :param interactive: the data is requested by user query, and not
+                            by background reporting, so refresh is sped up.
+        """
+        now = time.monotonic()
+        if interactive:
+            if self._wakeup is not None and self.idle:
+                self._wakeup.set()
+            self.queried_at = now
+
+        if now - self.fetched_at <= max_age:
+            return
+
+        if not interactive:
+            await self.refresh()
+            return
+
+        try:
+            # poll is shielded and goes on, its result is used by the next query
+            await asyncio.wait_for(self.refresh(), self.query_timeout)
+        except asyncio.TimeoutError:
+            self.log.warning("Poll takes longer than %.1f seconds, using previous values", self.query_timeout)
+
+    async def _poll_loop(self) -> None:
+        self._wakeup = asyncio.Event()
+        interval = self.poll_interval
+        try:
+            while True:
+                delay = self.polled_at + interval - time.monotonic()
+                if delay > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    else:
+                        interval = self.poll_interval
+                    continue
+
+                await self.refresh()
+                interval = min(interval * 2, self.max_interval) if self.idle else self.poll_interval
+        finally:
+            self._wakeup = None
+            if self._session is not None:
+                await self._session.close()
+
+    async def run(self) -> None:
+        """
+        Run background refresh, which is shared by all the callers: it's
+        started by the first one and continues while the application runs.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll_loop())
+        await asyncio.shield(self._task)
+
+    async def close(self) -> None:
+        """
+        Stop background refresh and the poll in flight, close the session.
+        """
+        tasks = [task for task in (self._task, self._inflight) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+
+class InfluxSources:
+    """
+    Sources of the application, one per InfluxDB, shared by all devices reading from it.
+    """
+    def __init__(self):
+        self.sources: dict[str, InfluxSource] = {}
+
+    def get(self, url: str = 'http://localhost:8086') -> InfluxSource:
+        if url not in self.sources:
+            self.sources[url] = InfluxSource(url)
+        return self.sources[url]
+
+    async def close(self) -> None:
+        await asyncio.gather(*(source.close() for source in self.sources.values()))
+
+
+influx_sources_key = AppKey('influx_sources', InfluxSources)
@@ -4,10 +4,12 @@ This curtain doesn't provide its current position,
 but it reports the state of its two available controls:
     - motor (on/off)
     - direction (up/down)
+
+Position is estimated from the time motor was running in each direction.
 """
 
+import time
 import typing
-import asyncio
 import logging
 
 from dialogs.mqtt_client import MqttClient
@@ -16,9 +18,73 @@ from dialogs.protocol.device import Curtain
 from dialogs.protocol.consts import ActionError
 from dialogs.protocol.exceptions import ActionException
 from dialogs.protocol.capability import Toggle, Mode, OnOff, Range
+from dialogs.protocol.executor import ActionPolicy
+
+
+class PositionModel:
+    """
+    Estimates curtain position in percents (0 is closed, 100 is open)
+    by integrating motor running time, assuming constant speed.
+
+    Position is unknown until the curtain is fully opened or closed:
+    motor was running in one direction for the whole travel time.
+    """
+    def __init__(self, travel_time: float, clock: typing.Callable[[], float] = time.monotonic):
+        self.travel_time = travel_time
+        self.clock = clock
+        self.running = False
+        self.opening = True
+        self._position: typing.Optional[float] = None
+        # time since the motor was started or changed direction
+        self._run_time = 0.
+        self._since = clock()
+
+    def _integrate(self) -> None:
+        now = self.clock()
+        if self.running:
+            elapsed = now - self._since
+            self._run_time += elapsed
+            if self._position is not None:
+                shift = elapsed * 100. / self.travel_time
+                self._position = min(100., self._position + shift) if self.opening else max(0., self._position - shift)
+            elif self._run_time >= self.travel_time:
+                self._position = 100. if self.opening else 0.
+        self._since = now
+
+    def position(self) -> typing.Optional[float]:
+        self._integrate()
+        return self._position
+
+    def set_running(self, running: bool) -> None:
+        self._integrate()
+        if running and not self.running:
+            self._run_time = 0.
+        self.running = running
+
+    def set_opening(self, opening: bool) -> None:
+        self._integrate()
+        if opening != self.opening:
+            self._run_time = 0.
+        self.opening = opening
+
+    def travel_delay(self, target: float) -> float:
+        """
+        Motor running time to move from the current position to the target.
+        Curtain is moved to the end positions for the whole travel time,
+        which also corrects accumulated estimation error.
+        """
+        position = self.position()
+        if target <= 0. or target >= 100. or position is None:
+            return self.travel_time
+        return abs(target - position) * self.travel_time / 100.
 
 
 class WbCurtain(Curtain):
+    # any new command interrupts the movement in progress
+    action_policy = ActionPolicy.LatestWins
+    # position estimation is updated on query
+    pull_based = True
+
     def __init__(
         self,
         mqtt_client: MqttClient,
@@ -31,6 +97,7 @@ class WbCurtain(Curtain):
         action_time_seconds: int,
         description: typing.Optional[str] = None,
         room=None,
+        clock: typing.Callable[[], float] = time.monotonic,
     ):
         self.client = mqtt_client
         self.updown = OnOff(
@@ -54,8 +121,8 @@ class WbCurtain(Curtain):
         self.partial_open = Range(
             instance=Range.Instance.Open,
             unit=Range.Unit.Percent,
-            random_access=False,
-            retrievable=False,
+            retrievable=True,
+            reportable=True,
             min_value=0.,
             max_value=100.,
             precision=5.,
@@ -66,9 +133,9 @@ class WbCurtain(Curtain):
         self.direction_control_path = direction_control_path
         self.motor_control_path = motor_control_path
         self.action_times_seconds = action_time_seconds
+        self.position = PositionModel(action_time_seconds, clock)
         self.client.subscribe(self.direction_status_path, self.on_direction_changed)
         self.client.subscribe(self.motor_status_path, self.on_motor_changed)
-        self.task: typing.Optional[asyncio.Task] = None
         super().__init__(
             device_id=device_id,
             capabilities=[self.updown, self.partial_open, self.direction, self.motor],
@@ -79,10 +146,15 @@ class WbCurtain(Curtain):
             model='WB',
         )
 
-    def cancel_task(self):
-        if self.task is not None:
-            self.task.cancel()
-            self.task = None
+    def update_position(self) -> None:
+        position = self.position.position()
+        if position is not None:
+            # reported position lands on the declared steps
+            precision = self.partial_open.precision
+            self.partial_open.value = round(position / precision) * precision
+
+    async def refresh(self, interactive: bool) -> None:
+        self.update_position()
 
     async def on_direction_changed(self, topic: str, payload: str) -> None:
         value = int(payload)
@@ -90,9 +162,22 @@ class WbCurtain(Curtain):
             self.direction.value = Mode.WorkMode.High
         else:
             self.direction.value = Mode.WorkMode.Low
+        self.position.set_opening(bool(value))
+        self.update_position()
 
     async def on_motor_changed(self, topic: str, payload: str) -> None:
         self.motor.value = payload == "1"
+        self.position.set_running(payload == "1")
+        self.update_position()
+
+    def move(self, opening: bool, duration: float) -> None:
+        """
+        Run motor in the direction and schedule its stop.
+        """
+        self.client.send(self.motor_control_path, "0")
+        self.client.send(self.direction_control_path, str(int(opening)))
+        self.client.send(self.motor_control_path, "1")
+        self.executor.schedule(duration, self.client.send, self.motor_control_path, "0")
 
     async def change_updown(
         self,
@@ -102,16 +187,8 @@ class WbCurtain(Curtain):
         /,
         **kwargs,
     ) -> typing.Tuple[str, str]:
-        async def task():
-            self.client.send(self.motor_control_path, "0")
-            self.client.send(self.direction_control_path, str(int(value)))
-            self.client.send(self.motor_control_path, "1")
-            await asyncio.sleep(self.action_times_seconds)
-            self.client.send(self.motor_control_path, "0")
-
-        self.cancel_task()
         logging.getLogger('wb').info("Switching curtain to %s", value)
-        self.task = asyncio.create_task(task())
+        self.move(value, self.action_times_seconds)
         return (capability.type_id, instance)
 
     async def change_partial_open(
@@ -123,16 +200,21 @@ class WbCurtain(Curtain):
         relative: bool = False,
         **kwargs,
     ) -> typing.Tuple[str, str]:
-        async def task():
-            self.client.send(self.motor_control_path, "0")
-            self.client.send(self.direction_control_path, '1' if value < 0 else '0')
-            self.client.send(self.motor_control_path, "1")
-            await asyncio.sleep(2)
-            self.client.send(self.motor_control_path, "0")
-
-        self.cancel_task()
-        logging.getLogger('wb.curtain').info("Shifting curtain to %s", value)
-        self.task = asyncio.create_task(task())
+        position = self.position.position()
+        target = (position or 0.) + value if relative else value
+        target = min(100., max(0., target))
+        if position is None and target not in (0., 100.):
+            raise ActionException(
+                capability.type_id,
+                instance,
+                ActionError.NotSupportedInCurrentMode,
+                "Curtain position is unknown, open or close it fully first",
+            )
+
+        logging.getLogger('wb.curtain').info("Moving curtain from %s to %s", position, target)
+        if target != position:
+            opening = target == 100. if position is None else target > position
+            self.move(opening, self.position.travel_delay(target))
         return (capability.type_id, instance)
 
     async def change_direction(
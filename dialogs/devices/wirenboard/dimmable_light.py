@@ -42,6 +42,8 @@ class WbDimmableLight(Light):
             min_value=0.,
             max_value=100.,
             precision=1. if (range_high - range_low) < 500 else 0.1,
+            # merge slider drags and bursts of relative changes into a single publish
+            coalesce=0.2,
         )
 
         self.last_val = 100.
@@ -19,8 +19,12 @@ But:
        and stick to classic linear T = p*Tw + q*Tc,
        where p + q = 1 (p, q —  ratios of warm and cold channel)
          and Tw, Tc — temperatures of warm and cold channels.
+
+Channel shares for each temperature and channel ratios for each channel
+value are precomputed, as they are needed on every status message.
 """
 
+import array
 import typing
 import logging
 
@@ -31,6 +35,106 @@ from dialogs.protocol.capability import Range, OnOff, ColorSetting
 from dialogs.protocol.exceptions import ActionException, ActionError
 
 
+log = logging.getLogger('wb.mixwhitelight')
+
+
+class ChannelTable:
+    """
+    Precomputed mapping between temperature with brightness and channel values.
+
+    For every temperature step the table keeps brightness-independent shares
+    of the channels: the channel closer to the temperature is fully on and
+    the other one is dimmed proportionally, so brightness only scales them.
+    Temperatures between the steps get the nearest step, or are interpolated.
+    For the reverse mapping ratio of every channel value is kept.
+    """
+    def __init__(
+        self,
+        warm_temperature: int,
+        cold_temperature: int,
+        range_low: int,
+        range_high: int,
+        step: int = 10,
+        interpolate: bool = False,
+    ):
+        if step <= 0:
+            raise ValueError(f"Temperature step must be positive: got {step}")
+
+        self.warm_temperature = warm_temperature
+        self.cold_temperature = cold_temperature
+        self.range_low = range_low
+        self.range_high = range_high
+        self.step = step
+        self.interpolate = interpolate
+
+        self.temperatures = array.array('d', range(warm_temperature, cold_temperature, step))
+        self.temperatures.append(cold_temperature)
+        self.cold_shares = array.array('d')
+        self.warm_shares = array.array('d')
+        for temperature in self.temperatures:
+            cold_share, warm_share = self.compute_shares(temperature)
+            self.cold_shares.append(cold_share)
+            self.warm_shares.append(warm_share)
+
+        self.ratios = array.array('d', (
+            (value - range_low) / (range_high - range_low)
+            for value in range(range_low, range_high + 1)
+        ))
+
+    def compute_shares(self, temperature: float) -> tuple[float, float]:
+        if self.cold_temperature - temperature < temperature - self.warm_temperature:
+            return 1., (self.cold_temperature - temperature) / (temperature - self.warm_temperature)
+        return (temperature - self.warm_temperature) / (self.cold_temperature - temperature), 1.
+
+    def shares(self, temperature: float) -> tuple[float, float]:
+        """
+        Cold and warm channel ratios at full brightness.
+        """
+        position = (temperature - self.warm_temperature) / self.step
+        last = len(self.temperatures) - 1
+        if position <= 0:
+            return self.cold_shares[0], self.warm_shares[0]
+        if position >= last:
+            return self.cold_shares[last], self.warm_shares[last]
+
+        if not self.interpolate:
+            idx = round(position)
+            return self.cold_shares[idx], self.warm_shares[idx]
+
+        idx = int(position)
+        low, high = self.temperatures[idx], self.temperatures[idx + 1]
+        fraction = (temperature - low) / (high - low)
+        return (
+            self.cold_shares[idx] + (self.cold_shares[idx + 1] - self.cold_shares[idx]) * fraction,
+            self.warm_shares[idx] + (self.warm_shares[idx + 1] - self.warm_shares[idx]) * fraction,
+        )
+
+    def channels(self, temperature: float, brightness: float) -> tuple[int, int]:
+        """
+        Cold and warm channel values for the brightness ratio.
+        """
+        cold_share, warm_share = self.shares(temperature)
+        scale = self.range_high - self.range_low
+        return (
+            int(brightness * cold_share * scale + self.range_low),
+            int(brightness * warm_share * scale + self.range_low),
+        )
+
+    def ratio(self, value: int) -> float:
+        return self.ratios[min(max(value, self.range_low), self.range_high) - self.range_low]
+
+    def temperature(self, warm_ratio: float, cold_ratio: float) -> int:
+        """
+        Temperature of the mix, channel ratios must not be both zero.
+        """
+        temperature = int(
+            (warm_ratio * self.warm_temperature + cold_ratio * self.cold_temperature)
+            / (warm_ratio + cold_ratio)
+        )
+        # strange things occur sometimes
+        return min(max(temperature, self.warm_temperature), self.cold_temperature)
+
+
 class WbMixwhiteLight(Light):
     def __init__(
         self,
@@ -47,6 +151,8 @@ class WbMixwhiteLight(Light):
         range_high: int,
         description: typing.Optional[str] = None,
         room=None,
+        temperature_step: int = 10,
+        interpolate: bool = False,
     ):
         self.client = mqtt_client
         self.onoff = OnOff(
@@ -70,6 +176,8 @@ class WbMixwhiteLight(Light):
             min_value=0.,
             max_value=100.,
             precision=1. if (range_high - range_low) < 500 else 0.1,
+            # merge slider drags and bursts of relative changes into a single publish
+            coalesce=0.2,
         )
         self.temperature = ColorSetting(
             temperature=ColorSetting.Temperature(
@@ -93,6 +201,14 @@ class WbMixwhiteLight(Light):
         self.cold_status_path = cold_status_path
         self.cold_control_path = cold_control_path
         self.cold_temperature = cold_temperature
+        self.table = ChannelTable(
+            warm_temperature,
+            cold_temperature,
+            range_low,
+            range_high,
+            step=temperature_step,
+            interpolate=interpolate,
+        )
 
         self.client.subscribe(self.warm_status_path, self.on_data_changed)
         self.client.subscribe(self.cold_status_path, self.on_data_changed)
@@ -107,12 +223,6 @@ class WbMixwhiteLight(Light):
             model='WB',
         )
 
-    def value_to_ratio(self, val: int) -> float:
-        return min(1., max(0., (val - self.range_low) / (self.range_high - self.range_low)))
-
-    def value_from_ratio(self, val: float) -> int:
-        return int(val * (self.range_high - self.range_low) + self.range_low)
-
     async def on_data_changed(self, topic: str, payload: str) -> None:
         value = self.temperature.value
         assert isinstance(value, ColorSetting.Temperature)
@@ -124,8 +234,8 @@ class WbMixwhiteLight(Light):
         else:
             return
 
-        warm_ratio = self.value_to_ratio(self.warm_value)
-        cold_ratio = self.value_to_ratio(self.cold_value)
+        warm_ratio = self.table.ratio(self.warm_value)
+        cold_ratio = self.table.ratio(self.cold_value)
         percent_value = max(warm_ratio, cold_ratio) * 100.
 
         self.onoff.value = percent_value > 0
@@ -134,44 +244,25 @@ class WbMixwhiteLight(Light):
             self.level.value = percent_value
 
         if percent_value > 0:
-            temperature_value = int(
-                (warm_ratio * self.warm_temperature + cold_ratio * self.cold_temperature)
-                / (warm_ratio + cold_ratio)
-            )
-            # strange things occur sometimes
-            temperature_value = min(max(temperature_value, self.warm_temperature), self.cold_temperature)
+            temperature_value = self.table.temperature(warm_ratio, cold_ratio)
             self.temperature.assign(temperature_value)
 
             self.last_brightness_val = percent_value
             self.last_temperature_val = temperature_value
 
     def get_cold_and_warm_channels(self, temperature: int, brightness: float) -> typing.Tuple[int, int]:
-        logging.getLogger('wb.mixwhiteight').info(
-            "Calculating cold and warm channels for brightness %r and %d <= T %d <= %d",
-            brightness,
-            self.warm_temperature,
-            temperature,
-            self.cold_temperature,
-        )
-        if self.cold_temperature - temperature < temperature - self.warm_temperature:
-            logging.getLogger('wb.mixwhiteight').info("%d is closer to cold temperature", temperature)
-            cold_value = self.value_from_ratio(brightness)
-            warm_ratio = (
-                brightness
-                * (self.cold_temperature - temperature)
-                / (temperature - self.warm_temperature)
+        cold_value, warm_value = self.table.channels(temperature, brightness)
+        # called on every step of a fade, so keep it cheap when debug is off
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                "Channels for brightness %r and %d <= T %d <= %d: cold %d, warm %d",
+                brightness,
+                self.warm_temperature,
+                temperature,
+                self.cold_temperature,
+                cold_value,
+                warm_value,
             )
-            warm_value = self.value_from_ratio(warm_ratio)
-        else:
-            logging.getLogger('wb.mixwhiteight').info("%d is closer to warm temperature", temperature)
-            warm_value = self.value_from_ratio(brightness)
-            cold_ratio = (
-                brightness
-                * (temperature - self.warm_temperature)
-                / (self.cold_temperature - temperature)
-            )
-            cold_value = self.value_from_ratio(cold_ratio)
-
         return cold_value, warm_value
 
     async def change_temperature(
@@ -190,7 +281,7 @@ class WbMixwhiteLight(Light):
             level_value = 100.
 
         cold_value, warm_value = self.get_cold_and_warm_channels(value, level_value / 100)
-        logging.getLogger('wb.mixwhiteight').info(
+        log.info(
             "Switching temperature to %s (cold %s, warm %s)",
             value, cold_value, warm_value,
         )
@@ -216,7 +307,7 @@ class WbMixwhiteLight(Light):
             value += self.level.value
 
         cold_value, warm_value = self.get_cold_and_warm_channels(tvalue.serialize(), value / 100)
-        logging.getLogger('wb.mixwhiteight').info(
+        log.info(
             "Switching brightness to %s (cold %s, warm %s)",
             value, cold_value, warm_value,
         )
@@ -240,7 +331,7 @@ class WbMixwhiteLight(Light):
         else:
             cold_value, warm_value = 0, 0
 
-        logging.getLogger('wb.mixwhitelight').info(
+        log.info(
             "Switching light to %s (cold %s, warm %s)",
             value, cold_value, warm_value,
         )
@@ -2,9 +2,13 @@ import typing
 
 from authlib.oauth2.rfc6749 import OAuth2Error
 
+from dialogs import db
+
 from .authorization_server import AuthorizationServer, RevocationEndpoint, server_key
 from .resource_protector import ResourceProtector, resource_protected, protector_key
 from .grants import AuthorizationCodeGrant, RefreshTokenGrant
+from .signed_token import TokenSigner, TokenDenylist
+from .code_store import create_code_store
 
 if typing.TYPE_CHECKING:
     from aiohttp.web import Application
@@ -15,8 +19,20 @@ else:
 __all__ = ['setup', 'resource_protected', 'OAuth2Error', 'server_key', 'protector_key']
 
 
-def setup(app: Application):
-    authorization_server = AuthorizationServer()
+def setup(app: Application, signed_access_tokens: bool = False, code_store: str = 'memory'):
+    signer = None
+    denylist = None
+    if signed_access_tokens:
+        db_session = db.session_maker()
+        signer = TokenSigner(db.get_or_create_secret(db_session, 'token_signing_key'))
+        denylist = TokenDenylist()
+        denylist.load(db_session)
+
+    authorization_server = AuthorizationServer(
+        signer=signer,
+        denylist=denylist,
+        code_store=create_code_store(code_store),
+    )
 
     # authorization_server.register_grant(grants.ImplicitGrant)
     # authorization_server.register_grant(grants.ClientCredentialsGrant)
@@ -25,6 +41,6 @@ def setup(app: Application):
     authorization_server.register_grant(RefreshTokenGrant)
     authorization_server.register_endpoint(RevocationEndpoint)
 
-    protector = ResourceProtector()
+    protector = ResourceProtector(signer=signer, denylist=denylist)
     app[server_key] = authorization_server
     app[protector_key] = protector
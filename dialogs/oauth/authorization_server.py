@@ -1,39 +1,115 @@
-import json
 import typing
 import importlib
 
 from aiohttp import web
+from sqlalchemy import update, event
+from sqlalchemy.orm import Session as SqlSession
 
 from authlib.common.errors import ContinueIteration
 from authlib.common.security import generate_token
 from authlib.oauth2 import AuthorizationServer as _AuthorizationServer
 from authlib.oauth2 import ClientAuthentication, OAuth2Request, JsonRequest
 from authlib.oauth2.rfc6749 import OAuth2Error, InvalidGrantError, BaseGrant
+from authlib.oauth2.rfc6749.requests import BasicOAuth2Payload
 from authlib.oauth2.rfc6750 import BearerToken
 from authlib.oauth2.rfc7009 import RevocationEndpoint as _RevocationEndpoint
 
+from dialogs import codec
 from dialogs.db import User, App, Token, Session
 
+from .signed_token import TokenSigner, TokenDenylist
+from .code_store import CodeStore, MemoryCodeStore
+
 
 class AuthorizationServer(_AuthorizationServer):
     def __init__(
         self,
         config: typing.Optional[dict] = None,
         error_uris: typing.Optional[str] = None,
+        signer: typing.Optional[TokenSigner] = None,
+        denylist: typing.Optional[TokenDenylist] = None,
+        code_store: typing.Optional[CodeStore] = None,
     ):
         self.config = config.copy() if config is not None else {}
         self.config.setdefault('error_uris', error_uris)
+        self.signer = signer
+        self.denylist = denylist
+        self.code_store = code_store if code_store is not None else MemoryCodeStore()
+        self._clients: dict[str, App] = {}
 
         super().__init__()
         self.register_token_generator('default', self._create_bearer_token_generator())
         self.authentication_client = ClientAuthentication(self.query_client)
 
     def query_client(self, client_id: str) -> typing.Optional[App]:
-        return query_client(client_id)
+        client = self._clients.get(client_id)
+        if client is None:
+            client = query_client(client_id)
+            if client is not None:
+                # detach client from the request session, so it is not
+                # expired on commit and can be safely reused by the next requests.
+                Session().expunge(client)
+                self._clients[client_id] = client
+        return client
+
+    def invalidate_clients(self) -> None:
+        """
+        Drop cached clients. Must be called when clients are created or changed.
+        """
+        self._clients.clear()
 
     def save_token(self, token: dict, request: OAuth2Request) -> None:
         return save_token(token, request)
 
+    def remember_revoked_token(self, token: Token, pending: typing.Optional[SqlSession] = None) -> None:
+        """
+        Signed access tokens are not looked up in the database,
+        so they must be explicitly denied after revocation.
+
+        If revocation is not committed yet, pass its session as `pending`:
+        token is denied only once the session commits, so the denylist
+        never disagrees with the database.
+        """
+        if self.denylist is None or self.signer is None or not self.signer.is_signed(token.access_token):
+            return
+
+        # attributes are expired on commit and cannot be loaded in the commit hook
+        self._deny([(token.access_token, token.issued_at + token.expires_in)], pending)
+
+    def _deny(self, entries: list[tuple[str, int]], pending: typing.Optional[SqlSession]) -> None:
+        denylist = self.denylist
+        assert denylist is not None
+        if not entries:
+            return
+        if pending is None:
+            denylist.extend(entries)
+            return
+
+        # listeners cannot be removed while they are dispatched, so they just
+        # act once: entries are added by commit or dropped by rollback
+        def committed(session: SqlSession) -> None:
+            denylist.extend(entries)
+            entries.clear()
+
+        def rolled_back(session: SqlSession) -> None:
+            entries.clear()
+
+        event.listen(pending, 'after_commit', committed)
+        event.listen(pending, 'after_rollback', rolled_back)
+
+    def revoke_user_tokens(self, user_id: int, client_id: str) -> int:
+        """
+        Revoke all access and refresh tokens issued to the client on behalf
+        of the user with a single statement. Returns number of revoked tokens.
+
+        Signed tokens are denied once the request session commits.
+        """
+        revoked = revoke_user_tokens(user_id, client_id)
+        if self.denylist is not None and self.signer is not None:
+            signer = self.signer
+            self._deny([item for item in revoked if signer.is_signed(item[0])], pending=Session())
+        return len(revoked)
+
     def get_error_uris(self, request: OAuth2Request) -> typing.Optional[dict]:
         error_uris = self.config.get('error_uris')
         return dict(error_uris) if error_uris else None
@@ -52,12 +128,14 @@ class AuthorizationServer(_AuthorizationServer):
         else:
             body = None
 
-        return OAuth2Request(
+        oauth_request = OAuth2Request(
             request.method,
             str(request.url),
             body,
             request.headers,
         )
+        oauth_request.payload = BasicOAuth2Payload({**request.query, **(body or {})})
+        return oauth_request
 
     async def create_json_request(self, request: web.Request) -> JsonRequest:
         if isinstance(request, JsonRequest):
@@ -128,7 +206,7 @@ class AuthorizationServer(_AuthorizationServer):
     def handle_response(self, status_code: int, payload: typing.Any, headers: dict) -> web.Response:
         if isinstance(payload, dict):
             return web.Response(
-                text=json.dumps(payload),
+                body=codec.dumps(payload),
                 status=status_code,
                 headers=headers,
             )
@@ -150,16 +228,6 @@ class AuthorizationServer(_AuthorizationServer):
         return grant
 
     def _create_bearer_token_generator(self) -> BearerToken:
-        access_token_generator = create_token_generator(
-            self.config.get('ACCESS_TOKEN_GENERATOR', True),
-            42,
-        )
-
-        refresh_token_generator = create_token_generator(
-            self.config.get('REFRESH_TOKEN_GENERATOR', True),
-            48
-        )
-
         expires_generator = create_token_expires_in_generator(
             # {
             #    'authorization_code': 864000,
@@ -168,6 +236,19 @@ class AuthorizationServer(_AuthorizationServer):
             self.config.get('TOKEN_EXPIRES_IN', {'authorization_code': 60 * 60 * 24 * 365})
         )
 
+        if self.signer is not None:
+            access_token_generator = self.signer.create_token_generator(expires_generator)
+        else:
+            access_token_generator = create_token_generator(
+                self.config.get('ACCESS_TOKEN_GENERATOR', True),
+                42,
+            )
+
+        refresh_token_generator = create_token_generator(
+            self.config.get('REFRESH_TOKEN_GENERATOR', True),
+            48
+        )
+
         return BearerToken(access_token_generator, refresh_token_generator, expires_generator)
 
     def send_signal(self, name, *args, **kwargs):
@@ -186,9 +267,23 @@ def save_token(token: dict, request: OAuth2Request) -> None:
         user_id=user_id,
         **token
     )
-    session = Session()
-    session.add(item)
-    session.commit()
+    # no explicit commit: request session is committed by db middleware,
+    # so the whole token exchange is written in a single transaction.
+    Session().add(item)
+
+
+def revoke_user_tokens(user_id: int, client_id: str) -> list[tuple[str, int]]:
+    statement = update(Token).where(
+        Token.user_id == user_id,
+        Token.client_id == client_id,
+        Token.revoked.is_(False),
+    ).values(
+        revoked=True,
+    ).returning(
+        Token.access_token,
+        Token.issued_at + Token.expires_in,
+    )
+    return [(access_token, expires_at) for access_token, expires_at in Session().execute(statement)]
 
 
 class RevocationEndpoint(_RevocationEndpoint):
@@ -220,6 +315,7 @@ class RevocationEndpoint(_RevocationEndpoint):
         session = Session()
         session.add(token)
         session.commit()
+        self.server.remember_revoked_token(token)
 
 
 def create_token_generator(cfg, length: int = 42):
@@ -4,15 +4,23 @@ from authlib.oauth2 import AuthorizationServer as _AuthorizationServer, OAuth2Re
 from authlib.oauth2.rfc6749 import BaseGrant
 from authlib.oauth2.rfc7009 import RevocationEndpoint as _RevocationEndpoint
 from dialogs.db import App as App, Token as Token, User as User
+from .signed_token import TokenSigner, TokenDenylist
+from .code_store import CodeStore
 from typing import Any
 
 
 class AuthorizationServer(_AuthorizationServer):
     config: Any = ...
     authentication_client: Any = ...
-    def __init__(self, config: typing.Optional[dict] = ..., error_uris: typing.Optional[str] = ...) -> None: ...
+    signer: typing.Optional[TokenSigner] = ...
+    denylist: typing.Optional[TokenDenylist] = ...
+    code_store: CodeStore = ...
+    def __init__(self, config: typing.Optional[dict] = ..., error_uris: typing.Optional[str] = ..., signer: typing.Optional[TokenSigner] = ..., denylist: typing.Optional[TokenDenylist] = ..., code_store: typing.Optional[CodeStore] = ...) -> None: ...
     def query_client(self, client_id: str) -> typing.Optional[App]: ...
+    def invalidate_clients(self) -> None: ...
     def save_token(self, token: dict, request: OAuth2Request) -> None: ...
+    def remember_revoked_token(self, token: Token) -> None: ...
+    def revoke_user_tokens(self, user_id: int, client_id: str) -> int: ...
     def get_error_uris(self, request: OAuth2Request) -> typing.Optional[dict]: ...
     def get_error_uri(self, request: OAuth2Request, error: Exception) -> OAuth2Error: ...
     async def create_oauth2_request(self, request: web.Request) -> OAuth2Request: ...
@@ -27,6 +35,7 @@ class AuthorizationServer(_AuthorizationServer):
 
 def query_client(client_id: str) -> typing.Optional[App]: ...
 def save_token(token: dict, request: OAuth2Request) -> None: ...
+def revoke_user_tokens(user_id: int, client_id: str) -> list[tuple[str, int]]: ...
 
 
 class RevocationEndpoint(_RevocationEndpoint):
@@ -0,0 +1,122 @@
+"""
+Storages for short-living OAuth2 authorization codes.
+
+Authorization code lives only until client exchanges it to the token,
+that is usually a matter of seconds, so by default codes are kept in memory.
+SQLite-backed storage is available for setups, where codes must survive
+server restart.
+"""
+
+import abc
+import math
+import time
+import typing
+
+from dialogs.db import Session, AuthorizationCode
+
+
+__all__ = ['CodeStore', 'SqlCodeStore', 'MemoryCodeStore', 'create_code_store']
+
+
+class CodeStore(abc.ABC):
+    @abc.abstractmethod
+    def save(self, item: AuthorizationCode) -> None:
+        """
+        Store new authorization code.
+        """
+
+    @abc.abstractmethod
+    def get(self, code: str, client_id: str) -> typing.Optional[AuthorizationCode]:
+        """
+        Find not expired authorization code issued for the client.
+        """
+
+    @abc.abstractmethod
+    def delete(self, item: AuthorizationCode) -> None:
+        """
+        Forget authorization code after it was exchanged.
+        """
+
+
+class SqlCodeStore(CodeStore):
+    def save(self, item: AuthorizationCode) -> None:
+        session = Session()
+        session.add(item)
+        session.commit()
+
+    def get(self, code: str, client_id: str) -> typing.Optional[AuthorizationCode]:
+        item = Session().query(AuthorizationCode).filter_by(
+            code=code,
+            client_id=client_id,
+        ).first()
+        if item and not item.is_expired():
+            return item
+        return None
+
+    def delete(self, item: AuthorizationCode) -> None:
+        session = Session()
+        session.delete(item)
+        session.commit()
+
+
+class MemoryCodeStore(CodeStore):
+    """
+    In-memory storage, where codes are expired by a timer wheel:
+    each code is put into the slot of the tick it was issued at, and when
+    the wheel turns over to the slot again, all the codes in it are dropped.
+    So expiration costs nothing but clearing the slots passed since the last call.
+    """
+
+    def __init__(self, ttl: float = 300., resolution: float = 1., clock: typing.Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.resolution = resolution
+        self.clock = clock
+        self._codes: dict[str, AuthorizationCode] = {}
+        self._slots: list[set[str]] = [set() for _ in range(math.ceil(ttl / resolution) + 1)]
+        self._tick = self._current_tick()
+
+    def __len__(self) -> int:
+        self._advance()
+        return len(self._codes)
+
+    def _current_tick(self) -> int:
+        return int(self.clock() // self.resolution)
+
+    def _advance(self) -> int:
+        tick = self._current_tick()
+        for passed in range(max(self._tick + 1, tick - len(self._slots) + 1), tick + 1):
+            slot = self._slots[passed % len(self._slots)]
+            for code in slot:
+                self._codes.pop(code, None)
+            slot.clear()
+
+        self._tick = max(tick, self._tick)
+        return self._tick
+
+    def save(self, item: AuthorizationCode) -> None:
+        tick = self._advance()
+        self._codes[item.code] = item
+        self._slots[tick % len(self._slots)].add(item.code)
+
+    def get(self, code: str, client_id: str) -> typing.Optional[AuthorizationCode]:
+        self._advance()
+        item = self._codes.get(code)
+        if item is None or item.client_id != client_id:
+            return None
+        # wheel drops codes with the tick precision, so check exact age here
+        if item.auth_time + self.ttl < self.clock():
+            return None
+        return item
+
+    def delete(self, item: AuthorizationCode) -> None:
+        # the code is left in its slot, that's fine: slot cleanup ignores missing codes
+        self._codes.pop(item.code, None)
+
+
+def create_code_store(kind: str) -> CodeStore:
+    if kind == 'memory':
+        return MemoryCodeStore()
+    elif kind == 'sqlite':
+        return SqlCodeStore()
+    else:
+        raise ValueError(f"Unknown authorization code store: {kind!r}")
@@ -1,3 +1,4 @@
+import time
 import typing
 
 from authlib.oauth2.rfc6749 import grants
@@ -15,24 +16,15 @@ class AuthorizationCodeGrant(grants.AuthorizationCodeGrant):
             redirect_uri=request.redirect_uri,
             scope=request.scope,
             user_id=request.user.id,
+            auth_time=int(time.time()),
         )
-        session = Session()
-        session.add(item)
-        session.commit()
+        self.server.code_store.save(item)
 
     def query_authorization_code(self, code: str, client: App) -> typing.Optional[AuthorizationCode]:
-        item = Session().query(AuthorizationCode).filter_by(
-            code=code,
-            client_id=client.client_id
-        ).first()
-        if item and not item.is_expired():
-            return item
-        return None
+        return self.server.code_store.get(code, client.client_id)
 
     def delete_authorization_code(self, authorization_code: AuthorizationCode) -> None:
-        session = Session()
-        session.delete(authorization_code)
-        session.commit()
+        self.server.code_store.delete(authorization_code)
 
     def authenticate_user(self, authorization_code: AuthorizationCode) -> typing.Optional[User]:
         return Session().get(User, authorization_code.user_id)
@@ -61,6 +53,7 @@ class RefreshTokenGrant(grants.RefreshTokenGrant):
     def revoke_old_credential(self, refresh_token: Token) -> None:
         refresh_token.revoked = True
 
+        # committed along with the new token by db middleware
         session = Session()
         session.add(refresh_token)
-        session.commit()
+        self.server.remember_revoked_token(refresh_token, pending=session)
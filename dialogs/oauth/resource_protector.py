@@ -1,4 +1,3 @@
-import json
 import typing
 import functools
 
@@ -9,36 +8,59 @@ from authlib.oauth2.rfc6749 import OAuth2Request, MissingAuthorizationError
 from authlib.oauth2.rfc6749.util import scope_to_list
 from authlib.oauth2.rfc6750 import BearerTokenValidator as _BearerTokenValidator
 
+from dialogs import codec
 from dialogs.db import Session, Token
 
+from .signed_token import SignedAccessToken, TokenSigner, TokenDenylist
+
 
 class JSONException(web.HTTPException):
     def __init__(self, status_code: int, data: typing.Any, headers: typing.Optional[typing.Any]):
-        body = json.dumps(data)
+        body = codec.dumps(data)
         web.Response.__init__(
             self,
             status=status_code,
             headers=headers,
-            text=body,
+            body=body,
         )
-        Exception.__init__(self, body)
+        Exception.__init__(self, body.decode())
 
 
 class BearerTokenValidator(_BearerTokenValidator):
-    def authenticate_token(self, token_string: str) -> typing.Optional[Token]:
+    def __init__(
+        self,
+        signer: typing.Optional[TokenSigner] = None,
+        denylist: typing.Optional[TokenDenylist] = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.signer = signer
+        self.denylist = denylist
+
+    def authenticate_token(self, token_string: str) -> typing.Optional[Token | SignedAccessToken]:
+        if self.signer is not None and self.signer.is_signed(token_string):
+            token = self.signer.verify(token_string)
+            if token is not None and self.denylist is not None:
+                token.revoked = token_string in self.denylist
+            return token
+
         return Session().query(Token).filter_by(access_token=token_string).first()
 
     def request_invalid(self, request):
         return False
 
-    def token_revoked(self, token: Token):
+    def token_revoked(self, token: Token | SignedAccessToken):
         return token.revoked
 
 
 class ResourceProtector(_ResourceProtector):
-    def __init__(self):
+    def __init__(
+        self,
+        signer: typing.Optional[TokenSigner] = None,
+        denylist: typing.Optional[TokenDenylist] = None,
+    ):
         super().__init__()
-        self.register_token_validator(BearerTokenValidator())
+        self.register_token_validator(BearerTokenValidator(signer=signer, denylist=denylist))
 
     def raise_error_response(self, error: OAuth2Error) -> typing.NoReturn:
         status_code = error.status_code
@@ -47,11 +69,12 @@ class ResourceProtector(_ResourceProtector):
         raise JSONException(status_code, data, headers)
 
     async def acquire_token(self, request: web.Request, scopes: list[str] | str | None = None):
+        # bearer token is passed in Authorization header, so we don't touch
+        # request body here and leave it to handler to read it only once.
         token_request = OAuth2Request(
             request.method,
             request.path,
-            await request.text(),
-            request.headers,
+            headers=request.headers,
         )
 
         kwargs = {}
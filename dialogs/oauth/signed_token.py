@@ -0,0 +1,182 @@
+"""
+Stateless access tokens.
+
+Signed token is a compact ``<payload>.<signature>`` string, where payload
+is urlsafe-base64 encoded JSON with user id, client id, scope and expiration,
+and signature is HMAC-SHA256 of the payload with the server key.
+Such tokens can be verified without looking into the database, so the
+only state we need is a small denylist of revoked, but not yet expired tokens.
+
+Refresh tokens stay random and are stored in the database as before.
+"""
+
+import hmac
+import json
+import time
+import base64
+import typing
+import hashlib
+
+from authlib.common.security import generate_token
+from authlib.oauth2.rfc6749 import TokenMixin
+
+from dialogs.db import Session, User, Token, OrmSession
+
+
+__all__ = ['SignedAccessToken', 'TokenSigner', 'TokenDenylist']
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class SignedAccessToken(TokenMixin):
+    def __init__(
+        self,
+        access_token: str,
+        user_id: typing.Optional[int],
+        client_id: str,
+        scope: str,
+        issued_at: int,
+        expires_in: int,
+        revoked: bool = False,
+    ):
+        self.access_token = access_token
+        self.user_id = user_id
+        self.client_id = client_id
+        self.scope = scope
+        self.issued_at = issued_at
+        self.expires_in = expires_in
+        self.revoked = revoked
+
+    @property
+    def user(self) -> typing.Optional[User]:
+        # user is resolved lazily: most handlers need only token validity and scope.
+        if self.user_id is None:
+            return None
+        return Session().get(User, self.user_id)
+
+    def check_client(self, client) -> bool:
+        return self.client_id == client.client_id
+
+    def get_scope(self) -> str:
+        return self.scope
+
+    def get_expires_in(self) -> int:
+        return self.expires_in
+
+    def is_expired(self) -> bool:
+        return self.issued_at + self.expires_in < time.time()
+
+    def is_revoked(self) -> bool:
+        return self.revoked
+
+
+class TokenSigner:
+    def __init__(self, key: bytes):
+        self.key = key
+
+    @staticmethod
+    def is_signed(token_string: str) -> bool:
+        # random tokens generated by authlib consist of letters and digits only
+        return '.' in token_string
+
+    def _signature(self, payload: str) -> str:
+        return _b64encode(hmac.new(self.key, payload.encode(), hashlib.sha256).digest())
+
+    def sign(
+        self,
+        user_id: typing.Optional[int],
+        client_id: str,
+        scope: str,
+        expires_in: int,
+        issued_at: typing.Optional[int] = None,
+    ) -> str:
+        data = {
+            'u': user_id,
+            'c': client_id,
+            's': scope,
+            'i': int(time.time()) if issued_at is None else issued_at,
+            'e': expires_in,
+            # nonce makes tokens issued within the same second distinct
+            'n': generate_token(8),
+        }
+        payload = _b64encode(json.dumps(data, separators=(',', ':')).encode())
+        return f'{payload}.{self._signature(payload)}'
+
+    def verify(self, token_string: str) -> typing.Optional[SignedAccessToken]:
+        payload, _, signature = token_string.rpartition('.')
+        if not payload or not hmac.compare_digest(signature, self._signature(payload)):
+            return None
+
+        try:
+            data = json.loads(_b64decode(payload))
+            return SignedAccessToken(
+                access_token=token_string,
+                user_id=data['u'],
+                client_id=data['c'],
+                scope=data['s'],
+                issued_at=data['i'],
+                expires_in=data['e'],
+            )
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    def create_token_generator(
+        self,
+        expires_generator: typing.Callable[..., int],
+    ) -> typing.Callable[..., str]:
+        """
+        Make access token generator compatible with authlib BearerToken.
+        """
+        def generator(client, grant_type, user=None, scope=None, **kwargs) -> str:
+            return self.sign(
+                user_id=user.get_user_id() if user is not None else None,
+                client_id=client.client_id,
+                scope=scope or '',
+                expires_in=expires_generator(client, grant_type),
+            )
+
+        return generator
+
+
+class TokenDenylist:
+    """
+    Set of revoked access tokens, that are not expired yet.
+    """
+
+    def __init__(self):
+        self._tokens: dict[str, int] = {}
+
+    def __contains__(self, access_token: str) -> bool:
+        return access_token in self._tokens
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def add(self, access_token: str, expires_at: int) -> None:
+        self.extend([(access_token, expires_at)])
+
+    def extend(self, tokens: typing.Iterable[tuple[str, int]]) -> None:
+        now = time.time()
+        # revocations are rare, so it's cheap enough to drop stale items here
+        self._tokens = {token: ts for token, ts in self._tokens.items() if ts >= now}
+        self._tokens.update(
+            (access_token, expires_at)
+            for access_token, expires_at in tokens
+            if expires_at >= now
+        )
+
+    def load(self, session: OrmSession) -> None:
+        now = int(time.time())
+        query = session.query(Token.access_token, Token.issued_at + Token.expires_in).filter(
+            Token.revoked.is_(True),
+            Token.issued_at + Token.expires_in >= now,
+        )
+        for access_token, expires_at in query:
+            if TokenSigner.is_signed(access_token):
+                self._tokens[access_token] = expires_at
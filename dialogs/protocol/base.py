@@ -1,13 +1,19 @@
 import abc
 import enum
+import time
 import typing
-import asyncio
+import functools
 
 if typing.TYPE_CHECKING:
     from mypy_extensions import KwArg
 
+from dialogs import codec
+
+from .observers import Observable
+from .coalescing import ChangeCoalescer
+from .executor import ActionExecutor, ActionPolicy
 from .exceptions import ActionException, QueryException
-from .consts import ActionError, ActionStatus
+from .consts import ActionError, ActionStatus, QueryError, DEVICE_UNREACHABLE_MESSAGE
 
 
 S = typing.TypeVar('S')
@@ -24,8 +30,41 @@ else:
         typing.Coroutine[typing.Any, typing.Any, tuple[str, str]]
     ]]
 
+# validates action value and its extra arguments, raising ActionException
+Validator = typing.Callable[[typing.Any, dict], None]
+
+
+def _accept_any(value: typing.Any, kwargs: dict) -> None:
+    pass
+
+
+def _overrides_async_state(cls: type) -> bool:
+    """
+    Check if class customizes its state via async state() only,
+    so the synchronous render_state() is not aware of it.
+    """
+    for klass in cls.__mro__:
+        if 'render_state' in klass.__dict__:
+            return False
+        if 'state' in klass.__dict__:
+            return True
+    return False
+
+
+class Capability(Observable, typing.Generic[S], metaclass=abc.ABCMeta):
+    # protocol objects are slotted to keep large fleets compact.
+    # Subclasses must declare __slots__ for their own attributes, otherwise
+    # they silently get per-instance __dict__ back (which is fine for device adapters).
+    __slots__ = (
+        '_instances', '_value', '_retrievable', '_reportable', 'change_value', 'device', '_coalescer', 'updated_at',
+    )
+
+    async_state_only: typing.ClassVar[bool] = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.async_state_only = _overrides_async_state(cls)
 
-class Capability(typing.Generic[S], metaclass=abc.ABCMeta):
     def __init__(
         self: C,
         instances: typing.Iterable[str],
@@ -33,12 +72,20 @@ class Capability(typing.Generic[S], metaclass=abc.ABCMeta):
         change_value: ChangeValue[C, S] = None,
         retrievable: bool = False,
         reportable: bool = False,
+        coalesce: typing.Optional[float] = None,
     ):
         self._instances = list(instances)
         self._value = initial_value
         self._retrievable = retrievable
         self._reportable = reportable
         self.change_value = change_value or self._change_value_is_not_supported
+        # owning device, assigned by Device constructor
+        self.device: typing.Optional[Device] = None
+        self._observers = None
+        # if set, changes coming within `coalesce` seconds are merged, see ChangeCoalescer
+        self._coalescer = None if coalesce is None else ChangeCoalescer(self, coalesce)
+        # monotonic time the value was last received, even if it did not change
+        self.updated_at = time.monotonic()
 
     @staticmethod
     async def _change_value_is_not_supported(
@@ -50,14 +97,30 @@ class Capability(typing.Generic[S], metaclass=abc.ABCMeta):
     ) -> typing.NoReturn:
         raise ActionException(capability.type_id, instance, ActionError.NotSupportedInCurrentMode)
 
+    def compile_validator(self, instance: str) -> Validator:
+        """
+        Build a validator of action values for the instance, so
+        invalid values are rejected before they reach change_value.
+        Parameters of the capability are captured once.
+        """
+        return _accept_any
+
     def handle_change(
         self: C,
         instance: str,
         value: S,
         kwargs: dict,
     ) -> typing.Coroutine[typing.Any, typing.Any, tuple[str, str]]:
+        if self._coalescer is not None:
+            return self._coalescer.change(instance, value, kwargs)
         return self.change_value(self, instance, value, **kwargs)
 
+    def apply_delta(self, base: S, delta: typing.Any) -> S:
+        """
+        Resolve relative change against the base value.
+        """
+        return base + delta  # type: ignore
+
     @property
     @abc.abstractmethod
     def type_id(self) -> str:
@@ -108,22 +171,46 @@ class Capability(typing.Generic[S], metaclass=abc.ABCMeta):
 
     @value.setter
     def value(self, value: S) -> None:
+        self.updated_at = time.monotonic()
+        if value == self._value:
+            return
+        old = self._value
         self._value = value
+        self.value_changed(old, value)
 
-    async def state(self) -> typing.AsyncIterator[dict]:
+    def value_changed(self, old: typing.Any = None, new: typing.Any = None) -> None:
+        """
+        Must be called when value is changed in place, bypassing the setter.
+        """
+        self.updated_at = time.monotonic()
+        if self.device is not None:
+            self.device.state_changed()
+        self.notify_observers(old, self._value if new is None else new)
+
+    def render_state(self) -> dict | None:
         """
         Capability current state, availble only for retrievable capabilities.
-        If value is not ready, returns nothing.
+        If value is not ready, returns None.
         """
+        value = self.value
+        if value is None:
+            return None
 
-        if self.value is not None:
-            yield {
-                'type': self.type_id,
-                'state': {
-                    'instance': next(iter(self.instances)),
-                    'value': self.value,
-                }
+        return {
+            'type': self.type_id,
+            'state': {
+                'instance': self._instances[0],
+                'value': value,
             }
+        }
+
+    async def state(self) -> typing.AsyncIterator[dict]:
+        """
+        Compatibility wrapper around render_state().
+        """
+        state = self.render_state()
+        if state is not None:
+            yield state
 
     async def specification(self) -> dict:
         """
@@ -144,6 +231,8 @@ class Capability(typing.Generic[S], metaclass=abc.ABCMeta):
 
 
 class SingleInstanceCapability(Capability):
+    __slots__ = ()
+
     def __init__(
         self: C,
         instance: str,
@@ -151,6 +240,7 @@ class SingleInstanceCapability(Capability):
         change_value: ChangeValue[C, S] = None,
         retrievable: bool = False,
         reportable: bool = False,
+        coalesce: typing.Optional[float] = None,
     ):
 
         super().__init__(
@@ -159,6 +249,7 @@ class SingleInstanceCapability(Capability):
             change_value=change_value,
             retrievable=retrievable,
             reportable=reportable,
+            coalesce=coalesce,
         )
 
     @property
@@ -166,7 +257,15 @@ class SingleInstanceCapability(Capability):
         return next(iter(self.instances))
 
 
-class Property(typing.Generic[S], metaclass=abc.ABCMeta):
+class Property(Observable, typing.Generic[S], metaclass=abc.ABCMeta):
+    __slots__ = ('instance', '_value', '_retrievable', '_reportable', 'device', 'updated_at')
+
+    async_state_only: typing.ClassVar[bool] = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.async_state_only = _overrides_async_state(cls)
+
     def __init__(
         self,
         instance: str,
@@ -181,6 +280,11 @@ class Property(typing.Generic[S], metaclass=abc.ABCMeta):
         self._value = initial_value
         self._retrievable = retrievable
         self._reportable = reportable
+        # owning device, assigned by Device constructor
+        self.device: typing.Optional[Device] = None
+        self._observers = None
+        # monotonic time the value was last received, even if it did not change
+        self.updated_at = time.monotonic()
 
     @property
     @abc.abstractmethod
@@ -198,7 +302,21 @@ class Property(typing.Generic[S], metaclass=abc.ABCMeta):
 
     @value.setter
     def value(self, value: S) -> None:
+        self.updated_at = time.monotonic()
+        if value == self._value:
+            return
+        old = self._value
         self._value = value
+        self.value_changed(old, value)
+
+    def value_changed(self, old: typing.Any = None, new: typing.Any = None) -> None:
+        """
+        Must be called when value is changed in place, bypassing the setter.
+        """
+        self.updated_at = time.monotonic()
+        if self.device is not None:
+            self.device.state_changed()
+        self.notify_observers(old, self._value if new is None else new)
 
     @property
     def retrievable(self) -> bool:
@@ -216,20 +334,30 @@ class Property(typing.Generic[S], metaclass=abc.ABCMeta):
         """
         return self._reportable
 
-    async def state(self) -> typing.AsyncIterator[dict]:
+    def render_state(self) -> dict | None:
         """
         Property current state.
-        If value is not ready, returns nothing.
+        If value is not ready, returns None.
         """
+        value = self.value
+        if value is None:
+            return None
 
-        if self.value is not None:
-            yield {
-                'type': self.type_id,
-                'state': {
-                    'instance': self.instance,
-                    'value': self.value,
-                }
+        return {
+            'type': self.type_id,
+            'state': {
+                'instance': self.instance,
+                'value': value,
             }
+        }
+
+    async def state(self) -> typing.AsyncIterator[dict]:
+        """
+        Compatibility wrapper around render_state().
+        """
+        state = self.render_state()
+        if state is not None:
+            yield state
 
     @abc.abstractmethod
     async def specification(self) -> dict:
@@ -239,7 +367,56 @@ class Property(typing.Generic[S], metaclass=abc.ABCMeta):
         """
 
 
+T = typing.TypeVar('T', Capability, Property)
+
+
+class ItemViews(typing.Generic[T]):
+    """
+    Capabilities or properties of the device in the declaration order,
+    pre-filtered for the hot paths, so state queries and reports do not
+    filter them on every call.
+    """
+    __slots__ = ('all', 'retrievable', 'reportable', 'retrievable_reportable')
+
+    def __init__(self, items: typing.Iterable[T]):
+        # multi-instance capabilities are registered once per instance, so deduplicate them
+        self.all: tuple[T, ...] = tuple(dict.fromkeys(items))
+        self.retrievable = tuple(item for item in self.all if item.retrievable)
+        self.reportable = tuple(item for item in self.all if item.reportable)
+        self.retrievable_reportable = tuple(item for item in self.retrievable if item.reportable)
+
+
 class Device(abc.ABC):
+    __slots__ = (
+        'device_id',
+        'name',
+        'description',
+        'room',
+        'custom_data',
+        'manufacturer',
+        'model',
+        'hw_version',
+        'sw_version',
+        '_capabilities',
+        '_properties',
+        'capability_views',
+        'property_views',
+        '_state_cacheable',
+        '_state_cache',
+        '_state_version',
+        '_validators',
+        'executor',
+        '_stale_after',
+        '_fresh_until',
+    )
+
+    # how action requests to the device interact, see ActionExecutor
+    action_policy: typing.ClassVar[ActionPolicy] = ActionPolicy.Concurrent
+    # pull-based devices fetch their values on demand in refresh()
+    pull_based: typing.ClassVar[bool] = False
+    # seconds after which values of stale_items() are outdated, None disables the check
+    default_stale_after: typing.ClassVar[typing.Optional[float]] = None
+
     def __init__(
         self,
         device_id: str,
@@ -274,6 +451,26 @@ class Device(abc.ABC):
             (prop.type_id, prop.instance): prop
             for prop in properties or []
         }
+        self.capability_views = ItemViews(self._capabilities.values())
+        self.property_views = ItemViews(self._properties.values())
+
+        for item in self.capability_views.all + self.property_views.all:
+            item.device = self
+
+        self._validators: dict[tuple[str, str], Validator] = {
+            cap_key: cap.compile_validator(cap_key[1])
+            for cap_key, cap in self._capabilities.items()
+        }
+        self.executor = ActionExecutor(self.action_policy)
+
+        # serialized state can be reused only if it's fully defined by the item values
+        self._state_cacheable = type(self).state is Device.state and not any(
+            item.async_state_only
+            for item in self.capability_views.retrievable + self.property_views.retrievable
+        )
+        self._state_cache: typing.Optional[bytes] = None
+        self._state_version = 0
+        self.stale_after = self.default_stale_after
 
     @property
     @abc.abstractmethod
@@ -287,20 +484,60 @@ class Device(abc.ABC):
         period or just do nothing.
         """
 
-    def capabilities(self) -> typing.Iterable[Capability]:
+    @property
+    def stale_after(self) -> typing.Optional[float]:
+        return self._stale_after
+
+    @stale_after.setter
+    def stale_after(self, value: typing.Optional[float]) -> None:
+        self._stale_after = value
+        # recalculated on the next check
+        self._fresh_until = float('inf') if value is None else -float('inf')
+
+    def stale_items(self) -> typing.Iterable[Capability | Property]:
+        """
+        Items, whose outdated values make the device unreachable.
+        By default these are retrievable properties: unlike capabilities
+        they are expected to be updated regularly.
+        """
+        return self.property_views.retrievable
+
+    def is_fresh(self) -> bool:
+        """
+        Check if values of stale_items() are not outdated.
+        Usually it's a single comparison with the time the oldest value
+        becomes outdated, which is recalculated only when it has passed.
+        """
+        now = time.monotonic()
+        if now <= self._fresh_until:
+            return True
+
+        assert self._stale_after is not None
+        oldest = min((item.updated_at for item in self.stale_items()), default=None)
+        self._fresh_until = float('inf') if oldest is None else oldest + self._stale_after
+        return now <= self._fresh_until
+
+    async def refresh(self, interactive: bool) -> None:
+        """
+        Fetch values of pull-based device, if they are too old.
+        Called before rendering the state: interactive is set for user
+        queries and unset for background reports.
+        """
+
+    def capabilities(self) -> typing.Sequence[Capability]:
         """
         This method must return available device capabilities.
         Most device types have some recommended set of ones, but
         any device can have any capabilities.
         """
-        return set(self._capabilities.values())
+        return self.capability_views.all
 
-    def properties(self) -> typing.Iterable[Property]:
+    def properties(self) -> typing.Sequence[Property]:
         """
         This method must return available device properties.
         Any device can have any properties.
         """
-        return set(self._properties.values())
+        return self.property_views.all
 
     async def specification(self) -> dict:
         """
@@ -336,59 +573,195 @@ class Device(abc.ABC):
         This method must return state for all capabilities and properties that
         are marked as retrievable.
         """
+        if self.pull_based:
+            await self.refresh(interactive=True)
+        return await self._render_state()
+
+    async def _render_state(self) -> dict:
+        """
+        Default state(), without refreshing the values of pull-based device.
+        """
         result: dict = {
             'id': self.device_id,
-            'capabilities': [],
-            'properties': [],
         }
 
-        caps = [cap.state() for cap in self.capabilities() if cap.retrievable]
-        props = [prop.state() for prop in self.properties() if prop.retrievable]
-
         try:
-            async for state in (states for cap in caps async for states in cap):
-                result['capabilities'].append(state)
-
-            async for state in (states for prop in props async for states in prop):
-                result['properties'].append(state)
+            if not self.is_fresh():
+                raise QueryException(QueryError.DeviceUnreachable, DEVICE_UNREACHABLE_MESSAGE)
+            result['capabilities'] = await self._render_states(self.capability_views.retrievable)
+            result['properties'] = await self._render_states(self.property_views.retrievable)
         except QueryException as e:
-            del result['capabilities']
-            del result['properties']
+            result.pop('capabilities', None)
             result['error_code'] = e.code.value
             result['error_message'] = e.args[0]
             return result
 
         return result
 
+    def state_changed(self) -> None:
+        """
+        Called by capabilities and properties when their values change.
+        """
+        self._state_cache = None
+        self._state_version += 1
+
+    @property
+    def state_version(self) -> int:
+        """
+        Monotonic counter of capability and property value changes.
+        Devices overriding state() may change their state without bumping it.
+        """
+        return self._state_version
+
+    def changed_since(self, version: int) -> bool:
+        return self._state_version != version
+
+    async def serialized_state(self) -> bytes:
+        """
+        JSON-encoded state(), kept until any value of the device changes.
+        """
+        if self.pull_based:
+            # may change values and drop the cache
+            await self.refresh(interactive=True)
+
+        # values may become outdated without any change
+        fresh = self.is_fresh()
+        if self._state_cache is not None and fresh:
+            return self._state_cache
+
+        # values are refreshed already, unless state() is overridden
+        state = await (self._render_state() if type(self).state is Device.state else self.state())
+        result = codec.dumps(state)
+        if self._state_cacheable and fresh:
+            self._state_cache = result
+        return result
+
     async def report(self, previous_state: dict) -> dict:
         """
         This method returns state for all capabilities and properties that
         are marked as retrievable and reportable with mark if they have changed
         since previous_state.
         """
+        if self.pull_based:
+            await self.refresh(interactive=False)
+
         result: dict = {
             'id': self.device_id,
             'capabilities': [],
             'properties': [],
         }
 
-        caps = [cap.state() for cap in self.capabilities() if cap.retrievable and cap.reportable]
-        props = [prop.state() for prop in self.properties() if prop.retrievable and prop.reportable]
+        caps = await self._render_states(self.capability_views.retrievable_reportable)
+        props = await self._render_states(self.property_views.retrievable_reportable)
 
-        async for state in (states for cap in caps async for states in cap):
-            result['capabilities'].append((state, state not in previous_state.get('capabilities', [])))
-
-        async for state in (states for prop in props async for states in prop):
-            result['properties'].append((state, state not in previous_state.get('properties', [])))
+        previous_caps = previous_state.get('capabilities', [])
+        previous_props = previous_state.get('properties', [])
+        result['capabilities'] = [(state, state not in previous_caps) for state in caps]
+        result['properties'] = [(state, state not in previous_props) for state in props]
 
         return result
 
+    @staticmethod
+    async def _render_states(items: typing.Iterable[Capability | Property]) -> list[dict]:
+        states = []
+        for item in items:
+            if item.async_state_only:
+                states.extend([state async for state in item.state()])
+            else:
+                state = item.render_state()
+                if state is not None:
+                    states.append(state)
+        return states
+
     @staticmethod
     def split_value(state: dict) -> tuple[typing.Any, dict]:
         val = state.pop('value')
         state.pop('instance')
         return val, state
 
+    def parse_changes(
+        self,
+        capabilities: typing.Iterable[typing.Any],
+    ) -> tuple[dict[tuple[str, str], tuple[typing.Any, dict]], list[ActionException]]:
+        """
+        Extract capability keys, values and extra arguments from action
+        request items and validate them against the capabilities.
+        Returns changes by capability key and errors of the invalid items.
+        """
+        changes: dict[tuple[str, str], tuple[typing.Any, dict]] = {}
+        errors: list[ActionException] = []
+        validators = self._validators
+        # single loop without per-item calls: it runs for every item of every action
+        for change in capabilities:
+            try:
+                state = change['state']
+                cap_key = (change['type'], state['instance'])
+                value = state['value']
+                validator = validators.get(cap_key)
+            except (KeyError, TypeError, IndexError):
+                errors.append(self._malformed_change(change))
+                continue
+
+            if validator is None:
+                type_id, instance = cap_key
+                if not isinstance(type_id, str) or not isinstance(instance, str):
+                    errors.append(self._malformed_change(change))
+                else:
+                    # TODO make it better?
+                    errors.append(ActionException(
+                        type_id, instance, ActionError.InvalidAction, 'Unknown capability for this device',
+                    ))
+                continue
+
+            if len(state) == 2:
+                kwargs = {}
+            else:
+                kwargs = dict(state)
+                del kwargs['instance'], kwargs['value']
+
+            try:
+                validator(value, kwargs)
+            except ActionException as e:
+                errors.append(e)
+            else:
+                changes[cap_key] = (value, kwargs)
+
+        return changes, errors
+
+    @staticmethod
+    def _malformed_change(change: typing.Any) -> ActionException:
+        state = change.get('state') if isinstance(change, dict) else None
+        type_id = change.get('type') if isinstance(change, dict) else None
+        instance = state.get('instance') if isinstance(state, dict) else None
+        return ActionException(
+            type_id if isinstance(type_id, str) else '',
+            instance if isinstance(instance, str) else '',
+            ActionError.InvalidAction,
+            'Malformed capability action',
+        )
+
+    @staticmethod
+    def action_result(type_id: str, instance: str, error: typing.Optional[ActionException] = None) -> dict:
+        action_result: dict
+        if error is None:
+            action_result = {
+                'status': ActionStatus.Done.value,
+            }
+        else:
+            action_result = {
+                'status': ActionStatus.Error.value,
+                'error_code': error.code.value,
+                'error_message': error.args[0],
+            }
+
+        return {
+            'type': type_id,
+            'state': {
+                'instance': instance,
+                'action_result': action_result,
+            },
+        }
+
     async def action(
         self,
         capabilities: typing.Iterable[dict],
@@ -399,64 +772,22 @@ class Device(abc.ABC):
             'capabilities': []
         }
 
-        changes = {
-            (cap['type'], cap['state']['instance']): self.split_value(cap['state'])
-            for cap in capabilities
-        }
-        for cap_key in changes:
-            if cap_key not in self._capabilities:
-                # TODO make it better?
-                result['capabilities'].append({
-                    'type': cap_key[0],
-                    'state': {
-                        'instance': cap_key[1],
-                        'action_result': {
-                            'status': ActionStatus.Error.value,
-                            'error_code': ActionError.InvalidAction.value,
-                            'error_message': 'Unknown capability for this device',
-                        }
-                    }
-                })
-
-        caps: list[asyncio.Task[tuple[str, str]]] = [
-            asyncio.create_task(self._capabilities[cap_key].handle_change(
-                cap_key[1],
-                cap_value,
-                kwargs
-            ))
-            for cap_key, (cap_value, kwargs) in changes.items()
-            if cap_key in self._capabilities
-        ]
+        changes, errors = self.parse_changes(capabilities)
+        for e in errors:
+            result['capabilities'].append(self.action_result(e.capability_id, e.instance, e))
 
-        if not caps:
+        if not changes:
             return result
 
-        changes_ready, _ = await asyncio.wait(caps, return_when=asyncio.ALL_COMPLETED)
+        outcomes = await self.executor.execute([
+            (cap_key, functools.partial(self._capabilities[cap_key].handle_change, cap_key[1], cap_value, kwargs))
+            for cap_key, (cap_value, kwargs) in changes.items()
+        ])
 
-        for change in changes_ready:
-            try:
-                type_id, instance = await change
-            except ActionException as e:
-                result['capabilities'].append({
-                    'type': e.capability_id,
-                    'state': {
-                        'instance': e.instance,
-                        'action_result': {
-                            'status': ActionStatus.Error.value,
-                            'error_code': e.code.value,
-                            'error_message': e.args[0],
-                        }
-                    },
-                })
+        for outcome in outcomes:
+            if isinstance(outcome, ActionException):
+                result['capabilities'].append(self.action_result(outcome.capability_id, outcome.instance, outcome))
             else:
-                result['capabilities'].append({
-                    'type': type_id,
-                    'state': {
-                        'instance': instance,
-                        'action_result': {
-                            'status': ActionStatus.Done.value,
-                        }
-                    }
-                })
+                result['capabilities'].append(self.action_result(*outcome))
 
         return result
@@ -1,8 +1,12 @@
 import enum
+import math
+import time
 import typing
 from dataclasses import dataclass, asdict
 
-from .base import C, Capability, SingleInstanceCapability, ChangeValue
+from .base import C, Capability, SingleInstanceCapability, ChangeValue, Validator
+from .consts import ActionError
+from .exceptions import ActionException
 
 
 __all__ = [
@@ -14,7 +18,20 @@ __all__ = [
 ]
 
 
+def _bool_validator(type_id: str, instance: str) -> Validator:
+    def validate(value: typing.Any, kwargs: dict) -> None:
+        if not isinstance(value, bool):
+            raise ActionException(
+                type_id, instance, ActionError.InvalidValue,
+                f"Value must be bool: got {type(value).__name__}",
+            )
+
+    return validate
+
+
 class OnOff(SingleInstanceCapability):
+    __slots__ = ('split',)
+
     type_id = "devices.capabilities.on_off"
 
     def __init__(
@@ -38,11 +55,16 @@ class OnOff(SingleInstanceCapability):
     def parameters(self) -> dict:
         return {'split': self.split}
 
+    def compile_validator(self, instance: str) -> Validator:
+        return _bool_validator(self.type_id, instance)
+
 
 class ColorSetting(Capability):
+    __slots__ = ('color_model', 'temperature')
+
     type_id = "devices.capabilities.color_setting"
 
-    @dataclass
+    @dataclass(slots=True)
     class HSV:
         h: typing.Optional[int] = None
         s: typing.Optional[int] = None
@@ -88,7 +110,7 @@ class ColorSetting(Capability):
         def name(self):
             return 'hsv'
 
-    @dataclass
+    @dataclass(slots=True)
     class RGB:
         value: typing.Optional[int] = None
 
@@ -114,7 +136,7 @@ class ColorSetting(Capability):
         def name(self):
             return 'rgb'
 
-    @dataclass
+    @dataclass(slots=True)
     class Temperature:
         min: typing.Optional[int] = None
         max: typing.Optional[int] = None
@@ -195,7 +217,14 @@ class ColorSetting(Capability):
         )
 
     def assign(self, value):
-        self.value.assign(value)
+        current = self.value
+        previous = current.serialize()
+        current.assign(value)
+        new = current.serialize()
+        if new != previous:
+            self.value_changed(previous, new)
+        else:
+            self.updated_at = time.monotonic()
 
     @property
     def parameters(self) -> dict:
@@ -213,15 +242,40 @@ class ColorSetting(Capability):
 
         return result
 
-    async def state(self) -> typing.AsyncIterator[dict]:
+    def compile_validator(self, instance: str) -> Validator:
+        type_id = self.type_id
+        model: typing.Union[ColorSetting.HSV, ColorSetting.RGB, ColorSetting.Temperature, None]
+        if self.temperature is not None and instance == self.temperature.name:
+            model = self.temperature
+        elif self.color_model is not None and instance == self.color_model.name:
+            model = self.color_model
+        else:
+            model = None
+
+        def validate(value: typing.Any, kwargs: dict) -> None:
+            try:
+                if value is None:
+                    raise TypeError("Value must be set")
+                if isinstance(model, ColorSetting.HSV):
+                    if not isinstance(value, dict) or not value.keys() >= {'h', 's', 'v'}:
+                        raise TypeError(f"HSV value must be dict with h, s and v: got {value!r}")
+                    model.validate(value.get('h'), value.get('s'), value.get('v'))
+                elif model is not None:
+                    model.validate(value)
+            except (TypeError, ValueError) as e:
+                raise ActionException(type_id, instance, ActionError.InvalidValue, str(e)) from None
+
+        return validate
+
+    def render_state(self) -> dict | None:
         if self.value is None:
-            return
+            return None
 
         value = self.value.serialize()
         if value is None:
-            return
+            return None
 
-        yield {
+        return {
             'type': self.type_id,
             'state': {
                 'instance': self.value.name,
@@ -231,6 +285,8 @@ class ColorSetting(Capability):
 
 
 class Mode(SingleInstanceCapability):
+    __slots__ = ('modes',)
+
     type_id = "devices.capabilities.mode"
 
     class Instance(enum.Enum):
@@ -361,8 +417,23 @@ class Mode(SingleInstanceCapability):
             'modes': [{"value": mode.value} for mode in self.modes],
         }
 
+    def compile_validator(self, instance: str) -> Validator:
+        type_id = self.type_id
+        modes = frozenset(mode.value for mode in self.modes)
+
+        def validate(value: typing.Any, kwargs: dict) -> None:
+            if not isinstance(value, str) or value not in modes:
+                raise ActionException(
+                    type_id, instance, ActionError.InvalidValue,
+                    f"Mode is not supported by this capability: got {value!r}",
+                )
+
+        return validate
+
 
 class Range(SingleInstanceCapability):
+    __slots__ = ('unit', 'random_access', 'min_value', 'max_value', 'precision')
+
     type_id = "devices.capabilities.range"
 
     class Instance(enum.Enum):
@@ -390,6 +461,7 @@ class Range(SingleInstanceCapability):
         initial_value: typing.Optional[float] = None,
         retrievable: bool = False,
         reportable: bool = False,
+        coalesce: typing.Optional[float] = None,
     ):
         super().__init__(
             instance=instance.value,
@@ -397,6 +469,7 @@ class Range(SingleInstanceCapability):
             change_value=change_value,
             retrievable=retrievable,
             reportable=reportable,
+            coalesce=coalesce,
         )
         self.unit = unit
         self.random_access = random_access
@@ -468,8 +541,72 @@ class Range(SingleInstanceCapability):
 
         return result
 
+    def apply_delta(self, base: float, delta: float) -> float:
+        value = base + delta
+        if self.min_value is not None:
+            value = max(value, self.min_value)
+        if self.max_value is not None:
+            value = min(value, self.max_value)
+        return value
+
+    def compile_validator(self, instance: str) -> Validator:
+        type_id = self.type_id
+        min_value = -math.inf if self.min_value is None else self.min_value
+        max_value = math.inf if self.max_value is None else self.max_value
+        bounds = f"[{self.min_value}; {self.max_value}]"
+        absolute_allowed = self.random_access is not False
+        precision = self.precision or None
+        # values are counted in precision steps from the range start
+        origin = 0. if self.min_value is None else self.min_value
+        # remainder of a multiple is close either to 0 or to precision
+        lower = 1e-6 * (precision or 0.)
+        upper = (precision or 0.) - lower
+        # integers counted from integer origin are multiples of 1 and its fractions
+        integer_steps = precision is not None and (1. / precision).is_integer() and float(origin).is_integer()
+        isfinite = math.isfinite
+
+        def validate(value: typing.Any, kwargs: dict) -> None:
+            # bool is int too, but it's never a valid range value
+            value_type = type(value)
+            if value_type is not int and (value_type is not float or not isfinite(value)):
+                raise ActionException(
+                    type_id, instance, ActionError.InvalidValue,
+                    f"Value must be a number: got {value!r}",
+                )
+
+            relative = kwargs.get('relative', False) if kwargs else False
+            if relative is not True and relative is not False:
+                raise ActionException(
+                    type_id, instance, ActionError.InvalidValue,
+                    f"Relative flag must be bool: got {type(relative).__name__}",
+                )
+
+            if not relative:
+                if not absolute_allowed:
+                    raise ActionException(
+                        type_id, instance, ActionError.NotSupportedInCurrentMode,
+                        "Only relative changes are supported",
+                    )
+                if not (min_value <= value <= max_value):
+                    raise ActionException(
+                        type_id, instance, ActionError.InvalidValue,
+                        f"Value must be within range {bounds}: got {value}",
+                    )
+
+            if precision is not None and not (integer_steps and value_type is int):
+                remainder = (value if relative else value - origin) % precision
+                if lower < remainder < upper:
+                    raise ActionException(
+                        type_id, instance, ActionError.InvalidValue,
+                        f"Value must be a multiple of precision {precision}: got {value}",
+                    )
+
+        return validate
+
 
 class Toggle(SingleInstanceCapability):
+    __slots__ = ()
+
     type_id = "devices.capabilities.toggle"
 
     class Instance(enum.Enum):
@@ -502,3 +639,6 @@ class Toggle(SingleInstanceCapability):
         return {
             'instance': self.instance,
         }
+
+    def compile_validator(self, instance: str) -> Validator:
+        return _bool_validator(self.type_id, instance)
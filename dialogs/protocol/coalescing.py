@@ -0,0 +1,110 @@
+import typing
+import asyncio
+
+if typing.TYPE_CHECKING:
+    from .base import Capability
+
+
+class _PendingChange:
+    __slots__ = ('instance', 'value', 'relative', 'kwargs', 'future')
+
+    def __init__(self, instance: str, value: typing.Any, relative: bool, kwargs: dict, future: asyncio.Future):
+        self.instance = instance
+        self.value = value
+        self.relative = relative
+        self.kwargs = kwargs
+        self.future = future
+
+
+class ChangeCoalescer:
+    """
+    Merges changes of a capability, which come while previous change
+    is being dispatched or earlier than `interval` seconds after it:
+    relative deltas are summed, absolute value replaces everything
+    pending before it. Only the merged value is passed to change_value,
+    all the merged callers get its result.
+
+    Relative changes are resolved against the last dispatched target
+    for `target_ttl` seconds, so they don't race with device reporting
+    its new value back.
+    """
+    __slots__ = ('capability', 'interval', 'target_ttl', '_lock', '_pending', '_dispatch_after', '_target')
+
+    def __init__(self, capability: 'Capability', interval: float = 0., target_ttl: float = 2.):
+        self.capability = capability
+        self.interval = interval
+        self.target_ttl = target_ttl
+        self._lock = asyncio.Lock()
+        self._pending: typing.Optional[_PendingChange] = None
+        self._dispatch_after = 0.
+        # last dispatched absolute value and time until it's trusted more than reported value
+        self._target: typing.Optional[tuple[typing.Any, float]] = None
+
+    async def change(self, instance: str, value: typing.Any, kwargs: dict) -> tuple[str, str]:
+        kwargs = dict(kwargs)
+        relative = bool(kwargs.pop('relative', False))
+
+        pending = self._pending
+        if pending is not None and pending.instance == instance:
+            if not relative:
+                pending.value = value
+                pending.relative = False
+            elif pending.relative:
+                pending.value += value
+            else:
+                pending.value = self.capability.apply_delta(pending.value, value)
+            pending.kwargs.update(kwargs)
+            return await asyncio.shield(pending.future)
+
+        loop = asyncio.get_running_loop()
+        pending = self._pending = _PendingChange(instance, value, relative, kwargs, loop.create_future())
+        try:
+            async with self._lock:
+                # sleep(0) also lets changes issued at the same loop iteration join
+                await asyncio.sleep(max(self._dispatch_after - loop.time(), 0))
+                if self._pending is pending:
+                    self._pending = None
+                try:
+                    result = await self._dispatch(pending, loop.time())
+                finally:
+                    self._dispatch_after = loop.time() + self.interval
+            pending.future.set_result(result)
+        except BaseException as e:
+            if not pending.future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    pending.future.cancel()
+                else:
+                    pending.future.set_exception(e)
+                    # owner re-raises it, so don't complain if nobody joined
+                    pending.future.exception()
+            if self._pending is pending:
+                self._pending = None
+            raise
+
+        return await pending.future
+
+    async def _dispatch(self, pending: _PendingChange, now: float) -> tuple[str, str]:
+        capability = self.capability
+        value = pending.value
+        kwargs = pending.kwargs
+
+        if pending.relative:
+            if self._target is not None and self._target[1] > now:
+                base = self._target[0]
+            else:
+                base = capability._value
+
+            if base is None:
+                # nothing to resolve the delta against, let the device decide
+                kwargs['relative'] = True
+            else:
+                value = capability.apply_delta(base, value)
+
+        if not kwargs.get('relative'):
+            self._target = (value, now + self.target_ttl)
+
+        try:
+            return await capability.change_value(capability, pending.instance, value, **kwargs)
+        except BaseException:
+            self._target = None
+            raise
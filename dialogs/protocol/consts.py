@@ -1,6 +1,10 @@
 import enum
 
 
+# message of DEVICE_UNREACHABLE error of the device query
+DEVICE_UNREACHABLE_MESSAGE = 'Устройство недоступно'
+
+
 class QueryError(enum.Enum):
     DeviceUnreachable = 'DEVICE_UNREACHABLE'
     DeviceBusy = 'DEVICE_BUSY'
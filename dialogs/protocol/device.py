@@ -31,7 +31,7 @@ __all__ = [item[1] for item in _mapping]
 
 # FIXME mypy is not happy here, so run this file to generate stubs
 for type_id, typename in _mapping:
-    globals()[typename] = type(typename, (Device,), {'type_id': type_id})
+    globals()[typename] = type(typename, (Device,), {'type_id': type_id, '__slots__': ()})
 
 
 if __name__ == '__main__':
@@ -20,6 +20,8 @@ E = typing.TypeVar('E', bound=enum.Enum)
 
 
 class Event(Property, typing.Generic[E]):
+    __slots__ = ('events',)
+
     type_id = 'devices.properties.event'
 
     class Instance(enum.Enum):
@@ -73,6 +75,8 @@ class Event(Property, typing.Generic[E]):
 
 
 class Vibration(Event["Vibration.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Tilt = "tilt"
         Fall = "fall"
@@ -94,6 +98,8 @@ class Vibration(Event["Vibration.Value"]):
 
 
 class Open(Event["Open.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Opened = "opened"
         Closed = "closed"
@@ -114,6 +120,8 @@ class Open(Event["Open.Value"]):
 
 
 class Button(Event["Button.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Click = "click"
         DoubleClick = "double_click"
@@ -135,6 +143,8 @@ class Button(Event["Button.Value"]):
 
 
 class Motion(Event["Motion.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Detected = "detected"
         NotDetected = "not_detected"
@@ -155,6 +165,8 @@ class Motion(Event["Motion.Value"]):
 
 
 class Smoke(Event["Smoke.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Detected = "detected"
         NotDetected = "not_detected"
@@ -176,6 +188,8 @@ class Smoke(Event["Smoke.Value"]):
 
 
 class Gas(Event["Gas.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Detected = "detected"
         NotDetected = "not_detected"
@@ -197,6 +211,8 @@ class Gas(Event["Gas.Value"]):
 
 
 class BatteryLevel(Event["BatteryLevel.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Low = "low"
         Normal = "normal"
@@ -217,6 +233,8 @@ class BatteryLevel(Event["BatteryLevel.Value"]):
 
 
 class WaterLevel(Event["WaterLevel.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Low = "low"
         Normal = "normal"
@@ -237,6 +255,8 @@ class WaterLevel(Event["WaterLevel.Value"]):
 
 
 class WaterLeak(Event["WaterLeak.Value"]):
+    __slots__ = ()
+
     class Value(enum.Enum):
         Dry = "dry"
         Leak = "leak"
@@ -0,0 +1,187 @@
+import enum
+import time
+import typing
+import asyncio
+
+from .consts import ActionError
+from .exceptions import ActionException
+from .scheduler import Timer, scheduler
+
+
+ChangeFactory = typing.Callable[[], typing.Awaitable[tuple[str, str]]]
+
+
+class ActionPolicy(enum.Enum):
+    # changes of different requests run independently
+    Concurrent = 'concurrent'
+    # request waits until previous requests and their background jobs are finished
+    Serialize = 'serialize'
+    # request cancels unfinished changes and background jobs of previous ones
+    LatestWins = 'latest_wins'
+    # request is rejected with DEVICE_BUSY while anything is running
+    RejectBusy = 'reject_busy'
+
+
+class ActionMetrics:
+    __slots__ = (
+        'requests',
+        'changes',
+        'done',
+        'failed',
+        'cancelled',
+        'rejected',
+        'wait_time',
+        'run_time',
+        'max_run_time',
+        'last_run_time',
+    )
+
+    def __init__(self):
+        self.requests = 0
+        self.changes = 0
+        self.done = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        # seconds, summed over requests
+        self.wait_time = 0.
+        self.run_time = 0.
+        self.max_run_time = 0.
+        self.last_run_time = 0.
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class ActionExecutor:
+    """
+    Runs capability changes of a device according to its action policy.
+
+    Changes of a single request are always run concurrently, the policy
+    defines how requests interact with each other. Long-running jobs,
+    which outlive the change itself (e.g. moving a curtain for some time),
+    should be started with start_background(), and delayed commands (e.g.
+    stopping the curtain motor) should be scheduled with schedule(), so
+    the policy covers them too.
+    """
+    def __init__(self, policy: ActionPolicy = ActionPolicy.Concurrent):
+        self.policy = policy
+        self.metrics = ActionMetrics()
+        self._lock = asyncio.Lock()
+        self._running: set[asyncio.Task] = set()
+        self._timers: list[Timer] = []
+
+    @property
+    def busy(self) -> bool:
+        return any(not task.done() for task in self._running) or any(timer.active for timer in self._timers)
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    def start_background(self, coro: typing.Coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._track(task)
+        return task
+
+    def schedule(self, delay: float, callback: typing.Callable[..., None], *args) -> Timer:
+        """
+        Call callback(*args) in delay seconds with the shared scheduler.
+        """
+        self._timers = [timer for timer in self._timers if timer.active]
+        timer = scheduler.schedule(delay, callback, *args)
+        self._timers.append(timer)
+        return timer
+
+    async def cancel(self) -> None:
+        """
+        Cancel everything running and scheduled and wait until it's finished.
+        """
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+
+        tasks = [task for task in self._running if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def wait_idle(self) -> None:
+        while self.busy:
+            tasks = [task for task in self._running if not task.done()]
+            if tasks:
+                await asyncio.wait(tasks)
+            for timer in self._timers:
+                await timer.wait()
+
+    async def execute(
+        self,
+        changes: typing.Sequence[tuple[tuple[str, str], ChangeFactory]],
+    ) -> list[tuple[str, str] | ActionException]:
+        """
+        Run changes, keyed with (type_id, instance), returning their results
+        in the same order. Changes failed with ActionException, cancelled
+        or rejected changes are returned as ActionException.
+        """
+        metrics = self.metrics
+        metrics.requests += 1
+        metrics.changes += len(changes)
+
+        if self.policy is ActionPolicy.RejectBusy and self.busy:
+            metrics.rejected += len(changes)
+            return [
+                ActionException(type_id, instance, ActionError.DeviceBusy)
+                for (type_id, instance), _ in changes
+            ]
+
+        queued = time.monotonic()
+        if self.policy is ActionPolicy.Serialize:
+            async with self._lock:
+                await self.wait_idle()
+                return await self._run(changes, queued)
+
+        if self.policy is ActionPolicy.LatestWins:
+            await self.cancel()
+        return await self._run(changes, queued)
+
+    async def _run(
+        self,
+        changes: typing.Sequence[tuple[tuple[str, str], ChangeFactory]],
+        queued: float,
+    ) -> list[tuple[str, str] | ActionException]:
+        metrics = self.metrics
+        started = time.monotonic()
+        metrics.wait_time += started - queued
+
+        tasks = [asyncio.ensure_future(factory()) for _, factory in changes]
+        for task in tasks:
+            self._track(task)
+        await asyncio.wait(tasks)
+
+        elapsed = time.monotonic() - started
+        metrics.run_time += elapsed
+        metrics.last_run_time = elapsed
+        metrics.max_run_time = max(metrics.max_run_time, elapsed)
+
+        results: list[tuple[str, str] | ActionException] = []
+        for ((type_id, instance), _), task in zip(changes, tasks):
+            if task.cancelled():
+                metrics.cancelled += 1
+                results.append(ActionException(
+                    type_id, instance, ActionError.DeviceBusy, 'Cancelled by a newer action',
+                ))
+                continue
+
+            error = task.exception()
+            if error is None:
+                metrics.done += 1
+                results.append(task.result())
+            elif isinstance(error, ActionException):
+                metrics.failed += 1
+                results.append(error)
+            else:
+                metrics.failed += 1
+                raise error
+
+        return results
@@ -17,6 +17,8 @@ __all__ = [
 
 
 class Float(Property):
+    __slots__ = ('unit',)
+
     type_id = 'devices.properties.float'
 
     class Instance(enum.Enum):
@@ -77,6 +79,8 @@ class Float(Property):
 
 
 class Amperage(Float):
+    __slots__ = ()
+
     def __init__(
         self,
         initial_value: typing.Optional[float] = None,
@@ -97,6 +101,8 @@ class Amperage(Float):
 
 
 class CO2Level(Float):
+    __slots__ = ()
+
     def __init__(
         self,
         initial_value: typing.Optional[float] = None,
@@ -117,6 +123,8 @@ class CO2Level(Float):
 
 
 class Humidity(Float):
+    __slots__ = ()
+
     def __init__(
         self,
         initial_value: typing.Optional[float] = None,
@@ -139,6 +147,8 @@ class Humidity(Float):
 
 
 class Power(Float):
+    __slots__ = ()
+
     def __init__(
         self,
         initial_value: typing.Optional[float] = None,
@@ -159,6 +169,8 @@ class Power(Float):
 
 
 class Temperature(Float):
+    __slots__ = ()
+
     def __init__(
         self,
         unit: Float.Unit,
@@ -185,6 +197,8 @@ class Temperature(Float):
 
 
 class Voltage(Float):
+    __slots__ = ()
+
     def __init__(
         self,
         initial_value: typing.Optional[float] = None,
@@ -205,6 +219,8 @@ class Voltage(Float):
 
 
 class WaterLevel(Float):
+    __slots__ = ()
+
     def __init__(
         self,
         initial_value: typing.Optional[float] = None,
@@ -0,0 +1,172 @@
+"""
+Short in-memory history of numeric property values.
+"""
+
+import math
+import time
+import array
+import bisect
+import typing
+import functools
+
+from aiohttp.web import AppKey
+
+from .base import Device
+from .observers import ValueChange
+from .float_property import Float
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of (timestamp, value) samples, kept in two
+    float64 arrays. When it's full, the oldest samples are overwritten.
+    """
+    __slots__ = ('capacity', '_timestamps', '_values', '_next', '_size')
+
+    # bytes per sample: timestamp and value
+    record_size = 16
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f"Capacity must be positive: got {capacity}")
+        self.capacity = capacity
+        self._timestamps = array.array('d', bytes(8 * capacity))
+        self._values = array.array('d', bytes(8 * capacity))
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * self.record_size
+
+    def append(self, timestamp: float, value: float) -> None:
+        idx = self._next
+        self._timestamps[idx] = timestamp
+        self._values[idx] = value
+        self._next = (idx + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def ordered(self) -> tuple[array.array, array.array]:
+        """
+        Copies of timestamps and values, from the oldest to the newest.
+        """
+        return self.window()
+
+    def _segments(self) -> tuple[tuple[int, int], ...]:
+        # sorted parts of the buffer, from the oldest to the newest
+        if self._size < self.capacity:
+            return ((0, self._size),)
+        return ((self._next, self.capacity), (0, self._next))
+
+    def window(
+        self,
+        since: typing.Optional[float] = None,
+        until: typing.Optional[float] = None,
+    ) -> tuple[array.array, array.array]:
+        """
+        Copies of samples with since <= timestamp <= until.
+        Both sorted parts of the buffer are bisected in place,
+        so only the samples within the window are copied.
+        """
+        timestamps = array.array('d')
+        values = array.array('d')
+        for low, high in self._segments():
+            if since is not None:
+                low = bisect.bisect_left(self._timestamps, since, low, high)
+            if until is not None:
+                high = bisect.bisect_right(self._timestamps, until, low, high)
+            timestamps += self._timestamps[low:high]
+            values += self._values[low:high]
+        return timestamps, values
+
+    def stats(
+        self,
+        since: typing.Optional[float] = None,
+        until: typing.Optional[float] = None,
+        percentiles: typing.Iterable[float] = (50., 95.),
+    ) -> dict:
+        """
+        Min, max, mean and percentiles of the sample values within the window.
+        Samples are not weighted by time they were actual.
+        """
+        _, values = self.window(since, until)
+        result: dict = {'count': len(values)}
+        if not values:
+            return result
+
+        result['min'] = min(values)
+        result['max'] = max(values)
+        result['mean'] = math.fsum(values) / len(values)
+        ordered = sorted(values)
+        for q in percentiles:
+            result[f'p{q:g}'] = percentile(ordered, q)
+        return result
+
+
+def percentile(ordered: typing.Sequence[float], q: float) -> float:
+    """
+    Percentile of sorted values with linear interpolation between closest ranks.
+    """
+    if not 0 <= q <= 100:
+        raise ValueError(f"Percentile must be within [0; 100]: got {q}")
+
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class History:
+    """
+    Records value changes of float properties of the devices.
+
+    Samples are timestamped with the monotonic clock, as wall clock steps
+    would break their order. Use wall_time() to present them.
+    """
+    def __init__(self, memory_budget: int):
+        """
+        :param memory_budget: bytes per property, defines ring buffer capacity.
+        """
+        self.capacity = max(1, memory_budget // RingBuffer.record_size)
+        self.buffers: dict[tuple[str, str], RingBuffer] = {}
+
+    def track(self, device: Device) -> None:
+        for prop in device.properties():
+            if not isinstance(prop, Float):
+                continue
+
+            buffer = self.buffers[device.device_id, prop.instance] = RingBuffer(self.capacity)
+            # value the property has before its first change
+            if prop._value is not None:
+                buffer.append(self.now(), prop._value)
+            prop.subscribe(functools.partial(self._record, buffer))
+
+    @staticmethod
+    def now() -> float:
+        return time.monotonic()
+
+    @staticmethod
+    def wall_time(timestamp: float) -> float:
+        """
+        Wall clock time of the sample timestamp.
+        """
+        return timestamp + time.time() - time.monotonic()
+
+    @classmethod
+    def _record(cls, buffer: RingBuffer, change: ValueChange) -> None:
+        if change.new is not None:
+            buffer.append(cls.now(), change.new)
+
+    def get(self, device_id: str, instance: str) -> typing.Optional[RingBuffer]:
+        return self.buffers.get((device_id, instance))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+
+history_key = AppKey('history', History)
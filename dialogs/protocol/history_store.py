@@ -0,0 +1,352 @@
+"""
+Long-term on-disk history of numeric property values.
+
+Samples are appended to memory-mapped segment files of fixed-size records:
+
+    header: magic, version, records count, segment start time
+    record: timestamp (float64), device index (uint32), property index (uint32), value (float64)
+
+Device and property indices are resolved through index.json in the same
+directory. Segments are rotated by time or when they are full, segments
+holding only samples older than retention period are removed.
+"""
+
+import os
+import json
+import mmap
+import struct
+import typing
+import asyncio
+import logging
+import functools
+
+from aiohttp.web import AppKey
+
+from .base import Device
+from .observers import ValueChange
+from .float_property import Float
+
+
+HEADER = struct.Struct('<4sIQd')
+RECORD = struct.Struct('<dIId')
+MAGIC = b'WBHS'
+VERSION = 1
+
+Sample = tuple[float, str, str, float]
+
+
+class Segment:
+    """
+    Single memory-mapped segment file.
+    """
+    def __init__(self, path: str, capacity: typing.Optional[int] = None, started: float = 0.):
+        """
+        Open existing segment, or create a new one if capacity is given.
+        """
+        self.path = path
+        writable = capacity is not None
+        if writable:
+            with open(path, 'xb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, 0, started))
+                f.truncate(HEADER.size + capacity * RECORD.size)
+
+        self._file = open(path, 'r+b' if writable else 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, version, self.count, self.started = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a history segment")
+        self.capacity = (len(self._mmap) - HEADER.size) // RECORD.size
+
+    def close(self) -> None:
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, records: bytes) -> int:
+        """
+        Write as many packed records as fit, return how many were written.
+        """
+        written = min(len(records) // RECORD.size, self.capacity - self.count)
+        offset = HEADER.size + self.count * RECORD.size
+        self._mmap[offset:offset + written * RECORD.size] = records[:written * RECORD.size]
+        self.count += written
+        # records count is updated after records themselves, so readers never see partial ones
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, self.count, self.started)
+        return written
+
+    def flush(self) -> None:
+        self._mmap.flush()
+
+    def timestamp(self, idx: int) -> float:
+        return RECORD.unpack_from(self._mmap, HEADER.size + idx * RECORD.size)[0]
+
+    def bisect(self, timestamp: float) -> int:
+        """
+        Index of the first record with timestamp >= given one.
+        """
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.timestamp(mid) < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def scan(self, since: float, until: float, chunk: int = 4096) -> typing.Iterator[tuple[float, int, int, float]]:
+        """
+        Records with since <= timestamp < until, read in chunks.
+        """
+        idx = self.bisect(since)
+        while idx < self.count:
+            end = min(idx + chunk, self.count)
+            data = self._mmap[HEADER.size + idx * RECORD.size:HEADER.size + end * RECORD.size]
+            for record in RECORD.iter_unpack(data):
+                if record[0] >= until:
+                    return
+                yield record
+            idx = end
+
+
+class HistoryStore:
+    """
+    Appends samples of float properties to segment files.
+
+    Samples are buffered in memory by append() and written to disk
+    by flush() in the default executor, so callers on the event loop
+    never wait for the disk.
+    """
+    def __init__(
+        self,
+        path: str,
+        segment_records: int = 1 << 20,
+        rotate_interval: float = 86400.,
+        retention: float = 7 * 86400.,
+    ):
+        """
+        Segments are rotated every rotate_interval seconds, samples are kept
+        for retention seconds.
+        """
+        self.path = path
+        self.segment_records = segment_records
+        self.rotate_interval = rotate_interval
+        self.retention = retention
+        self.log = logging.getLogger('wb.history')
+
+        os.makedirs(path, exist_ok=True)
+        self.index = HistoryIndex.load(path)
+        self._buffer = bytearray()
+        self._segment: typing.Optional[Segment] = None
+        self._lock = asyncio.Lock()
+
+    def track(self, device: Device) -> None:
+        for prop in device.properties():
+            if not isinstance(prop, Float):
+                continue
+
+            prop.subscribe(functools.partial(self._record, device.device_id, prop.instance))
+
+    def _record(self, device_id: str, instance: str, change: ValueChange) -> None:
+        if change.new is not None:
+            self.append(change.timestamp, device_id, instance, change.new)
+
+    def append(self, timestamp: float, device_id: str, instance: str, value: float) -> None:
+        device_idx, property_idx = self.index.resolve(device_id, instance)
+        self._buffer += RECORD.pack(timestamp, device_idx, property_idx, value)
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer) // RECORD.size
+
+    async def flush(self) -> None:
+        if not self._buffer and not self.index.dirty:
+            return
+
+        data, self._buffer = self._buffer, bytearray()
+        index = self.index.snapshot()
+        async with self._lock:
+            future = asyncio.get_running_loop().run_in_executor(None, self.write, data, index)
+            try:
+                await asyncio.shield(future)
+            finally:
+                if not future.done():
+                    # cancellation does not stop the worker: data and the segment
+                    # are in use until it finishes
+                    await asyncio.wait([future])
+                if future.cancelled() or future.exception() is not None:
+                    if index is not None:
+                        self.index.dirty = True
+                    # records not written yet are retried by the next flush
+                    self._buffer[:0] = data
+
+    async def flusher_loop(self, interval: float = 5.) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                self.log.exception("Failed to flush history")
+
+    def write(self, data: bytearray, index: typing.Optional[dict] = None) -> None:
+        """
+        Blocking write of packed records, rotating segments as needed.
+        Written records are removed from data, so it holds the rest on failure.
+        Index snapshot, if given, is saved before records referring to it.
+        """
+        if index is not None:
+            self.index.save(index)
+
+        while data:
+            segment = self._current_segment(RECORD.unpack_from(data)[0])
+            written = segment.append(data)
+            del data[:written * RECORD.size]
+        if self._segment is not None:
+            self._segment.flush()
+
+    def _current_segment(self, first_timestamp: float) -> Segment:
+        segment = self._segment
+        if segment is not None and not segment.full and first_timestamp - segment.started < self.rotate_interval:
+            return segment
+
+        if segment is not None:
+            segment.close()
+
+        # segment is named by its first record, so readers know time range of each segment
+        started = first_timestamp
+        path = os.path.join(self.path, f'{started:017.6f}.seg')
+        while os.path.exists(path):
+            started += 1e-6
+            path = os.path.join(self.path, f'{started:017.6f}.seg')
+
+        self._segment = Segment(path, capacity=self.segment_records, started=started)
+        self._cleanup(started - self.retention)
+        return self._segment
+
+    def _cleanup(self, expired: float) -> None:
+        """
+        Remove segments with all records older than expired timestamp.
+        """
+        names = segment_files(self.path)
+        # the segment ends where the next one starts
+        for name, next_name in zip(names, names[1:]):
+            if float(next_name[:-len('.seg')]) > expired:
+                break
+            self.log.info("Removing history segment %s", name)
+            os.unlink(os.path.join(self.path, name))
+
+    def close(self) -> None:
+        if self._buffer or self.index.dirty:
+            self.write(self._buffer, self.index.snapshot())
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+class HistoryIndex:
+    """
+    Mapping of device ids and property instances to record indices.
+    """
+    def __init__(self, path: str, devices: list[str], properties: list[str]):
+        self.path = path
+        self.devices = devices
+        self.properties = properties
+        self._devices = {device_id: idx for idx, device_id in enumerate(devices)}
+        self._properties = {instance: idx for idx, instance in enumerate(properties)}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str) -> 'HistoryIndex':
+        try:
+            with open(os.path.join(path, 'index.json')) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {'devices': [], 'properties': []}
+        return cls(path, data['devices'], data['properties'])
+
+    def snapshot(self) -> typing.Optional[dict]:
+        """
+        Copy of the index to be saved, if it has changed since the last snapshot.
+        """
+        if not self.dirty:
+            return None
+        self.dirty = False
+        return {'devices': list(self.devices), 'properties': list(self.properties)}
+
+    def save(self, snapshot: dict) -> None:
+        tmp_path = os.path.join(self.path, 'index.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, os.path.join(self.path, 'index.json'))
+
+    def resolve(self, device_id: str, instance: str) -> tuple[int, int]:
+        device_idx = self._devices.get(device_id)
+        if device_idx is None:
+            device_idx = self._devices[device_id] = len(self.devices)
+            self.devices.append(device_id)
+            self.dirty = True
+
+        property_idx = self._properties.get(instance)
+        if property_idx is None:
+            property_idx = self._properties[instance] = len(self.properties)
+            self.properties.append(instance)
+            self.dirty = True
+
+        return device_idx, property_idx
+
+
+def segment_files(path: str) -> list[str]:
+    # names are zero-padded start timestamps, so they sort chronologically
+    return sorted(name for name in os.listdir(path) if name.endswith('.seg'))
+
+
+class HistoryReader:
+    """
+    Reads samples from segment files of the store without loading them into memory.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def scan(
+        self,
+        since: float,
+        until: float,
+        device_id: typing.Optional[str] = None,
+        instance: typing.Optional[str] = None,
+    ) -> typing.Iterator[Sample]:
+        """
+        Samples with since <= timestamp < until, optionally of a single device or property.
+        """
+        index = HistoryIndex.load(self.path)
+        device_filter = None if device_id is None else index._devices.get(device_id, -1)
+        property_filter = None if instance is None else index._properties.get(instance, -1)
+        names = segment_files(self.path)
+        starts = [float(name[:-len('.seg')]) for name in names]
+
+        for idx, name in enumerate(names):
+            # the segment ends where the next one starts
+            if starts[idx] >= until or (idx + 1 < len(names) and starts[idx + 1] <= since):
+                continue
+
+            try:
+                segment = Segment(os.path.join(self.path, name))
+            except (FileNotFoundError, ValueError):
+                # removed by rotation or being created meanwhile
+                continue
+
+            try:
+                for timestamp, device_idx, property_idx, value in segment.scan(since, until):
+                    if device_filter is not None and device_idx != device_filter:
+                        continue
+                    if property_filter is not None and property_idx != property_filter:
+                        continue
+                    yield timestamp, index.devices[device_idx], index.properties[property_idx], value
+            finally:
+                segment.close()
+
+
+history_store_key = AppKey('history_store', HistoryStore)
@@ -0,0 +1,200 @@
+"""
+Export of device state changes to InfluxDB-compatible line protocol sink.
+"""
+
+import enum
+import math
+import typing
+import asyncio
+import logging
+import functools
+
+import yarl
+from aiohttp.web import AppKey
+
+from .base import Device, Capability, Property
+from .capability import ColorSetting
+from .observers import ValueChange
+
+
+def _escape_tag(value: str) -> str:
+    return value.replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+
+def _escape_string(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class BatchRejected(Exception):
+    """
+    Sink refused the batch itself, so sending it again would fail the same way.
+    """
+
+
+def format_fields(value: typing.Any) -> typing.Optional[str]:
+    """
+    Line protocol fields of the value. Field name depends on value type,
+    as InfluxDB does not allow different types under the same field.
+    """
+    if isinstance(value, enum.Enum):
+        value = value.value
+    elif isinstance(value, (ColorSetting.HSV, ColorSetting.RGB, ColorSetting.Temperature)):
+        # colour models set directly are written as their serialized form
+        if isinstance(value, ColorSetting.Temperature) and value.value is None:
+            return None
+        value = value.serialize()
+
+    if isinstance(value, bool):
+        return f'on={"true" if value else "false"}'
+    if isinstance(value, (int, float)):
+        # nan and inf are not valid in line protocol
+        return f'value={float(value)!r}' if math.isfinite(value) else None
+    if isinstance(value, str):
+        return f'text={_escape_string(value)}'
+    if isinstance(value, dict):
+        # colour models
+        return ','.join(
+            f'{_escape_tag(str(key))}={float(item)!r}'
+            for key, item in value.items()
+            if isinstance(item, (int, float)) and not isinstance(item, bool) and math.isfinite(item)
+        ) or None
+    return None
+
+
+class InfluxExporter:
+    """
+    Writes value changes of the tracked devices into InfluxDB in batches.
+
+    Batch is sent when `batch_size` lines are collected or `flush_interval`
+    seconds passed. If the sink fails, lines are kept and sending is retried
+    with exponential backoff, unless the batch is rejected with a client error.
+    At most `max_buffer` lines are kept, the oldest are dropped beyond it.
+    """
+    def __init__(
+        self,
+        session,
+        url: str = 'http://localhost:8086',
+        database: str = 'smarthome',
+        measurement: str = 'smarthome',
+        batch_size: int = 500,
+        flush_interval: float = 10.,
+        max_buffer: int = 100_000,
+        backoff_initial: float = 1.,
+        backoff_max: float = 300.,
+        log: typing.Optional[logging.Logger] = None,
+    ):
+        self.session = session
+        self.write_url = yarl.URL(url).join(yarl.URL('write')).with_query({'db': database, 'precision': 'ns'})
+        self.measurement = _escape_tag(measurement)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.log = log or logging.getLogger('wb.influx')
+
+        self.lines: list[str] = []
+        self.dropped = 0
+        self.sent = 0
+        self._batch_ready = asyncio.Event()
+
+    def track(self, device: Device) -> None:
+        device_tag = _escape_tag(device.device_id)
+        items: list[tuple[Capability | Property, list[str]]] = [
+            *((cap, list(cap.instances)) for cap in device.capabilities()),
+            *((prop, [prop.instance]) for prop in device.properties()),
+        ]
+        for item, instances in items:
+            # type is shortened: devices.capabilities.on_off -> on_off
+            series = f'{self.measurement},device={device_tag},type={_escape_tag(item.type_id.rsplit(".", 1)[-1])}'
+            if len(instances) == 1:
+                series = f'{series},instance={_escape_tag(instances[0])}'
+            item.subscribe(functools.partial(self._record, series))
+
+    def _record(self, series: str, change: ValueChange) -> None:
+        fields = format_fields(change.new)
+        if fields is not None:
+            self.add(f'{series} {fields} {int(change.timestamp * 1e9)}')
+
+    def add(self, line: str) -> None:
+        self.lines.append(line)
+        if len(self.lines) > self.max_buffer:
+            self._trim()
+        if len(self.lines) >= self.batch_size:
+            self._batch_ready.set()
+
+    def _trim(self) -> None:
+        overflow = len(self.lines) - self.max_buffer
+        if overflow > 0:
+            del self.lines[:overflow]
+            self.dropped += overflow
+
+    async def write(self, lines: list[str]) -> None:
+        response = await self.session.post(self.write_url, data='\n'.join(lines).encode())
+        async with response:
+            if 200 <= response.status < 300:
+                return
+            message = f"Sink responded with {response.status}: {await response.text()}"
+            # timeouts and rate limiting are the only client errors worth a retry
+            if 400 <= response.status < 500 and response.status not in (408, 429):
+                raise BatchRejected(message)
+            raise RuntimeError(message)
+
+    async def flush(self) -> bool:
+        """
+        Send a single batch, return False if the sink failed.
+        """
+        batch = self.lines[:self.batch_size]
+        if not batch:
+            return True
+
+        del self.lines[:len(batch)]
+        try:
+            await self.write(batch)
+        except BatchRejected as e:
+            self.log.error("Dropping %d lines rejected by the sink: %s", len(batch), e)
+            self.dropped += len(batch)
+            return True
+        except Exception as e:
+            self.log.warning("Failed to export %d lines: %s", len(batch), e)
+            # lines added meanwhile go after the failed batch
+            self.lines[:0] = batch
+            self._trim()
+            return False
+
+        self.sent += len(batch)
+        return True
+
+    async def export_loop(self) -> None:
+        backoff = self.backoff_initial
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            while self.lines:
+                self._batch_ready.clear()
+                if not await self.flush():
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.backoff_max)
+                    continue
+                backoff = self.backoff_initial
+                if len(self.lines) < self.batch_size:
+                    break
+
+    async def close(self) -> None:
+        """
+        Send the buffered lines and close the session. Lines are dropped
+        only if the sink fails, there is no retry on shutdown.
+        """
+        try:
+            while self.lines:
+                if not await self.flush():
+                    self.log.warning("Dropping %d lines on shutdown", len(self.lines))
+                    break
+        finally:
+            await self.session.close()
+
+
+influx_exporter_key = AppKey('influx_exporter', InfluxExporter)
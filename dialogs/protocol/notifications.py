@@ -6,11 +6,15 @@ import logging
 import yarl
 from aiohttp.web import AppKey
 
+from dialogs import codec
+
 from .base import Device
 from .exceptions import NotifyException
 
 
 class Notifications:
+    headers = {'Content-Type': 'application/json'}
+
     def __init__(
         self,
         skill_id: str,
@@ -29,6 +33,20 @@ class Notifications:
         )
         self.log = log or logging.getLogger(__name__)
         self.session = session
+        self.paused = False
+
+    def pause(self) -> None:
+        """
+        Stop sending notifications, e.g. when user unlinked the skill.
+        """
+        if not self.paused:
+            self.log.info("Notifications for user %r paused", self.user_id)
+        self.paused = True
+
+    def resume(self) -> None:
+        if self.paused:
+            self.log.info("Notifications for user %r resumed", self.user_id)
+        self.paused = False
 
     async def close(self):
         await self.session.close()
@@ -46,9 +64,9 @@ class Notifications:
                 'devices': devices,
             },
         }
-        response = await self.session.post(url, json=payload)
+        response = await self.session.post(url, data=codec.dumps(payload), headers=self.headers)
         status = response.status
-        data = await response.json()
+        data = codec.loads(await response.read())
         if 200 <= status < 300:
             self.log.info("Sent state, request_id=%r", data.get('request_id'))
             return
@@ -62,6 +80,8 @@ class Notifications:
             # 10 seconds value is hardcoded as a sane period that should not lead to ban
             # from Alice server.
             await asyncio.sleep(10)
+            if self.paused:
+                continue
 
             states = []
             # FIXME get in parallel
@@ -93,14 +113,15 @@ class Notifications:
     async def send_device_specifications_updated(self):
         url = self.base_url.join(yarl.URL('discovery'))
         ts = time.time()
-        response = await self.session.post(url, json={
+        payload = {
             'ts': ts,
             'payload': {
                 'user_id': self.user_id,
             }
-        })
+        }
+        response = await self.session.post(url, data=codec.dumps(payload), headers=self.headers)
         status = response.status
-        data = await response.json()
+        data = codec.loads(await response.read())
         if 200 <= status < 300:
             self.log.info("Sent device specs updated, request_id=%r", data.get('request_id'))
             return
@@ -0,0 +1,98 @@
+import time
+import typing
+import asyncio
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+class ValueChange(typing.NamedTuple):
+    item: 'Observable'
+    old: typing.Any
+    new: typing.Any
+    timestamp: float
+
+
+Observer = typing.Callable[[ValueChange], None]
+
+
+class Observable:
+    """
+    Base for capabilities and properties, notifying subscribed
+    observers when their value changes.
+    """
+    # observers list is created on first subscription only,
+    # so items nobody listens to pay just for the empty slot.
+    __slots__ = ('_observers',)
+
+    _observers: typing.Optional[list[Observer]]
+
+    def subscribe(self, observer: Observer) -> None:
+        """
+        Call observer synchronously on every actual value change.
+        """
+        if self._observers is None:
+            self._observers = []
+        self._observers.append(observer)
+
+    def unsubscribe(self, observer: Observer) -> None:
+        if self._observers is not None and observer in self._observers:
+            self._observers.remove(observer)
+            if not self._observers:
+                self._observers = None
+
+    def notify_observers(self, old: typing.Any, new: typing.Any) -> None:
+        if not self._observers:
+            return
+
+        change = ValueChange(self, old, new, time.time())
+        for observer in tuple(self._observers):
+            try:
+                observer(change)
+            except Exception:
+                log.exception("Value change observer %r failed", observer)
+
+
+class ChangeStream:
+    """
+    Asynchronous stream of value changes of several items.
+
+        async with ChangeStream(device.capabilities()) as stream:
+            async for change in stream:
+                ...
+
+    If maxsize is set and consumer falls behind, the oldest changes are dropped.
+    """
+    def __init__(self, items: typing.Iterable[Observable], maxsize: int = 0):
+        self.items = list(dict.fromkeys(items))
+        self.dropped = 0
+        self._queue: asyncio.Queue[ValueChange] = asyncio.Queue(maxsize)
+        for item in self.items:
+            item.subscribe(self._put)
+
+    def _put(self, change: ValueChange) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(change)
+
+    def close(self) -> None:
+        for item in self.items:
+            item.unsubscribe(self._put)
+        self.items = []
+
+    async def get(self) -> ValueChange:
+        return await self._queue.get()
+
+    def __aiter__(self) -> 'ChangeStream':
+        return self
+
+    async def __anext__(self) -> ValueChange:
+        return await self._queue.get()
+
+    async def __aenter__(self) -> 'ChangeStream':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,150 @@
+"""
+Shared scheduler of delayed callbacks for device adapters.
+
+Timers are kept in a heap, and only the earliest one is armed in the
+event loop, so pending timers cost neither tasks nor loop handles.
+"""
+
+import heapq
+import typing
+import asyncio
+import logging
+import itertools
+
+
+class Timer:
+    """
+    Handle of a scheduled callback.
+    """
+    __slots__ = ('when', 'callback', 'args', '_scheduler', '_seq', '_active', '_waiter')
+
+    def __init__(self, scheduler: 'Scheduler', when: float, callback: typing.Callable[..., None], args: tuple):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self._scheduler = scheduler
+        self._seq = 0
+        self._active = True
+        self._waiter: typing.Optional[asyncio.Future] = None
+
+    @property
+    def active(self) -> bool:
+        """
+        Timer has neither fired nor been cancelled yet.
+        """
+        return self._active
+
+    def cancel(self) -> None:
+        if self._active:
+            self._scheduler._discard(self)
+            self._finish()
+
+    def reschedule(self, delay: float) -> None:
+        """
+        Move active timer to fire in delay seconds from now.
+        """
+        if not self._active:
+            raise RuntimeError("Cannot reschedule fired or cancelled timer")
+        self._scheduler._push(self, asyncio.get_running_loop().time() + delay)
+
+    async def wait(self) -> None:
+        """
+        Wait until the timer fires or is cancelled.
+        """
+        if not self._active:
+            return
+        if self._waiter is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+        await asyncio.shield(self._waiter)
+
+    def _finish(self) -> None:
+        self._active = False
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class Scheduler:
+    def __init__(self):
+        # (when, seq, timer), entries with seq not matching timer's one are outdated
+        self._heap: list[tuple[float, int, Timer]] = []
+        self._counter = itertools.count()
+        self._pending = 0
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._handle: typing.Optional[asyncio.TimerHandle] = None
+        self._armed_at = float('inf')
+        self.log = logging.getLogger('wb.scheduler')
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def schedule(self, delay: float, callback: typing.Callable[..., None], *args) -> Timer:
+        """
+        Call callback(*args) in delay seconds. Callback is run in the event loop
+        and must not block.
+        """
+        loop = asyncio.get_running_loop()
+        timer = Timer(self, loop.time() + delay, callback, args)
+        self._pending += 1
+        self._push(timer, timer.when)
+        return timer
+
+    def _push(self, timer: Timer, when: float) -> None:
+        timer.when = when
+        timer._seq = next(self._counter)
+        heapq.heappush(self._heap, (when, timer._seq, timer))
+        self._arm()
+
+    def _discard(self, timer: Timer) -> None:
+        self._pending -= 1
+        # heap entry becomes outdated and is skipped
+        timer._seq = -1
+        if len(self._heap) > 64 and len(self._heap) > 2 * self._pending:
+            self._heap = [entry for entry in self._heap if entry[1] == entry[2]._seq]
+            heapq.heapify(self._heap)
+
+    def _arm(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # handle of the previous loop is gone with it
+            self._loop = loop
+            self._handle = None
+            self._armed_at = float('inf')
+
+        while self._heap and self._heap[0][1] != self._heap[0][2]._seq:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return
+
+        when = self._heap[0][0]
+        if self._handle is not None and self._armed_at <= when:
+            return
+
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed_at = when
+        self._handle = loop.call_at(when, self._run)
+
+    def _run(self) -> None:
+        self._handle = None
+        self._armed_at = float('inf')
+        assert self._loop is not None
+        now = self._loop.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, timer = heapq.heappop(self._heap)
+            if seq != timer._seq:
+                continue
+
+            self._pending -= 1
+            timer._finish()
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                self.log.exception("Timer callback %r failed", timer.callback)
+
+        if self._heap:
+            self._arm()
+
+
+# single scheduler is shared by all devices of the application
+scheduler = Scheduler()
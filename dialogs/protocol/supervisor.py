@@ -0,0 +1,149 @@
+"""
+Supervision of long-running background tasks: device updaters, notifier etc.
+"""
+
+import time
+import typing
+import asyncio
+import logging
+
+from aiohttp.web import AppKey
+
+
+TaskFactory = typing.Callable[[], typing.Awaitable[None]]
+
+
+class SupervisedTask:
+    __slots__ = (
+        'name',
+        'factory',
+        'device_id',
+        'task',
+        'restarts',
+        'last_error',
+        'failed_at',
+        'started_at',
+        'finished',
+    )
+
+    def __init__(self, name: str, factory: TaskFactory, device_id: typing.Optional[str] = None):
+        self.name = name
+        self.factory = factory
+        self.device_id = device_id
+        self.task: typing.Optional[asyncio.Task] = None
+        self.restarts = 0
+        self.last_error: typing.Optional[str] = None
+        self.failed_at: typing.Optional[float] = None
+        self.started_at: typing.Optional[float] = None
+        self.finished = False
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None
+
+    def healthy(self, healthy_after: float) -> bool:
+        """
+        Task is healthy if it has never failed, or has been running
+        for healthy_after seconds since the last restart.
+        """
+        if self.failed_at is None:
+            return True
+        return self.started_at is not None and time.monotonic() - self.started_at >= healthy_after
+
+    def as_dict(self, healthy_after: float) -> dict:
+        return {
+            'device_id': self.device_id,
+            'running': self.running,
+            'finished': self.finished,
+            'healthy': self.healthy(healthy_after),
+            'restarts': self.restarts,
+            'last_error': self.last_error,
+            'seconds_since_failure': None if self.failed_at is None else time.monotonic() - self.failed_at,
+        }
+
+
+class TaskSupervisor:
+    """
+    Runs background tasks and restarts them with exponential backoff, when
+    they fail. Tasks returning normally are considered finished.
+
+    Device is unhealthy while any of its tasks is failing: waits for a restart
+    or has not been running for `healthy_after` seconds after it.
+    """
+    def __init__(
+        self,
+        backoff_initial: float = 1.,
+        backoff_max: float = 300.,
+        healthy_after: float = 60.,
+    ):
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.healthy_after = healthy_after
+        self.tasks: dict[str, SupervisedTask] = {}
+        # device id -> names of its tasks, which have failed and may be still unhealthy
+        self.failing: dict[str, set[str]] = {}
+        self.log = logging.getLogger('wb.supervisor')
+
+    def start(self, name: str, factory: TaskFactory, device_id: typing.Optional[str] = None) -> SupervisedTask:
+        """
+        Run factory() in a supervised task. Factory is called again on every restart.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task {name!r} is already supervised")
+
+        supervised = self.tasks[name] = SupervisedTask(name, factory, device_id)
+        supervised.task = asyncio.create_task(self._supervise(supervised), name=name)
+        return supervised
+
+    async def _supervise(self, supervised: SupervisedTask) -> None:
+        backoff = self.backoff_initial
+        while True:
+            supervised.started_at = time.monotonic()
+            try:
+                await supervised.factory()
+            except asyncio.CancelledError:
+                supervised.started_at = None
+                raise
+            except Exception as e:
+                ran_for = time.monotonic() - supervised.started_at
+                supervised.started_at = None
+                supervised.failed_at = time.monotonic()
+                supervised.last_error = f'{type(e).__name__}: {e}'
+                if supervised.device_id is not None:
+                    self.failing.setdefault(supervised.device_id, set()).add(supervised.name)
+                self.log.exception("Task %r failed, restarting in %.1f seconds", supervised.name, backoff)
+
+                # task that ran long enough is restarted as quick as the new one
+                if ran_for >= self.healthy_after:
+                    backoff = self.backoff_initial
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+                supervised.restarts += 1
+            else:
+                supervised.started_at = None
+                supervised.finished = True
+                return
+
+    def unhealthy(self, device_id: str) -> bool:
+        names = self.failing.get(device_id)
+        if names is None:
+            return False
+
+        # tasks recover by running for a while, so they leave the index on check
+        names.difference_update([name for name in names if self.tasks[name].healthy(self.healthy_after)])
+        if names:
+            return True
+        del self.failing[device_id]
+        return False
+
+    def status(self) -> dict[str, dict]:
+        return {name: supervised.as_dict(self.healthy_after) for name, supervised in self.tasks.items()}
+
+    async def close(self) -> None:
+        tasks = [supervised.task for supervised in self.tasks.values() if supervised.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+supervisor_key = AppKey('task_supervisor', TaskSupervisor)
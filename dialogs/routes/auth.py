@@ -1,4 +1,3 @@
-import json
 import typing
 
 import aiohttp_jinja2
@@ -10,7 +9,8 @@ from aiohttp_security import (
     check_authorized,
 )
 
-from dialogs import db, oauth
+from dialogs import codec, db, oauth
+from dialogs.protocol.notifications import notifications_key
 
 
 route = web.RouteTableDef()
@@ -79,7 +79,7 @@ async def oauthorize_get(request: web.Request):
         grant = await request.app[oauth.server_key].get_consent_grant(request, user)
     except oauth.OAuth2Error as error:
         status, body, headers = error()
-        exc = web.HTTPBadRequest(text=json.dumps(body), headers=headers)
+        exc = web.HTTPBadRequest(body=codec.dumps(body), headers=headers)
         raise exc
 
     return {
@@ -106,7 +106,28 @@ async def oauthorize_post(request: web.Request):
 @route.get('/oauth/token', name='token')
 @route.post('/oauth/token', name='token')
 async def token_post(request: web.Request) -> web.Response:
-    return await request.app[oauth.server_key].create_token_response(request)
+    response = await request.app[oauth.server_key].create_token_response(request)
+    if response.status == 200 and notifications_key in request.app:
+        notifier = request.app[notifications_key]
+        if notifier.paused and await issued_by_authorization(request, response, notifier.user_id):
+            notifier.resume()
+    return response
+
+
+async def issued_by_authorization(request: web.Request, response: web.Response, username: str) -> bool:
+    """
+    Check if the token response is a fresh authorization of the user.
+    All the tokens are revoked on unlink, so it means the skill is linked again.
+    Refresh of the token issued before unlink is not.
+    """
+    params = {**request.query, **(await request.post())}
+    if params.get('grant_type') != 'authorization_code':
+        return False
+
+    assert isinstance(response.body, bytes)
+    access_token = codec.loads(response.body).get('access_token')
+    token = db.Session().query(db.Token).filter_by(access_token=access_token).first()
+    return token is not None and token.user.username == username
 
 
 @route.post('/oauth/revoke', name='revoke')
@@ -119,4 +140,4 @@ async def revoke_post(request: web.Request) -> web.Response:
 async def me_get(request: web.Request) -> web.Response:
     token = request['oauth_token']
     user = token.user
-    return web.json_response({'id': user.id, 'username': user.username})
+    return codec.json_response({'id': user.id, 'username': user.username})
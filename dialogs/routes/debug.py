@@ -6,7 +6,11 @@ import aiohttp_jinja2
 import aiohttp_security
 from aiohttp import web
 
-from dialogs import db
+from dialogs import codec, db, oauth
+from dialogs.routes.smarthome import devices_key
+from dialogs.protocol.history import history_key
+from dialogs.protocol.scheduler import scheduler
+from dialogs.protocol.supervisor import supervisor_key
 
 
 route = web.RouteTableDef()
@@ -58,5 +62,74 @@ async def create_client_post(request: web.Request):
     db_session = db.Session()
     db_session.add(app)
     db_session.commit()
+    request.app[oauth.server_key].invalidate_clients()
 
     raise web.HTTPFound(location=request.app.router['auth'].url_for())
+
+
+@route.get('/debug/devices/versions', name='debug_device_versions')
+async def device_versions_get(request: web.Request) -> web.Response:
+    await aiohttp_security.check_authorized(request)
+
+    return codec.json_response({
+        device_id: device.state_version
+        for device_id, device in request.app[devices_key].items()
+    })
+
+
+@route.get('/debug/devices/actions', name='debug_device_actions')
+async def device_actions_get(request: web.Request) -> web.Response:
+    await aiohttp_security.check_authorized(request)
+
+    return codec.json_response({
+        device_id: {
+            'policy': device.executor.policy.value,
+            'busy': device.executor.busy,
+            **device.executor.metrics.as_dict(),
+        }
+        for device_id, device in request.app[devices_key].items()
+    })
+
+
+@route.get('/debug/tasks', name='debug_tasks')
+async def tasks_get(request: web.Request) -> web.Response:
+    await aiohttp_security.check_authorized(request)
+
+    return codec.json_response(request.app[supervisor_key].status())
+
+
+@route.get('/debug/scheduler', name='debug_scheduler')
+async def scheduler_get(request: web.Request) -> web.Response:
+    await aiohttp_security.check_authorized(request)
+
+    return codec.json_response({'pending': scheduler.pending})
+
+
+@route.get('/debug/history/{device_id}/{instance}', name='debug_history')
+async def history_get(request: web.Request) -> web.Response:
+    """
+    Property history for the last `window` seconds (all kept by default)
+    with stats, add `samples=1` to get samples themselves.
+    """
+    await aiohttp_security.check_authorized(request)
+
+    if history_key not in request.app:
+        raise web.HTTPNotFound(text="History is not enabled")
+
+    history = request.app[history_key]
+    buffer = history.get(request.match_info['device_id'], request.match_info['instance'])
+    if buffer is None:
+        raise web.HTTPNotFound(text="Unknown property")
+
+    try:
+        window = float(request.query['window']) if 'window' in request.query else None
+    except ValueError:
+        raise web.HTTPBadRequest(text="Window must be a number of seconds")
+
+    since = None if window is None else history.now() - window
+    result = buffer.stats(since)
+    if request.query.get('samples'):
+        timestamps, values = buffer.window(since)
+        result['samples'] = [(history.wall_time(timestamp), value) for timestamp, value in zip(timestamps, values)]
+
+    return codec.json_response(result)
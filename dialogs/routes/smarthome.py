@@ -1,7 +1,13 @@
+import typing
+
 from aiohttp import web
 
+from dialogs import codec
 from dialogs.oauth import resource_protected, server_key
 from dialogs.protocol.base import Device
+from dialogs.protocol.consts import DEVICE_UNREACHABLE_MESSAGE
+from dialogs.protocol.notifications import notifications_key
+from dialogs.protocol.supervisor import supervisor_key
 
 
 devices_key = web.AppKey('smarthome_devices', dict[str, Device])
@@ -9,6 +15,15 @@ devices_key = web.AppKey('smarthome_devices', dict[str, Device])
 route = web.RouteTableDef()
 
 
+async def read_json(request: web.Request) -> typing.Any:
+    """
+    Parse request JSON body only once and keep it in the request.
+    """
+    if 'json_body' not in request:
+        request['json_body'] = codec.loads(await request.read())
+    return request['json_body']
+
+
 @route.head('/v1.0/', name='ping')
 async def ping(request: web.Request):
     raise web.HTTPOk()
@@ -18,8 +33,15 @@ async def ping(request: web.Request):
 @resource_protected('smarthome')
 async def user_unlink(request: web.Request) -> web.Response:
     request_id = request.headers.get('X-Request-Id')
-    await request.app[server_key].create_endpoint_response('revocation', request)
-    return web.json_response({'request_id': request_id})
+    token = request['oauth_token']
+    request.app[server_key].revoke_user_tokens(token.user_id, token.client_id)
+
+    if notifications_key in request.app:
+        notifier = request.app[notifications_key]
+        if notifier.user_id == token.user.username:
+            notifier.pause()
+
+    return codec.json_response({'request_id': request_id})
 
 
 @route.get('/v1.0/user/devices', name='list_devices')
@@ -28,7 +50,7 @@ async def list_devices(request: web.Request) -> web.Response:
     user = request['oauth_token'].user
     request_id = request.headers.get('X-Request-Id')
     devices = request.app[devices_key]
-    return web.json_response({
+    return codec.json_response({
         'request_id': request_id,
         'payload': {
             'user_id': user.username,
@@ -45,27 +67,38 @@ async def list_devices(request: web.Request) -> web.Response:
 @resource_protected('smarthome')
 async def query_devices(request: web.Request) -> web.Response:
     request_id = request.headers.get('X-Request-Id')
-    query = await request.json()
-    response: dict = {
-        'request_id': request_id,
-        'payload': {
-            'devices': [
-            ]
-        },
-    }
+    query = await read_json(request)
     devices = request.app[devices_key]
+    supervisor = request.app.get(supervisor_key)
 
+    # device states are kept serialized by devices themselves,
+    # so the response is just glued from ready fragments.
+    fragments: list[bytes] = []
     for item in query['devices']:
         if item['id'] not in devices:
-            response['payload']['devices'].append({
+            fragments.append(codec.dumps({
                 'id': item['id'],
                 'error_code': 'DEVICE_NOT_FOUND',
                 'error_message': 'Устройство неизвестно',
-            })
+            }))
+        elif supervisor is not None and supervisor.unhealthy(item['id']):
+            fragments.append(codec.dumps({
+                'id': item['id'],
+                'error_code': 'DEVICE_UNREACHABLE',
+                'error_message': DEVICE_UNREACHABLE_MESSAGE,
+            }))
         else:
             # TODO query in parallel
-            response['payload']['devices'].append(await devices[item['id']].state())
-    return web.json_response(response)
+            fragments.append(await devices[item['id']].serialized_state())
+
+    body = b''.join((
+        b'{"request_id": ',
+        codec.dumps(request_id),
+        b', "payload": {"devices": [',
+        b', '.join(fragments),
+        b']}}',
+    ))
+    return web.Response(body=body, content_type='application/json')
 
 
 @route.post('/v1.0/user/devices/action', name='control_devices')
@@ -80,7 +113,7 @@ async def control_devices(request: web.Request) -> web.Response:
         },
     }
     devices = request.app[devices_key]
-    query = await request.json()
+    query = await read_json(request)
     for item in query['payload']['devices']:
         if item['id'] not in devices:
             response['payload']['devices'].append({
@@ -94,4 +127,4 @@ async def control_devices(request: web.Request) -> web.Response:
                 await devices[item['id']].action(item['capabilities'], item.get('custom_data'))
             )
 
-    return web.json_response(response)
+    return codec.json_response(response)
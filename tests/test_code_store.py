@@ -0,0 +1,50 @@
+from dialogs.db import AuthorizationCode
+from dialogs.oauth.code_store import MemoryCodeStore
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_code(code: str, client_id: str, clock: Clock) -> AuthorizationCode:
+    return AuthorizationCode(code=code, client_id=client_id, user_id=1, auth_time=int(clock.now))
+
+
+def test_save_get_delete():
+    clock = Clock(1000.)
+    store = MemoryCodeStore(clock=clock)
+
+    item = make_code('code', 'client', clock)
+    store.save(item)
+    assert store.get('code', 'client') is item
+    assert store.get('code', 'another') is None
+    assert store.get('unknown', 'client') is None
+
+    store.delete(item)
+    assert store.get('code', 'client') is None
+    assert len(store) == 0
+
+
+def test_expiration():
+    clock = Clock(1000.)
+    store = MemoryCodeStore(ttl=10., clock=clock)
+
+    store.save(make_code('first', 'client', clock))
+    clock.now += 5
+    store.save(make_code('second', 'client', clock))
+    assert len(store) == 2
+
+    clock.now += 6
+    assert store.get('first', 'client') is None
+    assert store.get('second', 'client') is not None
+    assert len(store) == 1
+
+    # long idle period must not require walking over every missed tick
+    clock.now += 10 ** 6
+    assert len(store) == 0
+    store.save(make_code('third', 'client', clock))
+    assert len(store) == 1
@@ -0,0 +1,45 @@
+import pytest
+
+from dialogs import codec
+
+
+@pytest.fixture(autouse=True)
+def restore_codec():
+    current = codec.codec
+    yield
+    codec.codec = current
+
+
+@pytest.mark.parametrize('name', ['stdlib', 'orjson'])
+def test_roundtrip(name):
+    if name != 'stdlib':
+        pytest.importorskip(name)
+    selected = codec.setup(name)
+    assert selected.name == name
+
+    data = {'id': 'lamp', 'value': 1.5, 'on': True, 'name': 'Лампа', 'items': [None, 1]}
+    encoded = codec.dumps(data)
+    assert isinstance(encoded, bytes)
+    assert codec.loads(encoded) == data
+    assert codec.loads(encoded.decode()) == data
+
+
+def test_auto_prefers_orjson():
+    try:
+        import orjson  # noqa: F401
+        expected = 'orjson'
+    except ImportError:
+        expected = 'stdlib'
+    assert codec.setup().name == expected
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        codec.setup('simplejson')
+
+
+def test_json_response():
+    response = codec.json_response({'request_id': 'req'}, status=201)
+    assert response.status == 201
+    assert response.content_type == 'application/json'
+    assert codec.loads(response.body) == {'request_id': 'req'}
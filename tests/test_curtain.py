@@ -0,0 +1,128 @@
+import pytest
+
+from dialogs.devices.wirenboard.curtain import WbCurtain, PositionModel
+from dialogs.protocol.capability import OnOff, Range
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeMqtt:
+    """
+    Loops control topics back to status ones, as the Wirenboard does.
+    """
+    def __init__(self):
+        self.subscriptions: dict = {}
+        self.sent: list[tuple[str, str]] = []
+
+    def subscribe(self, topic, callback):
+        self.subscriptions[topic] = callback
+
+    def send(self, topic, message):
+        self.sent.append((topic, message))
+
+
+async def deliver(client: FakeMqtt) -> None:
+    for topic, message in client.sent:
+        await client.subscriptions[topic.removesuffix('/on')](topic, message)
+    client.sent.clear()
+
+
+def test_position_model():
+    clock = Clock()
+    model = PositionModel(20., clock)
+    assert model.position() is None
+
+    # partial run tells nothing
+    model.set_opening(False)
+    model.set_running(True)
+    clock.now += 10.
+    model.set_running(False)
+    assert model.position() is None
+    assert model.travel_delay(50.) == 20.
+
+    model.set_running(True)
+    clock.now += 25.
+    assert model.position() == 0.
+    model.set_running(False)
+
+    model.set_opening(True)
+    model.set_running(True)
+    clock.now += 5.
+    assert model.position() == 25.
+    # reversed on the go
+    model.set_opening(False)
+    clock.now += 2.
+    model.set_running(False)
+    clock.now += 100.
+    assert model.position() == 15.
+    assert model.travel_delay(65.) == 10.
+    assert model.travel_delay(100.) == 20.
+
+
+async def test_curtain_positioning():
+    clock = Clock()
+    client = FakeMqtt()
+    curtain = WbCurtain(
+        client,
+        device_id='curtain',
+        name='Curtain',
+        direction_status_path='/dir',
+        motor_status_path='/motor',
+        direction_control_path='/dir/on',
+        motor_control_path='/motor/on',
+        action_time_seconds=20,
+        clock=clock,
+    )
+    scheduled = []
+    curtain.executor.schedule = lambda delay, callback, *args: scheduled.append((delay, callback, args))
+
+    async def run_action(type_id: str, instance: str, value, **kwargs) -> dict:
+        result = await curtain.action([{'type': type_id, 'state': {'instance': instance, 'value': value, **kwargs}}], None)
+        await deliver(client)
+        return result['capabilities'][0]['state']['action_result']
+
+    async def finish_movement(elapsed: float = 0.):
+        delay, callback, args = scheduled.pop()
+        clock.now += delay - elapsed
+        callback(*args)
+        await deliver(client)
+
+    state = await curtain.state()
+    assert all(cap['state']['instance'] != 'open' for cap in state['capabilities'])
+    result = await run_action(Range.type_id, 'open', 50.)
+    assert result['error_code'] == 'NOT_SUPPORTED_IN_CURRENT_MODE'
+
+    await run_action(OnOff.type_id, 'on', True)
+    assert scheduled[0][0] == 20
+    await finish_movement()
+    assert curtain.partial_open.value == 100.
+
+    await run_action(Range.type_id, 'open', 30.)
+    assert curtain.direction.value == 'low'
+    assert scheduled[0][0] == pytest.approx(14.)
+    # movement is visible on query
+    clock.now += 7.
+    state = await curtain.state()
+    assert {'type': Range.type_id, 'state': {'instance': 'open', 'value': 65.}} in state['capabilities']
+    # estimation is snapped to the precision of the capability
+    clock.now += 1.4
+    await curtain.refresh(interactive=True)
+    assert curtain.partial_open.value == 60.
+    await finish_movement(elapsed=8.4)
+    assert curtain.partial_open.value == 30.
+
+    await run_action(Range.type_id, 'open', 20., relative=True)
+    assert curtain.direction.value == 'high'
+    assert scheduled[0][0] == pytest.approx(4.)
+    await finish_movement()
+    assert curtain.partial_open.value == 50.
+    assert not curtain.motor.value
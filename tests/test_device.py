@@ -0,0 +1,236 @@
+import json
+import typing
+
+import pytest
+
+from dialogs.protocol.device import Other
+from dialogs.protocol.capability import OnOff, Toggle, ColorSetting, Mode, Range
+from dialogs.protocol.float_property import Temperature
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class LegacyToggle(Toggle):
+    async def state(self) -> typing.AsyncIterator[dict]:
+        yield {'type': self.type_id, 'state': {'instance': 'legacy', 'value': True}}
+
+
+@pytest.fixture(scope='function')
+def device() -> Other:
+    return Other(
+        device_id='device1',
+        device_name='Test',
+        capabilities=[
+            OnOff(initial_value=True, retrievable=True, reportable=True),
+            LegacyToggle(instance=Toggle.Instance.Pause, retrievable=True),
+        ],
+        properties=[
+            Temperature(unit=Temperature.Unit.Celsius, initial_value=20., reportable=True),
+        ],
+    )
+
+
+async def test_render_state(device: Other):
+    onoff, legacy = sorted(device.capabilities(), key=lambda cap: cap.type_id)
+    assert onoff.render_state() == {'type': onoff.type_id, 'state': {'instance': 'on', 'value': True}}
+    assert [state async for state in onoff.state()] == [onoff.render_state()]
+    assert not onoff.async_state_only
+    assert legacy.async_state_only
+
+    state = await device.state()
+    assert sorted(state['capabilities'], key=lambda item: item['type']) == [
+        {'type': 'devices.capabilities.on_off', 'state': {'instance': 'on', 'value': True}},
+        {'type': 'devices.capabilities.toggle', 'state': {'instance': 'legacy', 'value': True}},
+    ]
+    assert state['properties'] == [
+        {'type': 'devices.properties.float', 'state': {'instance': 'temperature', 'value': 20.}},
+    ]
+
+
+async def test_report(device: Other):
+    report = await device.report({})
+    assert report['capabilities'] == [
+        ({'type': 'devices.capabilities.on_off', 'state': {'instance': 'on', 'value': True}}, True),
+    ]
+    assert report['properties'] == [
+        ({'type': 'devices.properties.float', 'state': {'instance': 'temperature', 'value': 20.}}, True),
+    ]
+
+    previous = {
+        'capabilities': [state for state, _ in report['capabilities']],
+        'properties': [state for state, _ in report['properties']],
+    }
+    report = await device.report(previous)
+    assert [changed for _, changed in report['capabilities'] + report['properties']] == [False, False]
+
+
+async def test_slots():
+    device = Other(device_id='device1', capabilities=[OnOff()], properties=[Temperature(unit=Temperature.Unit.Celsius)])
+    assert not hasattr(device, '__dict__')
+    assert not any(hasattr(item, '__dict__') for item in list(device.capabilities()) + list(device.properties()))
+
+    class Adapter(Other):
+        def __init__(self):
+            self.client = 'mqtt'
+            self.onoff = OnOff(retrievable=True, initial_value=False)
+            super().__init__(device_id='adapter', capabilities=[self.onoff])
+
+    adapter = Adapter()
+    assert adapter.client == 'mqtt'
+    assert (await adapter.state())['capabilities'] == [adapter.onoff.render_state()]
+
+
+async def test_views():
+    onoff = OnOff(retrievable=True, reportable=True)
+    toggle = Toggle(instance=Toggle.Instance.Pause, retrievable=True)
+    color = ColorSetting(
+        color_model=ColorSetting.HSV(),
+        temperature=ColorSetting.Temperature(),
+        reportable=True,
+    )
+    device = Other(device_id='device1', capabilities=[onoff, toggle, color])
+
+    assert device.capabilities() == (onoff, toggle, color)
+    assert device.capability_views.retrievable == (onoff, toggle)
+    assert device.capability_views.reportable == (onoff, color)
+    assert device.capability_views.retrievable_reportable == (onoff,)
+    assert device.properties() == ()
+
+
+async def test_serialized_state(device: Other):
+    serialized = await device.serialized_state()
+    assert json.loads(serialized) == await device.state()
+    # legacy capability makes state uncacheable
+    assert await device.serialized_state() is not serialized
+
+    onoff = OnOff(initial_value=True, retrievable=True)
+    color = ColorSetting(temperature=ColorSetting.Temperature(min=2700, max=6500, value=4500), retrievable=True)
+    device = Other(device_id='device2', capabilities=[onoff, color])
+
+    serialized = await device.serialized_state()
+    assert await device.serialized_state() is serialized
+
+    onoff.value = True
+    assert await device.serialized_state() is serialized
+
+    onoff.value = False
+    serialized = await device.serialized_state()
+    assert json.loads(serialized)['capabilities'][0]['state']['value'] is False
+
+    color.assign(5000)
+    serialized = await device.serialized_state()
+    assert json.loads(serialized)['capabilities'][1]['state']['value'] == 5000
+
+
+async def test_state_version(device: Other):
+    onoff = next(cap for cap in device.capabilities() if isinstance(cap, OnOff))
+    temperature = device.properties()[0]
+    assert device.state_version == 0
+
+    onoff.value = True
+    assert not device.changed_since(0)
+
+    onoff.value = False
+    temperature.value = 21.
+    assert device.state_version == 2
+    assert device.changed_since(1)
+    assert not device.changed_since(2)
+
+
+async def test_action_validation():
+    changed = []
+
+    async def change_value(capability, instance, value, /, **kwargs):
+        changed.append((instance, value, kwargs))
+        return capability.type_id, instance
+
+    device = Other(
+        device_id='device3',
+        capabilities=[
+            OnOff(change_value=change_value),
+            Range(instance=Range.Instance.Brightness, min_value=1., max_value=100., change_value=change_value),
+            Mode(instance=Mode.Instance.FanSpeed, modes=[Mode.WorkMode.Low, Mode.WorkMode.High], change_value=change_value),
+            ColorSetting(color_model=ColorSetting.HSV(), change_value=change_value),
+        ],
+    )
+
+    def action(type_id: str, instance: str, value, **kwargs) -> dict:
+        return {'type': f'devices.capabilities.{type_id}', 'state': {'instance': instance, 'value': value, **kwargs}}
+
+    result = await device.action([
+        action('on_off', 'on', 'yes'),
+        action('range', 'brightness', 0.),
+        action('range', 'brightness', 'max'),
+        action('range', 'brightness', float('nan')),
+        action('mode', 'fan_speed', 'turbo'),
+        action('color_setting', 'hsv', {'h': 400, 's': 0, 'v': 0}),
+        action('color_setting', 'hsv', 5),
+        {'type': 'devices.capabilities.on_off'},
+        'garbage',
+    ], None)
+
+    errors = [
+        (cap['state']['instance'], cap['state']['action_result']['error_code'])
+        for cap in result['capabilities']
+    ]
+    assert errors == [
+        ('on', 'INVALID_VALUE'),
+        ('brightness', 'INVALID_VALUE'),
+        ('brightness', 'INVALID_VALUE'),
+        ('brightness', 'INVALID_VALUE'),
+        ('fan_speed', 'INVALID_VALUE'),
+        ('hsv', 'INVALID_VALUE'),
+        ('hsv', 'INVALID_VALUE'),
+        ('', 'INVALID_ACTION'),
+        ('', 'INVALID_ACTION'),
+    ]
+    assert changed == []
+
+    result = await device.action([
+        action('on_off', 'on', True),
+        action('range', 'brightness', -50., relative=True),
+        action('mode', 'fan_speed', 'high'),
+        action('color_setting', 'hsv', {'h': 120, 's': 50, 'v': 50}),
+    ], None)
+    assert all(cap['state']['action_result']['status'] == 'DONE' for cap in result['capabilities'])
+    assert sorted(changed) == [
+        ('brightness', -50., {'relative': True}),
+        ('fan_speed', 'high', {}),
+        ('hsv', {'h': 120, 's': 50, 'v': 50}, {}),
+        ('on', True, {}),
+    ]
+
+
+async def test_staleness():
+    onoff = OnOff(initial_value=True, retrievable=True)
+    temperature = Temperature(unit=Temperature.Unit.Celsius, initial_value=20.)
+    device = Other(device_id='device3', capabilities=[onoff], properties=[temperature])
+    assert device.stale_after is None
+    assert device.is_fresh()
+
+    device.stale_after = 60.
+    serialized = await device.serialized_state()
+    assert 'error_code' not in json.loads(serialized)
+
+    # pretend values were received two minutes ago, resetting cached deadline
+    onoff.updated_at -= 120.
+    device.stale_after = 60.
+    # capabilities are not tracked by default
+    assert device.is_fresh()
+
+    temperature.updated_at -= 120.
+    device.stale_after = 60.
+    assert not device.is_fresh()
+    state = await device.state()
+    assert state == {
+        'id': 'device3',
+        'error_code': 'DEVICE_UNREACHABLE',
+        'error_message': 'Устройство недоступно',
+    }
+    assert json.loads(await device.serialized_state()) == state
+
+    # the same value received again makes device fresh
+    temperature.value = 20.
+    assert device.is_fresh()
+    assert await device.serialized_state() is serialized
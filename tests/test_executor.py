@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from dialogs.protocol.device import Other
+from dialogs.protocol.capability import OnOff, Toggle
+from dialogs.protocol.executor import ActionPolicy
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_device(policy: ActionPolicy, log: list) -> Other:
+    async def change_value(capability, instance, value, /, **kwargs):
+        log.append(('start', instance, value))
+        await asyncio.sleep(0.05)
+        log.append(('end', instance, value))
+        return capability.type_id, instance
+
+    device = Other(
+        device_id='device',
+        capabilities=[
+            OnOff(change_value=change_value),
+            Toggle(instance=Toggle.Instance.Pause, change_value=change_value),
+        ],
+    )
+    device.executor.policy = policy
+    return device
+
+
+def action(value: bool) -> list[dict]:
+    return [{'type': OnOff.type_id, 'state': {'instance': 'on', 'value': value}}]
+
+
+def statuses(result: dict) -> list[tuple[str, str | None]]:
+    return [
+        (cap['state']['action_result']['status'], cap['state']['action_result'].get('error_code'))
+        for cap in result['capabilities']
+    ]
+
+
+async def test_concurrent():
+    log: list = []
+    device = make_device(ActionPolicy.Concurrent, log)
+    await asyncio.gather(device.action(action(True), None), device.action(action(False), None))
+    assert [event for event, _, _ in log] == ['start', 'start', 'end', 'end']
+
+
+async def test_serialize():
+    log: list = []
+    device = make_device(ActionPolicy.Serialize, log)
+    first, second = await asyncio.gather(device.action(action(True), None), device.action(action(False), None))
+    assert log == [('start', 'on', True), ('end', 'on', True), ('start', 'on', False), ('end', 'on', False)]
+    assert statuses(first) == statuses(second) == [('DONE', None)]
+    assert device.executor.metrics.wait_time > 0
+
+
+async def test_latest_wins():
+    log: list = []
+    device = make_device(ActionPolicy.LatestWins, log)
+
+    moved = asyncio.Event()
+
+    async def movement():
+        await asyncio.sleep(10)
+        moved.set()
+
+    device.executor.start_background(movement())
+    first = asyncio.create_task(device.action(action(True), None))
+    await asyncio.sleep(0.01)
+    assert device.executor.busy
+
+    second = await device.action(action(False), None)
+    assert statuses(await first) == [('ERROR', 'DEVICE_BUSY')]
+    assert statuses(second) == [('DONE', None)]
+    assert not moved.is_set()
+    assert log == [('start', 'on', True), ('start', 'on', False), ('end', 'on', False)]
+    assert device.executor.metrics.cancelled == 1
+
+
+async def test_reject_busy():
+    log: list = []
+    device = make_device(ActionPolicy.RejectBusy, log)
+
+    both = [
+        {'type': OnOff.type_id, 'state': {'instance': 'on', 'value': True}},
+        {'type': Toggle.type_id, 'state': {'instance': 'pause', 'value': True}},
+    ]
+    first = asyncio.create_task(device.action(both, None))
+    await asyncio.sleep(0.01)
+    rejected = await device.action(action(False), None)
+    assert statuses(rejected) == [('ERROR', 'DEVICE_BUSY')]
+    # changes of the same request don't block each other
+    assert statuses(await first) == [('DONE', None), ('DONE', None)]
+
+    assert statuses(await device.action(action(False), None)) == [('DONE', None)]
+    metrics = device.executor.metrics.as_dict()
+    assert metrics['requests'] == 3
+    assert metrics['rejected'] == 1
+    assert metrics['done'] == 3
+    assert metrics['max_run_time'] >= 0.05
@@ -0,0 +1,70 @@
+import pytest
+
+from dialogs.protocol.device import Sensor
+from dialogs.protocol.event_property import Open
+from dialogs.protocol.float_property import Temperature, Humidity
+from dialogs.protocol.history import RingBuffer, History, percentile
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(4)
+    assert len(buffer) == 0
+    assert buffer.stats() == {'count': 0}
+
+    for idx in range(6):
+        buffer.append(100. + idx, float(idx * 10))
+
+    assert len(buffer) == 4
+    assert buffer.nbytes == 64
+    timestamps, values = buffer.ordered()
+    assert list(timestamps) == [102., 103., 104., 105.]
+    assert list(values) == [20., 30., 40., 50.]
+
+    timestamps, values = buffer.window(103., 104.)
+    assert list(values) == [30., 40.]
+
+    assert buffer.stats(since=103.) == {'count': 3, 'min': 30., 'max': 50., 'mean': 40., 'p50': 40., 'p95': 49.}
+
+    # window across the wrap point of the buffer
+    buffer.append(106., 60.)
+    assert list(buffer.window(104., 106.)[1]) == [40., 50., 60.]
+    assert list(buffer.window(since=107.)[1]) == []
+    assert list(buffer.window(until=102.5)[1]) == []
+    assert list(buffer.ordered()[0]) == [103., 104., 105., 106.]
+
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+
+
+def test_percentile():
+    assert percentile([1., 2., 3., 4.], 0) == 1.
+    assert percentile([1., 2., 3., 4.], 100) == 4.
+    assert percentile([1., 2., 3., 4.], 50) == 2.5
+    assert percentile([5.], 95) == 5.
+    with pytest.raises(ValueError):
+        percentile([1.], 101)
+
+
+def test_history():
+    temperature = Temperature(unit=Temperature.Unit.Celsius, initial_value=20.)
+    humidity = Humidity(initial_value=None)
+    door = Open(reportable=True)
+    device = Sensor(device_id='sensor', capabilities=[], properties=[temperature, humidity, door])
+
+    history = History(memory_budget=64)
+    history.track(device)
+    assert history.capacity == 4
+    assert history.get('sensor', door.instance) is None
+    assert history.nbytes == 128
+
+    temperature.value = 21.
+    temperature.value = 21.
+    temperature.value = 22.5
+    buffer = history.get('sensor', 'temperature')
+    assert buffer is not None
+    # initial value is recorded too
+    timestamps, values = buffer.window()
+    assert list(values) == [20., 21., 22.5]
+    assert list(timestamps) == sorted(timestamps)
+    assert timestamps[-1] <= history.now()
+    assert len(history.get('sensor', 'humidity')) == 0
@@ -0,0 +1,130 @@
+import os
+import asyncio
+import threading
+
+import pytest
+
+from dialogs.protocol.device import Sensor
+from dialogs.protocol.float_property import Temperature, Humidity
+from dialogs.protocol.history_store import HistoryStore, HistoryReader, RECORD
+
+
+@pytest.mark.asyncio
+async def test_store_and_scan(tmp_path):
+    store = HistoryStore(str(tmp_path), segment_records=4, rotate_interval=100., retention=250.)
+
+    temperature = Temperature(unit=Temperature.Unit.Celsius, initial_value=20.)
+    humidity = Humidity(initial_value=50.)
+    store.track(Sensor(device_id='sensor', capabilities=[], properties=[temperature, humidity]))
+
+    for idx in range(6):
+        store.append(1000. + idx, 'sensor', 'temperature', 20. + idx)
+    store.append(1006., 'sensor', 'humidity', 55.)
+    assert store.pending == 7
+    await store.flush()
+    assert store.pending == 0
+
+    # 4 records in the first segment, the rest in the second one
+    segments = sorted(name for name in os.listdir(tmp_path) if name.endswith('.seg'))
+    assert len(segments) == 2
+    assert os.path.getsize(tmp_path / segments[0]) == 24 + 4 * RECORD.size
+
+    reader = HistoryReader(str(tmp_path))
+    assert [sample[3] for sample in reader.scan(1002., 1005.)] == [22., 23., 24.]
+    assert list(reader.scan(1000., 2000., instance='humidity')) == [(1006., 'sensor', 'humidity', 55.)]
+    assert list(reader.scan(1000., 2000., device_id='unknown')) == []
+
+    # old segments are rotated away
+    store.append(1200., 'sensor', 'temperature', 30.)
+    await store.flush()
+    store.append(1400., 'sensor', 'temperature', 31.)
+    store.close()
+
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.seg')]) == 3
+    samples = list(HistoryReader(str(tmp_path)).scan(0., 2000., instance='temperature'))
+    assert [sample[3] for sample in samples] == [24., 25., 30., 31.]
+
+    # observed changes are buffered
+    humidity.value = 60.
+    assert store.pending == 1
+
+
+@pytest.mark.asyncio
+async def test_retention(tmp_path):
+    store = HistoryStore(str(tmp_path), segment_records=4, rotate_interval=100., retention=200.)
+    store.append(1000., 'sensor', 'temperature', 20.)
+    store.close()
+
+    # every start opens a new segment, which doesn't expire recent ones
+    for idx in range(4):
+        store = HistoryStore(str(tmp_path), segment_records=4, rotate_interval=100., retention=200.)
+        store.append(1100. + idx, 'sensor', 'temperature', 21. + idx)
+        store.close()
+    samples = list(HistoryReader(str(tmp_path)).scan(0., 2000.))
+    assert [sample[3] for sample in samples] == [20., 21., 22., 23., 24.]
+
+    store = HistoryStore(str(tmp_path), segment_records=4, rotate_interval=100., retention=200.)
+    store.append(1302., 'sensor', 'temperature', 25.)
+    store.close()
+    samples = list(HistoryReader(str(tmp_path)).scan(0., 2000.))
+    assert [sample[3] for sample in samples] == [23., 24., 25.]
+
+
+@pytest.mark.asyncio
+async def test_flush_failure(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path), segment_records=2, rotate_interval=100., retention=200.)
+    for idx in range(3):
+        store.append(1000. + idx, 'sensor', 'temperature', 20. + idx)
+
+    current_segment = store._current_segment
+    calls = []
+
+    def failing_segment(first_timestamp):
+        calls.append(first_timestamp)
+        if len(calls) == 2:
+            raise OSError("No space left on device")
+        return current_segment(first_timestamp)
+
+    monkeypatch.setattr(store, '_current_segment', failing_segment)
+    with pytest.raises(OSError):
+        await store.flush()
+
+    # first segment is written, the rest is kept until the next flush
+    store.append(1003., 'sensor', 'temperature', 23.)
+    assert store.pending == 2
+    await store.flush()
+    store.close()
+
+    samples = list(HistoryReader(str(tmp_path)).scan(0., 2000.))
+    assert [sample[3] for sample in samples] == [20., 21., 22., 23.]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_flush(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path), segment_records=4, rotate_interval=100., retention=200.)
+    for idx in range(3):
+        store.append(1000. + idx, 'sensor', 'temperature', 20. + idx)
+
+    write = store.write
+    started, release = threading.Event(), threading.Event()
+
+    def slow_write(data, index):
+        started.set()
+        release.wait()
+        write(data, index)
+
+    monkeypatch.setattr(store, 'write', slow_write)
+    flush = asyncio.create_task(store.flush())
+    while not started.is_set():
+        await asyncio.sleep(0.01)
+
+    # cancelled flush waits for the write in progress, so it's not repeated by close()
+    flush.cancel()
+    asyncio.get_running_loop().call_later(0.05, release.set)
+    with pytest.raises(asyncio.CancelledError):
+        await flush
+    assert store.pending == 0
+    store.close()
+
+    samples = list(HistoryReader(str(tmp_path)).scan(0., 2000.))
+    assert [sample[3] for sample in samples] == [20., 21., 22.]
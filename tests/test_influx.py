@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from aiohttp import web, ClientSession
+from aiohttp.test_utils import TestServer
+
+from dialogs.protocol.device import Light
+from dialogs.protocol.capability import OnOff, Range, Mode, ColorSetting
+from dialogs.protocol.influx import InfluxExporter, format_fields
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeSink:
+    """
+    Line protocol endpoint, that fails while `down` is set,
+    and rejects batches with malformed lines.
+    """
+    def __init__(self):
+        self.batches: list[list[str]] = []
+        self.queries: list[dict] = []
+        self.down = False
+        self.received = asyncio.Event()
+
+    async def write(self, request: web.Request) -> web.Response:
+        if self.down:
+            return web.Response(status=503, text='down')
+        if 'malformed' in await request.text():
+            return web.Response(status=400, text='unable to parse')
+        self.queries.append(dict(request.query))
+        self.batches.append((await request.text()).split('\n'))
+        self.received.set()
+        return web.Response(status=204)
+
+
+@pytest.fixture
+async def sink():
+    sink = FakeSink()
+    app = web.Application()
+    app.router.add_post('/write', sink.write)
+    server = TestServer(app)
+    await server.start_server()
+    sink.url = str(server.make_url('/'))
+    try:
+        yield sink
+    finally:
+        await server.close()
+
+
+def test_format_fields():
+    assert format_fields(True) == 'on=true'
+    assert format_fields(42) == 'value=42.0'
+    assert format_fields(Mode.WorkMode.High) == 'text="high"'
+    assert format_fields('say "hi"') == 'text="say \\"hi\\""'
+    assert format_fields({'h': 1, 's': 2, 'v': 3}) == 'h=1.0,s=2.0,v=3.0'
+    assert format_fields(None) is None
+    assert format_fields(float('nan')) is None
+    assert format_fields(float('-inf')) is None
+    assert format_fields({'h': 1, 's': float('inf')}) == 'h=1.0'
+    assert format_fields(ColorSetting.HSV(h=1, s=2, v=3)) == 'h=1.0,s=2.0,v=3.0'
+    assert format_fields(ColorSetting.RGB(0xff0000)) == 'value=16711680.0'
+    assert format_fields(ColorSetting.Temperature(min=2700, max=6500, value=4000)) == 'value=4000.0'
+    assert format_fields(ColorSetting.Temperature(min=2700, max=6500)) is None
+
+
+async def test_export(sink):
+    onoff = OnOff(initial_value=False, retrievable=True)
+    level = Range(instance=Range.Instance.Brightness, retrievable=True)
+    device = Light(device_id='my light', capabilities=[onoff, level])
+
+    exporter = InfluxExporter(
+        ClientSession(),
+        url=sink.url,
+        batch_size=2,
+        flush_interval=0.05,
+        backoff_initial=0.01,
+    )
+    exporter.track(device)
+    task = asyncio.create_task(exporter.export_loop())
+    try:
+        onoff.value = True
+        level.value = 50.
+        await asyncio.wait_for(sink.received.wait(), 1.)
+        assert sink.queries == [{'db': 'smarthome', 'precision': 'ns'}]
+        lines = sink.batches[0]
+        assert lines[0].startswith('smarthome,device=my\\ light,type=on_off,instance=on on=true ')
+        assert lines[1].startswith('smarthome,device=my\\ light,type=range,instance=brightness value=50.0 ')
+
+        # sink is down: lines are kept and sent once it's back
+        sink.down = True
+        sink.received.clear()
+        level.value = 60.
+        await asyncio.sleep(0.1)
+        assert exporter.lines and exporter.sent == 2
+        sink.down = False
+        await asyncio.wait_for(sink.received.wait(), 1.)
+        assert ' value=60.0 ' in sink.batches[1][0]
+        assert exporter.lines == []
+    finally:
+        task.cancel()
+        await exporter.close()
+
+
+async def test_buffer_limit():
+    exporter = InfluxExporter(session=None, batch_size=10, max_buffer=3)
+    for idx in range(5):
+        exporter.add(f'line{idx}')
+    assert exporter.lines == ['line2', 'line3', 'line4']
+    assert exporter.dropped == 2
+
+
+async def test_close_flushes(sink):
+    exporter = InfluxExporter(ClientSession(), url=sink.url, batch_size=2)
+    for idx in range(3):
+        exporter.add(f'smarthome value={idx}.0')
+    await exporter.close()
+    assert sink.batches == [['smarthome value=0.0', 'smarthome value=1.0'], ['smarthome value=2.0']]
+    assert exporter.lines == []
+
+
+async def test_rejected_batch(sink):
+    exporter = InfluxExporter(ClientSession(), url=sink.url, batch_size=1)
+    exporter.add('smarthome malformed')
+    exporter.add('smarthome value=1.0')
+
+    # rejected batch is dropped and does not block the next ones
+    assert await exporter.flush()
+    assert exporter.dropped == 1
+    assert await exporter.flush()
+    assert sink.batches == [['smarthome value=1.0']]
+
+    sink.down = True
+    exporter.add('smarthome value=2.0')
+    assert not await exporter.flush()
+    assert exporter.lines == ['smarthome value=2.0']
+    await exporter.close()
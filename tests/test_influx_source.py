@@ -0,0 +1,188 @@
+import json
+import asyncio
+
+import pytest
+from aiohttp import web, ClientSession
+from aiohttp.test_utils import TestServer
+
+from dialogs.app import make_app
+from dialogs.routes.smarthome import devices_key
+from dialogs.devices.influx_source import InfluxSource, InfluxSources, influx_sources_key
+from dialogs.devices.arduino.freezer2 import FreezerWatcher
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeInflux:
+    def __init__(self):
+        self.queries: list[dict] = []
+        self.columns = ['time', 'temperature']
+        self.values = None
+        self.delay = 0.
+
+    async def query(self, request: web.Request) -> web.Response:
+        self.queries.append(dict(request.query))
+        await asyncio.sleep(self.delay)
+        results = []
+        for statement in request.query['q'].split('; '):
+            if '"missing"' in statement:
+                results.append({'statement_id': len(results)})
+                continue
+            measurement = statement.split('"')[1]
+            results.append({'statement_id': len(results), 'series': [{
+                'name': measurement,
+                'columns': self.columns,
+                'values': [self.values or [1, len(measurement)]],
+            }]})
+        return web.json_response({'results': results})
+
+
+@pytest.fixture
+async def influx():
+    influx = FakeInflux()
+    app = web.Application()
+    app.router.add_get('/query', influx.query)
+    server = TestServer(app)
+    await server.start_server()
+    influx.url = str(server.make_url('/'))
+    try:
+        yield influx
+    finally:
+        await server.close()
+
+
+async def test_poll(influx):
+    source = InfluxSource(influx.url)
+    first, second, other = [], [], []
+    source.subscribe('freezer', 'freezer', first.append)
+    source.subscribe('freezer', 'freezer', second.append)
+    source.subscribe('freezer', 'cellar', other.append)
+    source.subscribe('freezer', 'missing', other.append)
+
+    async with ClientSession() as session:
+        await source.poll(session)
+
+    assert len(influx.queries) == 1
+    assert influx.queries[0]['db'] == 'freezer'
+    assert influx.queries[0]['q'].count('select') == 3
+    assert first == second == [{'time': 1, 'temperature': 7}]
+    assert other == [{'time': 1, 'temperature': 6}]
+
+
+async def test_shared(influx):
+    sources = InfluxSources()
+    assert sources.get('http://influx:8086') is sources.get('http://influx:8086')
+    assert sources.get('http://influx:8086') is not sources.get('http://other:8086')
+    assert sources.get('http://influx:8086') is not InfluxSources().get('http://influx:8086')
+
+    # background refresh and sessions are stopped on close
+    source = sources.get(influx.url)
+    source.subscribe('freezer', 'freezer', lambda row: None)
+    await source.fetch(max_age=0.)
+    runner = asyncio.create_task(source.run())
+    await asyncio.sleep(0)
+    runner.cancel()
+    await sources.close()
+    assert source._task.done()
+    assert source._session.closed
+
+
+async def test_fetch(influx):
+    source = InfluxSource(influx.url)
+    rows = []
+    source.subscribe('freezer', 'freezer', rows.append)
+
+    # concurrent fetches share a single request
+    await asyncio.gather(*(source.fetch(max_age=30.) for _ in range(5)))
+    assert len(influx.queries) == 1
+    assert len(rows) == 1
+
+    await source.fetch(max_age=30.)
+    assert len(influx.queries) == 1
+
+    await source.fetch(max_age=0.)
+    assert len(influx.queries) == 2
+    await source._session.close()
+
+
+async def test_slow_poll(influx):
+    source = InfluxSource(influx.url, query_timeout=0.05)
+    rows = []
+    source.subscribe('freezer', 'freezer', rows.append)
+    influx.delay = 0.2
+
+    # query does not wait for the slow poll
+    await asyncio.wait_for(source.fetch(max_age=0.), 0.15)
+    assert rows == []
+
+    # background report waits, and joins the poll in flight
+    await source.fetch(max_age=0., interactive=False)
+    assert len(rows) == 1
+    assert len(influx.queries) == 1
+    await source.close()
+
+
+async def test_background_refresh(influx):
+    source = InfluxSource(influx.url, poll_interval=0.02, max_interval=0.16, idle_after=0.1)
+    source.subscribe('freezer', 'freezer', lambda row: None)
+
+    await source.fetch(max_age=0.)
+    runner = asyncio.create_task(source.run())
+    await asyncio.sleep(0.1)
+    active = len(influx.queries)
+    assert active >= 3
+
+    # nobody queries: interval grows
+    await asyncio.sleep(0.5)
+    assert source.idle
+    assert len(influx.queries) - active < 10
+
+    # query wakes refresh up
+    polls = len(influx.queries)
+    await source.fetch(max_age=60.)
+    await asyncio.sleep(0.01)
+    assert len(influx.queries) == polls + 1
+
+    # cancelled runner does not stop the shared refresh
+    runner.cancel()
+    await asyncio.sleep(0)
+    assert not source._task.done()
+    source._task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await source._task
+    assert source._session.closed
+
+
+async def test_pull_based_device(influx):
+    influx.columns = ['time', 'temperature_bme', 'humidity_bme', 'cooler']
+    influx.values = [1, -18.5, 40., 1]
+    sources = InfluxSources()
+    device = FreezerWatcher(sources, 'freezer', 'Freezer', influx_url=influx.url, max_age=30.)
+
+    state = json.loads(await device.serialized_state())
+    assert {'type': 'devices.properties.float', 'state': {'instance': 'temperature', 'value': -18.5}} in state['properties']
+    assert len(influx.queries) == 1
+
+    await device.serialized_state()
+    await device.report({})
+    assert len(influx.queries) == 1
+
+    # values are fetched once per query
+    device.max_age = 0.
+    await device.serialized_state()
+    assert len(influx.queries) == 2
+    await sources.close()
+
+
+async def test_app_sources():
+    app = await make_app({'devices': {
+        'freezer': {'_class': 'Freezer', 'name': 'Freezer', 'influx_url': 'http://influx:8086'},
+        'watcher': {'_class': 'FreezerWatcher', 'name': 'Watcher', 'influx_url': 'http://influx:8086'},
+    }}, ':memory:')
+
+    # sources are injected without any extra config
+    devices = app[devices_key]
+    assert devices['freezer'].source is devices['watcher'].source
+    assert app[influx_sources_key].sources == {'http://influx:8086': devices['freezer'].source}
+    await app[influx_sources_key].close()
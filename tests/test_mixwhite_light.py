@@ -0,0 +1,76 @@
+import pytest
+
+from dialogs.devices.wirenboard.mixwhite_light import ChannelTable, WbMixwhiteLight
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def reference_channels(temperature: int, brightness: float) -> tuple[int, int]:
+    # straightforward calculation from the linear mixing model
+    def value(ratio: float) -> int:
+        return int(ratio * 255)
+
+    if 6500 - temperature < temperature - 2700:
+        return value(brightness), value(brightness * (6500 - temperature) / (temperature - 2700))
+    return value(brightness * (temperature - 2700) / (6500 - temperature)), value(brightness)
+
+
+def test_channel_table():
+    exact = ChannelTable(2700, 6500, 0, 255, step=1)
+    for temperature in range(2700, 6501, 13):
+        for brightness in (0., 0.05, 0.5, 1.):
+            assert exact.channels(temperature, brightness) == reference_channels(temperature, brightness)
+
+    nearest = ChannelTable(2700, 6500, 0, 255, step=100)
+    interpolated = ChannelTable(2700, 6500, 0, 255, step=100, interpolate=True)
+    assert len(nearest.temperatures) == 39
+    assert nearest.channels(2749, 1.) == exact.channels(2700, 1.)
+    assert nearest.channels(6500, 1.) == interpolated.channels(6500, 1.) == (255, 0)
+    cold, warm = exact.shares(3333)
+    assert interpolated.shares(3333) == pytest.approx((cold, warm), abs=0.01)
+    assert nearest.shares(3333) != pytest.approx((cold, warm), abs=0.01)
+
+    assert exact.ratio(-10) == 0.
+    assert exact.ratio(51) == 0.2
+    assert exact.ratio(300) == 1.
+    assert exact.temperature(1., 0.) == 2700
+    assert exact.temperature(1., 1.) == 4600
+
+    with pytest.raises(ValueError):
+        ChannelTable(2700, 6500, 0, 255, step=0)
+
+
+class FakeMqtt:
+    def __init__(self):
+        self.subscriptions: dict = {}
+
+    def subscribe(self, topic, callback):
+        self.subscriptions[topic] = callback
+
+    def send(self, topic, message):
+        pass
+
+
+async def test_status_round_trip():
+    light = WbMixwhiteLight(
+        FakeMqtt(),
+        device_id='light',
+        name='Light',
+        warm_status_path='/warm',
+        warm_control_path='/warm/on',
+        cold_status_path='/cold',
+        cold_control_path='/cold/on',
+        warm_temperature=2700,
+        cold_temperature=6500,
+        range_low=0,
+        range_high=255,
+        temperature_step=1,
+    )
+
+    cold, warm = light.get_cold_and_warm_channels(5000, 0.6)
+    await light.on_data_changed('/cold', str(cold))
+    await light.on_data_changed('/warm', str(warm))
+    assert light.onoff.value
+    assert light.level.value == pytest.approx(60., abs=0.5)
+    assert abs(light.temperature.value.serialize() - 5000) <= 10
@@ -0,0 +1,65 @@
+import pytest
+
+from dialogs.protocol.capability import OnOff, ColorSetting
+from dialogs.protocol.float_property import Temperature
+from dialogs.protocol.observers import ChangeStream, ValueChange
+
+
+def test_subscribe():
+    onoff = OnOff(initial_value=False, retrievable=True)
+    changes: list[ValueChange] = []
+    onoff.subscribe(changes.append)
+
+    onoff.value = True
+    onoff.value = True
+    assert len(changes) == 1
+    assert changes[0].item is onoff
+    assert (changes[0].old, changes[0].new) == (False, True)
+    assert changes[0].timestamp > 0
+
+    onoff.unsubscribe(changes.append)
+    onoff.value = False
+    assert len(changes) == 1
+
+
+def test_failing_observer():
+    prop = Temperature(unit=Temperature.Unit.Celsius, initial_value=20.)
+    changes: list[ValueChange] = []
+
+    def fail(change: ValueChange) -> None:
+        raise RuntimeError("boom")
+
+    prop.subscribe(fail)
+    prop.subscribe(changes.append)
+    prop.value = 21.
+    assert prop.value == 21.
+    assert [(change.old, change.new) for change in changes] == [(20., 21.)]
+
+
+def test_color_setting_in_place():
+    cap = ColorSetting(temperature=ColorSetting.Temperature(min=2700, max=6500, value=4500), retrievable=True)
+    changes: list[ValueChange] = []
+    cap.subscribe(changes.append)
+
+    cap.assign(4500)
+    assert changes == []
+    cap.assign(3000)
+    assert [(change.old, change.new) for change in changes] == [(4500, 3000)]
+
+
+@pytest.mark.asyncio
+async def test_change_stream():
+    onoff = OnOff(initial_value=False, retrievable=True)
+    prop = Temperature(unit=Temperature.Unit.Celsius, initial_value=20.)
+
+    async with ChangeStream([onoff, prop], maxsize=2) as stream:
+        onoff.value = True
+        prop.value = 22.
+        prop.value = 23.
+        assert stream.dropped == 1
+        assert (await stream.get()).new == 22.
+        change = await anext(stream)
+        assert (change.item, change.old, change.new) == (prop, 22., 23.)
+
+    assert onoff._observers is None
+    assert prop._observers is None
@@ -1,7 +1,10 @@
+import asyncio
+
 import pytest
 
 from dialogs.protocol.device import Other
 from dialogs.protocol.capability import Range
+from dialogs.protocol.exceptions import ActionException
 
 
 pytestmark = pytest.mark.asyncio
@@ -176,3 +179,89 @@ async def test_action(retrievable_device: Other):
     }
     assert result == expected
     assert next(iter(retrievable_device.capabilities())).value == 65.
+
+
+async def test_coalesced_changes():
+    published = []
+    release = asyncio.Event()
+
+    async def change_value(capability, instance, value, /, relative=False, **kwargs):
+        published.append((value, relative))
+        await release.wait()
+        return capability.type_id, instance
+
+    level = Range(
+        instance=Range.Instance.Brightness,
+        min_value=0.,
+        max_value=100.,
+        initial_value=50.,
+        retrievable=True,
+        change_value=change_value,
+        coalesce=0.,
+    )
+    device = Other(device_id='light', capabilities=[level])
+
+    def action(value: float, relative: bool = False) -> list[dict]:
+        state = {'instance': 'brightness', 'value': value}
+        if relative:
+            state['relative'] = True
+        return [{'type': level.type_id, 'state': state}]
+
+    first = asyncio.create_task(device.action(action(10., relative=True), None))
+    await asyncio.sleep(0.01)
+    # relative change is resolved against the current value
+    assert published == [(60., False)]
+
+    # these arrive while the first one is being published
+    others = [
+        asyncio.create_task(device.action(action(value, relative), None))
+        for value, relative in ((10., True), (20., False), (5., True), (90., True))
+    ]
+    await asyncio.sleep(0.01)
+    assert published == [(60., False)]
+
+    release.set()
+    results = await asyncio.gather(first, *others)
+    assert all(result['capabilities'][0]['state']['action_result']['status'] == 'DONE' for result in results)
+    # absolute target with the following deltas applied, clamped to the range
+    assert published == [(60., False), (100., False)]
+
+    # device has not reported the value yet, the last target is used as a base
+    await device.action(action(-15., relative=True), None)
+    assert published[-1] == (85., False)
+
+
+async def test_validation():
+    def errors(capability: Range, changes: list[tuple[float, dict]]) -> list[str | None]:
+        validate = capability.compile_validator(capability.instance)
+        result: list[str | None] = []
+        for value, kwargs in changes:
+            try:
+                validate(value, kwargs)
+            except ActionException as e:
+                result.append(e.code.value)
+            else:
+                result.append(None)
+        return result
+
+    stepped = Range(instance=Range.Instance.Open, min_value=2., max_value=100., precision=5.)
+    assert errors(stepped, [
+        (52., {}),
+        (50., {}),
+        (10., {'relative': True}),
+        (12., {'relative': True}),
+    ]) == [None, 'INVALID_VALUE', None, 'INVALID_VALUE']
+
+    fine = Range(instance=Range.Instance.Brightness, min_value=0., max_value=100., precision=0.1)
+    assert errors(fine, [(33.3, {}), (33.33, {})]) == [None, 'INVALID_VALUE']
+
+    # integers are counted from the range start too
+    shifted = Range(instance=Range.Instance.Temperature, min_value=0.5, max_value=30.5, precision=1)
+    assert errors(shifted, [(20, {}), (20.5, {}), (2, {'relative': True})]) == ['INVALID_VALUE', None, None]
+    assert errors(stepped, [(12, {}), (10, {}), (3, {'relative': True})]) == [None, 'INVALID_VALUE', 'INVALID_VALUE']
+
+    relative_only = Range(instance=Range.Instance.Volume, random_access=False)
+    assert errors(relative_only, [
+        (10., {}),
+        (-1., {'relative': True}),
+    ]) == ['NOT_SUPPORTED_IN_CURRENT_MODE', None]
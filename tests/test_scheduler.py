@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from dialogs.protocol.scheduler import Scheduler
+from dialogs.protocol.executor import ActionExecutor, ActionPolicy
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_schedule():
+    scheduler = Scheduler()
+    fired = []
+
+    first = scheduler.schedule(0.03, fired.append, 'first')
+    second = scheduler.schedule(0.01, fired.append, 'second')
+    cancelled = scheduler.schedule(0.02, fired.append, 'cancelled')
+    moved = scheduler.schedule(0.05, fired.append, 'moved')
+    assert scheduler.pending == 4
+
+    cancelled.cancel()
+    cancelled.cancel()
+    assert not cancelled.active
+    moved.reschedule(0.02)
+    assert scheduler.pending == 3
+
+    await first.wait()
+    assert fired == ['second', 'moved', 'first']
+    assert scheduler.pending == 0
+    assert not second.active
+
+    with pytest.raises(RuntimeError):
+        first.reschedule(1.)
+
+
+async def test_many_cancelled():
+    scheduler = Scheduler()
+    timers = [scheduler.schedule(10. + idx, lambda: None) for idx in range(200)]
+    for timer in timers[:-1]:
+        timer.cancel()
+    assert scheduler.pending == 1
+    # outdated heap entries are compacted
+    assert len(scheduler._heap) < 100
+    timers[-1].cancel()
+    assert scheduler.pending == 0
+
+
+async def test_executor_timers():
+    executor = ActionExecutor(ActionPolicy.LatestWins)
+    sent = []
+
+    executor.schedule(0.01, sent.append, 'stop')
+    assert executor.busy
+    await executor.wait_idle()
+    assert sent == ['stop']
+    assert not executor.busy
+
+    executor.schedule(0.01, sent.append, 'cancelled')
+    await executor.cancel()
+    await asyncio.sleep(0.02)
+    assert sent == ['stop']
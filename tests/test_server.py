@@ -10,6 +10,12 @@ from aiohttp.test_utils import TestClient, TestServer
 
 from dialogs import db
 from dialogs.app import make_app
+from dialogs.oauth import server_key
+from dialogs.routes.smarthome import devices_key
+from dialogs.protocol.supervisor import supervisor_key
+from dialogs.protocol.notifications import Notifications, notifications_key
+from dialogs.protocol.device import Light
+from dialogs.protocol.capability import OnOff
 
 
 pytestmark = pytest.mark.asyncio
@@ -218,6 +224,51 @@ async def test_fetch_with_authorization(app: Application, client: TestClient):
     assert resp.status == 200, await resp.text()
     assert 'payload' in await resp.json()
 
+    app[devices_key]['light'] = Light(
+        device_id='light',
+        capabilities=[OnOff(initial_value=True, retrievable=True)],
+    )
+    conn = client.post(
+        '/v1.0/user/devices/query',
+        json={'devices': [{'id': 'light'}, {'id': 'unknown'}]},
+        headers={'X-Request-Id': 'req'},
+    )
+    resp = await asyncio.wait_for(conn, timeout=2.0)
+    assert resp.status == 200, await resp.text()
+    assert await resp.json() == {
+        'request_id': 'req',
+        'payload': {
+            'devices': [
+                {
+                    'id': 'light',
+                    'capabilities': [
+                        {'type': 'devices.capabilities.on_off', 'state': {'instance': 'on', 'value': True}},
+                    ],
+                    'properties': [],
+                },
+                {
+                    'id': 'unknown',
+                    'error_code': 'DEVICE_NOT_FOUND',
+                    'error_message': 'Устройство неизвестно',
+                },
+            ],
+        },
+    }
+
+    async def crashing_updater():
+        raise RuntimeError("crash")
+
+    app[supervisor_key].start('crashing', crashing_updater, device_id='light')
+    await asyncio.sleep(0)
+    conn = client.post('/v1.0/user/devices/query', json={'devices': [{'id': 'light'}]})
+    resp = await asyncio.wait_for(conn, timeout=2.0)
+    assert resp.status == 200, await resp.text()
+    assert (await resp.json())['payload']['devices'] == [{
+        'id': 'light',
+        'error_code': 'DEVICE_UNREACHABLE',
+        'error_message': 'Устройство недоступно',
+    }]
+
     conn = client.post('/v1.0/user/devices/action', json={'payload': {'devices': []}})
     resp = await asyncio.wait_for(conn, timeout=2.0)
     assert resp.status == 200, await resp.text()
@@ -277,3 +328,146 @@ async def test_profile_scopes(app: Application, client: TestClient):
     assert resp.status == 200, await resp.text()
     data = await resp.json()
     assert data['username'] == app_user.username
+
+
+async def test_token_resumes_notifications(app: Application):
+    db_session = Session(bind=app[db.db_key])
+    app_user = db_session.query(db.User).filter(db.User.username == 'username').one()
+    db_session.add(db.User(username='another', password='password'))
+    db_session.add(db.App(
+        user_id=app_user.id,
+        client_id='client',
+        client_secret='secret',
+        redirect_uri='/auth',
+        token_endpoint_auth_method='client_secret_post',
+        grant_type='authorization_code\nrefresh_token',
+        response_type='code',
+        scope='smarthome',
+        client_name='test',
+        client_uri='http://localhost/',
+    ))
+    db_session.commit()
+
+    notifier = app[notifications_key] = Notifications(skill_id='skill', user_id='username', session=None)
+    notifier.pause()
+    client = TestClient(TestServer(app))
+    await client.start_server()
+
+    async def authorize(username: str) -> dict:
+        client.session.cookie_jar.clear()
+        resp = await client.post('/auth', data={'username': username, 'password': 'password'})
+        assert resp.status == 200, await resp.text()
+        resp = await client.post(
+            '/oauth/authorize',
+            params={'client_id': 'client', 'scope': 'smarthome', 'response_type': 'code', 'state': 'TEST'},
+            data={'confirm': 'true'},
+            allow_redirects=False,
+        )
+        assert resp.status == 302, await resp.text()
+        resp = await client.post('/oauth/token', data={
+            'client_id': 'client',
+            'client_secret': 'secret',
+            'code': yarl.URL(resp.headers['Location']).query['code'],
+            'grant_type': 'authorization_code',
+        })
+        assert resp.status == 200, await resp.text()
+        return await resp.json()
+
+    try:
+        # other user linked the skill
+        await authorize('another')
+        assert notifier.paused
+
+        data = await authorize('username')
+        assert not notifier.paused
+
+        # token refresh does not link the skill again
+        notifier.pause()
+        resp = await client.post('/oauth/token', data={
+            'client_id': 'client',
+            'client_secret': 'secret',
+            'grant_type': 'refresh_token',
+            'refresh_token': data['refresh_token'],
+        })
+        assert resp.status == 200, await resp.text()
+        assert notifier.paused
+    finally:
+        await client.close()
+
+
+async def test_refresh_token(app: Application, client: TestClient):
+    db_session = Session(bind=app[db.db_key])
+
+    app_user = db_session.query(db.User).filter(db.User.username == 'username').one()
+    oauth_client = db.App(
+        user_id=app_user.id,
+        client_id='client',
+        client_secret='secret',
+        redirect_uri='/auth',
+        token_endpoint_auth_method='client_secret_post',
+        grant_type='authorization_code\nrefresh_token',
+        response_type='code',
+        scope='smarthome',
+        client_name='test',
+        client_uri='http://localhost/',
+    )
+    token = db.Token(
+        user_id=app_user.id,
+        client_id='client',
+        token_type='Bearer',
+        access_token='xxx',
+        refresh_token='yyy',
+        expires_in=600,
+        scope='smarthome',
+    )
+    db_session.add(oauth_client)
+    db_session.add(token)
+    db_session.commit()
+
+    for expected_status in (200, 400):
+        conn = client.post('/oauth/token', data={
+            'client_id': 'client',
+            'client_secret': 'secret',
+            'grant_type': 'refresh_token',
+            'refresh_token': 'yyy',
+        })
+        resp = await asyncio.wait_for(conn, timeout=2.0)
+        assert resp.status == expected_status, await resp.text()
+
+    # client is looked up once and then served from cache
+    assert 'client' in app[server_key]._clients
+
+    db_session.expire_all()
+    tokens = db_session.query(db.Token).order_by(db.Token.id).all()
+    assert [item.revoked for item in tokens] == [True, False]
+
+
+async def test_unlink_revokes_all_tokens(app: Application, client: TestClient):
+    db_session = Session(bind=app[db.db_key])
+
+    app_user = db_session.query(db.User).filter(db.User.username == 'username').one()
+    for access_token, client_id in (('xxx1', 'client'), ('xxx2', 'client'), ('xxx3', 'another')):
+        db_session.add(db.Token(
+            user_id=app_user.id,
+            client_id=client_id,
+            token_type='Bearer',
+            access_token=access_token,
+            refresh_token=access_token.replace('x', 'y'),
+            expires_in=600,
+            scope='smarthome',
+        ))
+    db_session.commit()
+
+    conn = client.post('/v1.0/user/unlink', headers={'Authorization': 'Bearer xxx1', 'X-Request-Id': 'req'})
+    resp = await asyncio.wait_for(conn, timeout=2.0)
+    assert resp.status == 200, await resp.text()
+    assert (await resp.json()) == {'request_id': 'req'}
+
+    db_session.expire_all()
+    tokens = db_session.query(db.Token).order_by(db.Token.id).all()
+    assert [item.revoked for item in tokens] == [True, True, False]
+
+    for access_token, expected_status in (('xxx2', 401), ('xxx3', 200)):
+        conn = client.get('/v1.0/user/devices', headers={'Authorization': f'Bearer {access_token}'})
+        resp = await asyncio.wait_for(conn, timeout=2.0)
+        assert resp.status == expected_status, await resp.text()
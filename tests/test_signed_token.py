@@ -0,0 +1,206 @@
+import time
+import asyncio
+from unittest import mock
+
+import pytest
+from sqlalchemy.orm import Session
+from aiohttp.web import Application
+from aiohttp.test_utils import TestClient, TestServer
+
+from dialogs import db, oauth
+from dialogs.app import make_app
+from dialogs.oauth.signed_token import TokenSigner, TokenDenylist
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(scope='session', autouse=True)
+def mock_https_check():
+    with mock.patch('authlib.oauth2.rfc6749.errors.InsecureTransportError.check') as _check:
+        yield _check
+
+
+@pytest.fixture(scope='function')
+async def app():
+    app = await make_app({'devices': {}, 'oauth': {'signed_access_tokens': True}}, ':memory:')
+    db_session = Session(bind=app[db.db_key])
+
+    db_session.add(db.User(username='username', password='password'))
+    db_session.commit()
+
+    return app
+
+
+@pytest.fixture(scope='function')
+async def client(app):
+    client = TestClient(TestServer(app))
+    await client.start_server()
+
+    try:
+        yield client
+    finally:
+        await client.close()
+
+
+async def test_sign_and_verify():
+    signer = TokenSigner(b'k' * 32)
+    token_string = signer.sign(user_id=1, client_id='client', scope='smarthome', expires_in=600)
+    assert signer.is_signed(token_string)
+    assert len(token_string) < 255
+
+    token = signer.verify(token_string)
+    assert token is not None
+    assert token.user_id == 1
+    assert token.client_id == 'client'
+    assert token.get_scope() == 'smarthome'
+    assert not token.is_expired()
+    assert not token.is_revoked()
+
+    assert signer.sign(user_id=1, client_id='client', scope='smarthome', expires_in=600) != token_string
+
+    payload, _, signature = token_string.partition('.')
+    assert signer.verify(payload + 'x.' + signature) is None
+    assert signer.verify(payload + '.' + signature[:-1]) is None
+    assert signer.verify('garbage') is None
+    assert TokenSigner(b'x' * 32).verify(token_string) is None
+
+    expired = signer.sign(user_id=1, client_id='client', scope='', expires_in=10, issued_at=int(time.time()) - 20)
+    token = signer.verify(expired)
+    assert token is not None and token.is_expired()
+
+
+async def test_denylist():
+    denylist = TokenDenylist()
+    denylist.add('old', int(time.time()) - 1)
+    assert 'old' not in denylist
+
+    denylist.add('new', int(time.time()) + 60)
+    assert 'new' in denylist
+    assert len(denylist) == 1
+
+
+async def test_fetch_with_signed_token(app: Application, client: TestClient):
+    db_session = Session(bind=app[db.db_key])
+
+    app_user = db_session.query(db.User).filter(db.User.username == 'username').one()
+    oauth_client = db.App(
+        user_id=app_user.id,
+        client_id='client',
+        client_secret='secret',
+        redirect_uri='/auth',
+        token_endpoint_auth_method='client_secret_post',
+        grant_type='authorization_code',
+        response_type='code',
+        scope='smarthome',
+        client_name='test',
+        client_uri='http://localhost/',
+    )
+
+    signer = app[oauth.server_key].signer
+    assert signer is not None
+    access_token = signer.sign(user_id=app_user.id, client_id='client', scope='smarthome', expires_in=600)
+    token = db.Token(
+        user_id=app_user.id,
+        client_id='client',
+        token_type='Bearer',
+        access_token=access_token,
+        refresh_token='yyy',
+        expires_in=600,
+        scope='smarthome',
+    )
+    db_session.add(oauth_client)
+    db_session.add(token)
+    db_session.commit()
+
+    client.session.headers.add('Authorization', f'Bearer {access_token}')
+
+    conn = client.get('/v1.0/user/devices')
+    resp = await asyncio.wait_for(conn, timeout=2.0)
+    assert resp.status == 200, await resp.text()
+    assert (await resp.json())['payload']['user_id'] == 'username'
+
+    conn = client.post('/v1.0/user/unlink', data={
+        'client_id': 'client',
+        'client_secret': 'secret',
+        'token': access_token,
+    })
+    resp = await asyncio.wait_for(conn, timeout=2.0)
+    assert resp.status == 200, await resp.text()
+
+    conn = client.get('/v1.0/user/devices')
+    resp = await asyncio.wait_for(conn, timeout=2.0)
+    assert resp.status == 401, await resp.text()
+
+
+async def test_denied_after_commit(app: Application):
+    server = app[oauth.server_key]
+    signer = server.signer
+    assert signer is not None and server.denylist is not None
+
+    def revoke(access_token: str) -> Session:
+        db_session = Session(bind=app[db.db_key])
+        token = db.Token(
+            user_id=1,
+            client_id='client',
+            token_type='Bearer',
+            access_token=access_token,
+            refresh_token=access_token + '-refresh',
+            issued_at=int(time.time()),
+            expires_in=600,
+            scope='smarthome',
+            revoked=True,
+        )
+        db_session.add(token)
+        server.remember_revoked_token(token, pending=db_session)
+        return db_session
+
+    rolled_back = signer.sign(user_id=1, client_id='client', scope='smarthome', expires_in=600)
+    db_session = revoke(rolled_back)
+    assert rolled_back not in server.denylist
+    db_session.rollback()
+    db_session.commit()
+    assert rolled_back not in server.denylist
+
+    committed = signer.sign(user_id=1, client_id='client', scope='smarthome', expires_in=600)
+    db_session = revoke(committed)
+    assert committed not in server.denylist
+    db_session.commit()
+    assert committed in server.denylist
+
+
+async def test_unlink_denied_after_commit(app: Application):
+    server = app[oauth.server_key]
+    signer = server.signer
+    assert signer is not None and server.denylist is not None
+
+    def revoke_all(revoked: int) -> tuple[str, Session]:
+        db_session = Session(bind=app[db.db_key])
+        access_token = signer.sign(user_id=1, client_id='client', scope='smarthome', expires_in=600)
+        db_session.add(db.Token(
+            user_id=1,
+            client_id='client',
+            token_type='Bearer',
+            access_token=access_token,
+            refresh_token=access_token + '-refresh',
+            issued_at=int(time.time()),
+            expires_in=600,
+            scope='smarthome',
+        ))
+        db_session.commit()
+
+        db.db_session.set(db_session)
+        assert server.revoke_user_tokens(1, 'client') == revoked
+        assert access_token not in server.denylist
+        return access_token, db_session
+
+    rolled_back, db_session = revoke_all(1)
+    db_session.rollback()
+    db_session.commit()
+    assert rolled_back not in server.denylist
+
+    # token which revocation was rolled back is still active and revoked again
+    committed, db_session = revoke_all(2)
+    db_session.commit()
+    assert committed in server.denylist
+    assert rolled_back in server.denylist
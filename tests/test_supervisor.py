@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from dialogs.protocol.supervisor import TaskSupervisor
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_restart():
+    supervisor = TaskSupervisor(backoff_initial=0.01, backoff_max=0.02, healthy_after=0.1)
+    runs = []
+
+    async def flaky():
+        runs.append(len(runs))
+        if len(runs) < 3:
+            raise RuntimeError(f"failure {len(runs)}")
+        await asyncio.sleep(10)
+
+    async def done():
+        pass
+
+    supervisor.start('flaky', flaky, device_id='dev')
+    supervisor.start('done', done, device_id='other')
+    with pytest.raises(ValueError):
+        supervisor.start('done', done)
+
+    await asyncio.sleep(0.05)
+    assert len(runs) == 3
+    status = supervisor.status()
+    assert status['flaky']['restarts'] == 2
+    assert status['flaky']['running']
+    assert status['flaky']['last_error'] == 'RuntimeError: failure 2'
+    assert status['done']['finished']
+
+    # restarted task is unhealthy until it runs for a while
+    assert supervisor.unhealthy('dev')
+    assert not supervisor.unhealthy('other')
+    assert supervisor.failing == {'dev': {'flaky'}}
+    await asyncio.sleep(0.1)
+    assert not supervisor.unhealthy('dev')
+    assert supervisor.failing == {}
+
+    await supervisor.close()
+    assert not supervisor.status()['flaky']['running']